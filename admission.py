@@ -0,0 +1,107 @@
+"""Admission control: a bounded number of requests per pool of routes.
+
+During tryout registration or competition check-in, writes pile up on
+SQLite's single writer lock. Each one holds a gunicorn thread while it waits,
+so once every thread is waiting on the lock, reads that would take a
+millisecond wait too. Routes are therefore grouped into pools: reads, writes,
+and any route given a pool of its own. A pool lets `limit` requests run at
+once and up to `queue` more wait, each for at most max_wait seconds. Anything
+beyond that is refused at once (the caller answers 503 with Retry-After)
+instead of taking a thread. Reads and writes draw on separate pools, so a
+write burst holds at most limit + queue threads per worker and leaves the
+rest to reads.
+
+Limits are per worker process. Keep the total of every pool's limit and queue
+below gunicorn's --threads, or requests queue for a thread before admission
+control ever sees them.
+"""
+import threading
+import time
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class Pool:
+    def __init__(self, name, limit, queue, max_wait):
+        self.name = name
+        self.limit = limit
+        self.queue = queue
+        self.max_wait = max_wait
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = 0
+        self.wait_seconds = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """Take a slot, waiting up to max_wait for one; False means shed the request."""
+        with self._cond:
+            if self.active < self.limit:
+                self.active += 1
+                self.admitted += 1
+                return True
+            if self.waiting >= self.queue:
+                self.shed += 1
+                return False
+            self.waiting += 1
+            start = time.perf_counter()
+            try:
+                admitted = self._cond.wait_for(lambda: self.active < self.limit, self.max_wait)
+            finally:
+                self.waiting -= 1
+                self.wait_seconds += time.perf_counter() - start
+            if not admitted:
+                self.shed += 1
+                return False
+            self.active += 1
+            self.admitted += 1
+            return True
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+    def releaser(self):
+        """A callable that releases one acquired slot, however many times it is called."""
+        once = threading.Lock()
+
+        def release():
+            if once.acquire(blocking=False):
+                self.release()
+        return release
+
+
+class AdmissionController:
+    """Maps each request to its pool: a route's own, else the read or write pool."""
+
+    def __init__(self, read, write, routes=None, max_wait=0.25, prefix='/api/', exempt=()):
+        self.prefix = prefix
+        self.exempt = set(exempt)
+        self.read = Pool('read', *read, max_wait)
+        self.write = Pool('write', *write, max_wait)
+        self.routes = {route: Pool(route, limit, queue, max_wait)
+                       for route, (limit, queue) in (routes or {}).items()}
+
+    @staticmethod
+    def parse_routes(spec):
+        """Parse 'METHOD /rule=limit:queue, ...' into {'METHOD /rule': (limit, queue)}."""
+        routes = {}
+        for item in filter(None, (part.strip() for part in spec.split(','))):
+            route, _, limits = item.rpartition('=')
+            limit, _, queue = limits.partition(':')
+            routes[' '.join(route.split())] = (int(limit), int(queue or 0))
+        return routes
+
+    def pool_for(self, method, route):
+        """The pool a request must enter, or None when it is not limited."""
+        if not route.startswith(self.prefix) or route in self.exempt:
+            return None
+        pool = self.routes.get(f'{method} {route}')
+        if pool is not None:
+            return pool
+        return self.read if method in READ_METHODS else self.write
+
+    def pools(self):
+        return [self.read, self.write, *self.routes.values()]
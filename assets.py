@@ -0,0 +1,147 @@
+"""Fingerprinted, precompressed static assets for the single-page app.
+
+static/index.html is the source. The first time a worker serves the app,
+the page's inline <style> and <script> blocks are moved out into files named
+after a hash of their content (assets/app.3f2a9c1b04de.css) and the page
+links to those instead. Every text file, the page included, is compressed
+once with gzip and, when the optional brotli package is installed, with
+brotli, so a request only has to pick the encoding it accepts.
+
+A fingerprinted name always has the same content, so those files can be
+cached for a year as immutable. Everything else is revalidated with its
+ETag, which is how browsers learn the new asset names after a deploy. The
+directory is listed once, so a request for a missing file is answered
+without touching the disk; restart the workers to publish new files.
+build() writes the same tree, with .gz and .br siblings, for a front proxy
+or CDN to serve instead.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import shutil
+import threading
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+# Only text compresses well enough to be worth holding in memory
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+INLINE_BLOCK = re.compile(r'<(style|script)>(.*?)</\1>', re.DOTALL)
+
+ENCODING_SUFFIXES = {'identity': '', 'gzip': '.gz', 'br': '.br'}
+
+
+class Asset:
+    """One file held in memory in every encoding smaller than the original."""
+
+    def __init__(self, body, content_type, cache_control):
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.etag = hashlib.sha256(body).hexdigest()[:16]
+        self.encodings = {'identity': body}
+        candidates = {'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            candidates['br'] = brotli.compress(body, quality=11)
+        for encoding, data in candidates.items():
+            if len(data) < len(body):
+                self.encodings[encoding] = data
+
+    def negotiate(self, accept_encodings):
+        """Return (encoding, body) for a request's parsed Accept-Encoding."""
+        for encoding in ('br', 'gzip'):
+            if encoding in self.encodings and accept_encodings[encoding] > 0:
+                return encoding, self.encodings[encoding]
+        return 'identity', self.encodings['identity']
+
+
+class AssetBundle:
+    def __init__(self, directory, page='index.html', prefix='assets/'):
+        self.directory = directory
+        self.page = page
+        self.prefix = prefix
+        self._assets = None
+        self._others = None
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        """The Asset served at /path, or None."""
+        self._load()
+        return self._assets.get(path)
+
+    def has_file(self, path):
+        """True for other files in the directory, such as images, served as they are."""
+        self._load()
+        return path in self._others
+
+    def build(self, out_dir):
+        """Write every asset (plus .gz/.br) and other file under out_dir."""
+        self._load()
+        written = []
+        for path, asset in self._assets.items():
+            if not path:
+                continue
+            target = os.path.join(out_dir, path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            for encoding, body in asset.encodings.items():
+                with open(target + ENCODING_SUFFIXES[encoding], 'wb') as out:
+                    out.write(body)
+                written.append((target + ENCODING_SUFFIXES[encoding], len(body)))
+        for path in self._others:
+            target = os.path.join(out_dir, path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copy2(os.path.join(self.directory, path), target)
+            written.append((target, os.path.getsize(target)))
+        return written
+
+    def _load(self):
+        if self._assets is not None:
+            return
+        with self._lock:
+            if self._assets is not None:
+                return
+            assets, others = {}, set()
+            for root, _, names in os.walk(self.directory):
+                for name in names:
+                    full_path = os.path.join(root, name)
+                    path = os.path.relpath(full_path, self.directory).replace(os.sep, '/')
+                    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+                    if path == self.page:
+                        continue
+                    if content_type.startswith('text/'):
+                        content_type += '; charset=utf-8'
+                    if content_type.startswith(COMPRESSIBLE_TYPES):
+                        with open(full_path, 'rb') as source:
+                            assets[path] = Asset(source.read(), content_type, REVALIDATE)
+                    else:
+                        others.add(path)
+            assets.update(self._split_page())
+            self._others = others
+            self._assets = assets
+
+    def _split_page(self):
+        with open(os.path.join(self.directory, self.page), encoding='utf-8') as source:
+            html = source.read()
+        assets = {}
+
+        def extract(match):
+            tag, content = match.groups()
+            body = content.strip().encode() + b'\n'
+            extension = 'css' if tag == 'style' else 'js'
+            path = f'{self.prefix}app.{hashlib.sha256(body).hexdigest()[:12]}.{extension}'
+            content_type = 'text/css' if tag == 'style' else 'text/javascript'
+            assets[path] = Asset(body, f'{content_type}; charset=utf-8', IMMUTABLE)
+            if tag == 'style':
+                return f'<link rel="stylesheet" href="/{path}">'
+            return f'<script src="/{path}"></script>'
+
+        page = Asset(INLINE_BLOCK.sub(extract, html).encode(), 'text/html; charset=utf-8', REVALIDATE)
+        assets[self.page] = assets[''] = page
+        return assets
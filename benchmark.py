@@ -0,0 +1,491 @@
+"""Benchmarks for the Flask API.
+
+    python benchmark.py connections --requests 2000 --threads 4
+    python benchmark.py passwords --target-ms 100
+    python benchmark.py burst --athletes 200 --workers 4
+    python benchmark.py admission --writers 32 --seconds 10
+    python benchmark.py memory --students 50000
+
+connections compares the old open-a-connection-per-call behaviour against
+the pooled, WAL-mode connections returned by main.get_db(). passwords times
+POST /api/auth/login at increasing scrypt work factors and recommends the
+largest SCRYPT_N whose p95 login latency stays within the target. burst has a
+whole squad sign in and out at once against a multi-worker gunicorn server,
+committing each write directly and then through the group-commit queue
+(ATTENDANCE_WRITE_QUEUE=1). admission saturates the writer with grade imports
+while other clients keep reading, first with every request let in and then
+with admission control (ADMISSION_CONTROL=1), and compares read tail latency.
+memory serializes ever longer student lists the old way (fetchall, dicts,
+one jsonify) and streamed from the cursor, and compares peak memory and time
+to the first byte.
+"""
+import argparse
+import json
+import random
+import statistics
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import date
+
+from flask import g, has_app_context
+
+import main
+import passwords
+from create_demo_data import DEFAULT_PASSWORD, generate, season_start
+from passwords import hash_password
+
+
+# Connections legacy_get_db() opened outside a request, closed by run_mode()
+legacy_connections = []
+
+
+def legacy_get_db():
+    conn = sqlite3.connect(main.DATABASE, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    # The old routes closed their connection before returning; do the same
+    # at the end of each request
+    if has_app_context():
+        g.setdefault('legacy_connections', []).append(conn)
+    else:
+        legacy_connections.append(conn)
+    return conn
+
+
+@main.app.teardown_appcontext
+def close_legacy_connections(exc):
+    for conn in g.pop('legacy_connections', []):
+        conn.close()
+
+
+def seed(num_students, num_events):
+    generate(main.DATABASE, students=num_students, parent_rate=0, events_per_season=num_events,
+             attendance_rate=0, subjects=1)
+
+
+def login(username):
+    client = main.app.test_client()
+    response = client.post('/api/auth/login', json={'username': username, 'password': DEFAULT_PASSWORD})
+    assert response.status_code == 200, response.get_json()
+    return client
+
+
+def run_threads(num_threads, setup, work):
+    """Run work(state) on num_threads threads once every setup(index) is done.
+
+    Returns wall-clock seconds from the first thread starting work to the last
+    one finishing, so logins and other setup stay out of the measurement.
+    """
+    barrier = threading.Barrier(num_threads)
+    spans = []
+
+    def runner(index):
+        state = setup(index)
+        barrier.wait()
+        start = time.perf_counter()
+        work(state)
+        spans.append((start, time.perf_counter()))
+
+    threads = [threading.Thread(target=runner, args=(i,)) for i in range(num_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return max(end for _, end in spans) - min(start for start, _ in spans)
+
+
+def bench_events(per_thread, num_threads):
+    def work(client):
+        for _ in range(per_thread):
+            client.get('/api/events')
+
+    return run_threads(num_threads, lambda i: login(f'student{i + 1}'), work)
+
+
+def bench_sign_in(per_thread, num_threads, num_events):
+    # Every student can hold one open row per event, so each pass over the
+    # event list uses a fresh student.
+    rounds = -(-per_thread // num_events)
+
+    def setup(index):
+        return [login(f'student{index * rounds + r + 1}') for r in range(rounds)]
+
+    def work(clients):
+        for i in range(per_thread):
+            client = clients[i // num_events]
+            response = client.post('/api/attendance/sign-in', json={'event_id': i % num_events + 1})
+            assert response.status_code == 200, response.get_json()
+
+    return run_threads(num_threads, setup, work)
+
+
+def run_mode(mode, args, workdir):
+    main.close_db()
+    main.DATABASE = os.path.join(workdir, f'{mode}.db')
+    main.read_cache.clear()
+    main.read_cache.enabled = args.cache
+    original_get_db = main.get_db
+    if mode == 'per-request':
+        main.get_db = legacy_get_db
+    per_thread = args.requests // args.threads
+    try:
+        main.init_db()
+        rounds = -(-per_thread // args.events)
+        seed(args.threads * rounds, args.events)
+        main.close_db()
+        total = per_thread * args.threads
+        return {
+            '/api/events': total / bench_events(per_thread, args.threads),
+            '/api/attendance/sign-in': total / bench_sign_in(per_thread, args.threads, args.events),
+        }
+    finally:
+        main.get_db = original_get_db
+        while legacy_connections:
+            legacy_connections.pop().close()
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def bench_connections(args):
+    with tempfile.TemporaryDirectory() as workdir:
+        results = {mode: run_mode(mode, args, workdir) for mode in ('per-request', 'pooled')}
+        main.close_db()
+
+    print(f"{'route':<28}{'per-request':>14}{'pooled':>14}{'speedup':>10}")
+    for route in results['pooled']:
+        before = results['per-request'][route]
+        after = results['pooled'][route]
+        print(f'{route:<28}{before:>10.0f} r/s{after:>10.0f} r/s{after / before:>9.2f}x')
+
+
+def bench_login(work_factor, args):
+    """Return (p95 seconds, logins/sec) for logins at the given scrypt N."""
+    passwords.SCRYPT_N = work_factor
+    password = hash_password('bench')
+    conn = main.get_db()
+    conn.execute('DELETE FROM users')
+    conn.execute('''
+        INSERT INTO users (username, password, role, first_name, last_name, status)
+        VALUES ('bench.login', ?, 'student', 'Bench', 'Login', 'active')
+    ''', (password,))
+    conn.commit()
+
+    per_thread = args.logins // args.threads
+    latencies = []
+
+    def work(client):
+        for _ in range(per_thread):
+            start = time.perf_counter()
+            response = client.post('/api/auth/login', json={'username': 'bench.login', 'password': 'bench'})
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.get_json()
+
+    elapsed = run_threads(args.threads, lambda i: main.app.test_client(), work)
+    return percentile(latencies, 0.95), len(latencies) / elapsed, statistics.mean(latencies)
+
+
+def bench_passwords(args):
+    cores = os.cpu_count() or 1
+    original = passwords.SCRYPT_N
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        main.close_db()
+        main.DATABASE = os.path.join(workdir, 'passwords.db')
+        main.init_db()
+        try:
+            for exponent in range(args.min_log2, args.max_log2 + 1):
+                p95, throughput, mean = bench_login(2 ** exponent, args)
+                results.append((2 ** exponent, p95, throughput, mean))
+        finally:
+            passwords.SCRYPT_N = original
+            main.close_db()
+
+    print(f'{cores} core(s), {args.threads} concurrent clients, target p95 {args.target_ms:.0f} ms')
+    print(f"{'SCRYPT_N':>10}{'mean':>10}{'p95':>10}{'logins/s':>10}{'per core':>10}")
+    for work_factor, p95, throughput, mean in results:
+        print(f'{work_factor:>10}{mean * 1000:>8.1f}ms{p95 * 1000:>8.1f}ms'
+              f'{throughput:>10.1f}{throughput / cores:>10.1f}')
+
+    within = [work_factor for work_factor, p95, _, _ in results if p95 * 1000 <= args.target_ms]
+    if within:
+        print(f'Recommended: SCRYPT_N={max(within)}')
+    else:
+        print('No tested work factor meets the target; lower --min-log2 or raise --target-ms.')
+
+
+# Cheap hashes so logging the squad in stays out of the measurement
+BURST_SCRYPT_N = 1024
+
+
+def burst_mode(queued, args, db_path):
+    """Return ({route: (latencies, errors, seconds)}, attendance counts) for one server run."""
+    from loadtest import HttpClient, gunicorn_server  # loadtest imports this module
+
+    env = {'ATTENDANCE_WRITE_QUEUE': '1' if queued else '0', 'SCRYPT_N': str(BURST_SCRYPT_N),
+           'SLOW_QUERY_MS': '60000'}
+    per_thread = args.athletes // args.threads
+    routes = {'/api/attendance/sign-in': ([], [], []), '/api/attendance/sign-out': ([], [], [])}
+    clients = {}
+
+    def setup(index):
+        if index not in clients:
+            clients[index] = []
+            for k in range(per_thread):
+                client = HttpClient(port)
+                status, payload, _ = client.request('POST', '/api/auth/login', body={
+                    'username': f'student{index * per_thread + k + 1}', 'password': DEFAULT_PASSWORD})
+                assert status == 200, payload
+                clients[index].append(client)
+        return clients[index]
+
+    with gunicorn_server(db_path, args.workers, args.threads, env) as port:
+        for event_id in range(1, args.rounds + 1):
+            for route, (latencies, errors, spans) in routes.items():
+                def work(squad):
+                    for client in squad:
+                        start = time.perf_counter()
+                        status, payload, _ = client.request('POST', route, body={'event_id': event_id})
+                        latencies.append(time.perf_counter() - start)
+                        if status != 200:
+                            errors.append(f'{status} {payload[:80]!r}')
+
+                spans.append(run_threads(args.threads, setup, work))
+
+    # gunicorn has exited, so every queued write has been flushed
+    conn = sqlite3.connect(db_path)
+    counts = conn.execute(
+        'SELECT COUNT(*), COUNT(sign_out_time), COUNT(DISTINCT user_id || ? || event_id) FROM attendance',
+        ('-',)
+    ).fetchone()
+    conn.close()
+    return {route: (latencies, errors, sum(spans)) for route, (latencies, errors, spans) in routes.items()}, counts
+
+
+def bench_burst(args):
+    original = passwords.SCRYPT_N
+    passwords.SCRYPT_N = BURST_SCRYPT_N
+    args.athletes -= args.athletes % args.threads
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            for label, queued in (('direct', False), ('queued', True)):
+                db_path = os.path.join(workdir, f'{label}.db')
+                # Anchored on the first event day, so no attendance is pre-seeded
+                generate(db_path, students=args.athletes, parent_rate=0, events_per_season=args.rounds,
+                         attendance_rate=0, subjects=1, today=season_start(date.today(), 0))
+                results[label] = burst_mode(queued, args, db_path)
+    finally:
+        passwords.SCRYPT_N = original
+
+    print(f'{args.athletes} athletes, {args.threads} at once, {args.workers} gunicorn workers, '
+          f'{args.rounds} rounds')
+    print(f"{'mode':<8}{'route':<27}{'writes/s':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'errors':>8}")
+    for label, (routes, counts) in results.items():
+        for route, (latencies, errors, seconds) in routes.items():
+            print(f'{label:<8}{route:<27}{len(latencies) / seconds:>10.0f}'
+                  f'{percentile(latencies, 0.5) * 1000:>8.1f}ms{percentile(latencies, 0.95) * 1000:>8.1f}ms'
+                  f'{percentile(latencies, 0.99) * 1000:>8.1f}ms{len(errors):>8}')
+            if errors and args.verbose:
+                print(f'        {errors[0]}')
+        rows, signed_out, distinct = counts
+        print(f'{label:<8}stored {rows} rows, {signed_out} signed out, {distinct} distinct '
+              f'(expected {args.athletes * args.rounds})')
+
+
+def admission_mode(enabled, args, db_path, grades):
+    """Return (read latencies, read errors, write statuses, seconds) for one server run."""
+    from loadtest import HttpClient, gunicorn_server  # loadtest imports this module
+
+    env = {'ADMISSION_CONTROL': '1' if enabled else '0', 'SCRYPT_N': str(BURST_SCRYPT_N),
+           'SLOW_QUERY_MS': '60000'}
+    latencies, read_errors, write_statuses = [], [], []
+    stop = threading.Event()
+
+    def login(username):
+        client = HttpClient(port)
+        status, payload, _ = client.request('POST', '/api/auth/login', body={
+            'username': username, 'password': DEFAULT_PASSWORD})
+        assert status == 200, payload
+        return client
+
+    def read(client):
+        while not stop.is_set():
+            start = time.perf_counter()
+            status, _, _ = client.request('GET', '/api/events')
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                read_errors.append(status)
+
+    def write(client):
+        while not stop.is_set():
+            status, _, _ = client.request('POST', '/api/academics/grades/import', data=grades,
+                                          content_type='application/json')
+            write_statuses.append(status)
+            if status == 503:
+                # Back off briefly, as a client honouring Retry-After would
+                stop.wait(args.backoff)
+
+    with gunicorn_server(db_path, 1, args.threads, env) as port:
+        readers = [login(f'student{i + 1}') for i in range(args.readers)]
+        writers = [login('coach') for _ in range(args.writers)]
+        threads = ([threading.Thread(target=read, args=(client,)) for client in readers]
+                   + [threading.Thread(target=write, args=(client,)) for client in writers])
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return latencies, read_errors, write_statuses, time.perf_counter() - start
+
+
+def bench_admission(args):
+    original = passwords.SCRYPT_N
+    passwords.SCRYPT_N = BURST_SCRYPT_N
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            rng = random.Random(2025)
+            grades = json.dumps([{'student_id': student_id, 'requirement_id': 1, 'grade': rng.randint(50, 100)}
+                                 for student_id in range(1, args.students + 1)])
+            for label, enabled in (('open', False), ('admission', True)):
+                db_path = os.path.join(workdir, f'{label}.db')
+                generate(db_path, students=args.students, parent_rate=0, events_per_season=40,
+                         attendance_rate=0, subjects=1)
+                results[label] = admission_mode(enabled, args, db_path, grades)
+    finally:
+        passwords.SCRYPT_N = original
+
+    print(f'{args.readers} readers of /api/events, {args.writers} clients importing {args.students} grades '
+          f'each, 1 gunicorn worker with {args.threads} threads, {args.seconds:.0f}s per mode')
+    print(f"{'mode':<11}{'reads/s':>9}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}{'read err':>10}"
+          f"{'writes/s':>10}{'shed':>8}{'failed':>8}")
+    for label, (latencies, read_errors, write_statuses, seconds) in results.items():
+        written = write_statuses.count(200)
+        shed = write_statuses.count(503)
+        print(f'{label:<11}{len(latencies) / seconds:>9.0f}'
+              f'{percentile(latencies, 0.5) * 1000:>8.1f}ms{percentile(latencies, 0.95) * 1000:>8.1f}ms'
+              f'{percentile(latencies, 0.99) * 1000:>8.1f}ms{max(latencies) * 1000:>8.1f}ms'
+              f'{len(read_errors):>10}{written / seconds:>10.1f}{shed:>8}{len(write_statuses) - written - shed:>8}')
+
+
+STUDENTS_QUERY = '''
+    SELECT id, username, first_name, last_name, email, phone, grade
+    FROM users
+    WHERE role = 'student' AND (status = 'active' OR status IS NULL)
+    ORDER BY last_name, first_name
+    LIMIT ?
+'''
+
+
+def buffered_list(size):
+    """The list endpoints before streaming: every row, as a dict, in one encoded body."""
+    rows = main.get_db().execute(STUDENTS_QUERY, (size,)).fetchall()
+    return [(main.app.json.dumps([dict(row) for row in rows]) + '\n').encode()]
+
+
+def streamed_list(size):
+    return main.streamed_json(None, None, lambda: main.query_rows(STUDENTS_QUERY, (size,))).response
+
+
+def time_list(render, size):
+    """Return (seconds to first chunk, total seconds, body bytes)."""
+    with main.app.test_request_context('/api/users/students'):
+        start = time.perf_counter()
+        first_byte = None
+        body_bytes = 0
+        for chunk in render(size):
+            if first_byte is None:
+                first_byte = time.perf_counter() - start
+            body_bytes += len(chunk)
+        return first_byte, time.perf_counter() - start, body_bytes
+
+
+def peak_memory(render, size):
+    """Return the most memory allocated at once while rendering, in bytes."""
+    # Traced separately, as tracing slows every allocation down
+    tracemalloc.start()
+    try:
+        time_list(render, size)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_memory(args):
+    sizes = [int(size) for size in args.sizes.split(',')] + [args.students]
+    original_database = main.DATABASE
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            db_path = os.path.join(workdir, 'memory.db')
+            generate(db_path, students=args.students, parent_rate=0, events_per_season=1,
+                     attendance_rate=0, subjects=1)
+            main.close_db()
+            main.DATABASE = db_path
+            print(f"{'rows':>8}{'mode':>10}{'body':>11}{'peak memory':>14}{'first byte':>12}{'total':>10}")
+            for size in sorted(set(sizes)):
+                for label, render in (('buffered', buffered_list), ('streamed', streamed_list)):
+                    time_list(render, size)  # warm the connection and statement cache
+                    first_byte, total, body_bytes = time_list(render, size)
+                    peak = peak_memory(render, size)
+                    print(f'{size:>8}{label:>10}{body_bytes / 1024:>8.0f} KB{peak / 1024:>11.0f} KB'
+                          f'{first_byte * 1000:>10.1f}ms{total * 1000:>8.1f}ms')
+            main.close_db()
+    finally:
+        main.DATABASE = original_database
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    connections = commands.add_parser('connections', help='per-request vs pooled connections')
+    connections.add_argument('--requests', type=int, default=2000, help='requests per route')
+    connections.add_argument('--threads', type=int, default=4, help='concurrent client threads')
+    connections.add_argument('--events', type=int, default=50, help='events in the seeded calendar')
+    connections.add_argument('--cache', action='store_true', help='leave the read cache enabled')
+    connections.set_defaults(run=bench_connections)
+
+    logins = commands.add_parser('passwords', help='pick the scrypt work factor for a login budget')
+    logins.add_argument('--target-ms', type=float, default=100, help='p95 login latency budget')
+    logins.add_argument('--logins', type=int, default=40, help='logins per work factor')
+    logins.add_argument('--threads', type=int, default=1, help='concurrent login clients')
+    logins.add_argument('--min-log2', type=int, default=12, help='smallest N as a power of two')
+    logins.add_argument('--max-log2', type=int, default=16, help='largest N as a power of two')
+    logins.set_defaults(run=bench_passwords)
+
+    burst = commands.add_parser('burst', help='squad check-in burst, direct vs group-committed writes')
+    burst.add_argument('--athletes', type=int, default=200, help='athletes signing in at once')
+    burst.add_argument('--threads', type=int, default=50, help='concurrent client threads')
+    burst.add_argument('--workers', type=int, default=4, help='gunicorn worker processes')
+    burst.add_argument('--rounds', type=int, default=5, help='events to sign in to and out of')
+    burst.add_argument('--verbose', action='store_true', help='print the first error per route')
+    burst.set_defaults(run=bench_burst)
+
+    admission = commands.add_parser('admission', help='read latency while grade imports saturate the writer')
+    admission.add_argument('--readers', type=int, default=8, help='clients reading /api/events')
+    admission.add_argument('--writers', type=int, default=32, help='clients importing grades')
+    admission.add_argument('--students', type=int, default=500, help='grades per import')
+    admission.add_argument('--threads', type=int, default=24, help='gunicorn threads')
+    admission.add_argument('--seconds', type=float, default=10, help='run time per mode')
+    admission.add_argument('--backoff', type=float, default=0.1, help='seconds a writer waits after a 503')
+    admission.set_defaults(run=bench_admission)
+
+    memory = commands.add_parser('memory', help='peak memory of buffered vs streamed list responses')
+    memory.add_argument('--students', type=int, default=50000, help='students seeded, the longest list')
+    memory.add_argument('--sizes', default='1000,10000', help='shorter list lengths to compare, comma separated')
+    memory.set_defaults(run=bench_memory)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == '__main__':
+    main_cli()
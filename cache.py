@@ -0,0 +1,228 @@
+"""Read-through cache for the read-mostly API responses.
+
+Entries are encoded JSON bodies, so their size is known exactly and any
+backend that can store bytes can hold them. Each entry is filed under one or
+more tags (table names). Invalidating a tag bumps its generation counter,
+which changes the key of every entry filed under it; the orphaned entries
+then age out through TTL or LRU eviction.
+
+Generations are bumped only in the cache that saw the write, so callers that
+serve several processes must also put something every process can see into
+the key; main.py uses the database's table_versions counters. The local
+backend lives in the worker process; to share entries between gunicorn
+workers, plug in a shared backend (Redis, memcached, ...) that implements
+get/set/incr like SharedBackend below.
+"""
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+
+class LocalBackend:
+    """In-process LRU store bounded by entry count and total bytes."""
+
+    def __init__(self, max_entries=1024, max_bytes=32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._bytes += len(value)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def counter(self, key):
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def usage(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes,
+                    'evictions': self.evictions}
+
+    def _remove(self, key):
+        value, _ = self._entries.pop(key)
+        self._bytes -= len(value)
+
+
+class SharedBackend(ABC):
+    """Interface for a store shared by every worker process.
+
+    Implementations must make incr() atomic across processes and let the
+    store expire keys after ttl seconds; eviction is up to the store.
+    """
+
+    @abstractmethod
+    def get(self, key):
+        """The bytes stored under key, or None."""
+
+    @abstractmethod
+    def set(self, key, value, ttl):
+        """Store value under key for ttl seconds."""
+
+    @abstractmethod
+    def incr(self, key):
+        """Atomically add one to the counter at key and return the new value."""
+
+    @abstractmethod
+    def counter(self, key):
+        """The counter at key, 0 if it was never incremented."""
+
+    @abstractmethod
+    def clear(self):
+        """Drop every entry."""
+
+    def usage(self):
+        return {}
+
+
+class InMemorySharedBackend(SharedBackend):
+    """Single-process stand-in for a shared store, for tests and development.
+
+    Several ReadCache instances pointed at one of these behave like workers
+    sharing a Redis instance.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                self._data.pop(key, None)
+                return None
+            return entry[0]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+
+    def incr(self, key):
+        with self._lock:
+            value = self._data.get(key, (0, float('inf')))[0] + 1
+            self._data[key] = (value, float('inf'))
+            return value
+
+    def counter(self, key):
+        with self._lock:
+            return self._data.get(key, (0, None))[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def usage(self):
+        with self._lock:
+            return {'entries': len(self._data)}
+
+
+class ReadCache:
+    def __init__(self, backend=None, ttl=300):
+        self.backend = backend if backend is not None else LocalBackend()
+        self.ttl = ttl
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _key(self, key, tags):
+        generations = ','.join(f'{tag}.{self.backend.counter(f"gen:{tag}")}' for tag in tags)
+        return f'{key}|{generations}'
+
+    def get_or_compute(self, key, tags, compute):
+        """Return the cached bytes for key, or store and return compute()."""
+        if not self.enabled:
+            return compute()
+        full_key = self._key(key, tags)
+        value = self.backend.get(full_key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = compute()
+        self.backend.set(full_key, value, self.ttl)
+        return value
+
+    def get_or_stream(self, key, tags, stream, max_bytes):
+        """Return the cached bytes for key, or an iterator over the chunks of stream().
+
+        The chunks are stored as the entry once the last one has been sent,
+        unless they come to more than max_bytes, so at most that much is
+        buffered alongside a streamed response. The key is taken before
+        streaming starts, so a write during the stream orphans the entry.
+        """
+        if not self.enabled:
+            return stream()
+        full_key = self._key(key, tags)
+        value = self.backend.get(full_key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        return self._store_streamed(full_key, stream(), max_bytes)
+
+    def _store_streamed(self, full_key, chunks, max_bytes):
+        parts = []
+        size = 0
+        for chunk in chunks:
+            if parts is not None:
+                size += len(chunk)
+                if size > max_bytes:
+                    parts = None
+                else:
+                    parts.append(chunk)
+            yield chunk
+        if parts is not None:
+            self.backend.set(full_key, b''.join(parts), self.ttl)
+
+    def invalidate(self, *tags):
+        for tag in tags:
+            self.backend.incr(f'gen:{tag}')
+        self.invalidations += 1
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            **self.backend.usage()
+        }
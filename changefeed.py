@@ -0,0 +1,119 @@
+"""Change feed behind the /api/stream Server-Sent Events endpoint.
+
+Write routes append rows to the change_log table in the same transaction as
+their change. Each worker process runs a single poller thread that tails
+change_log and wakes every waiting stream. Changes committed by any gunicorn
+worker therefore reach every subscriber. An idle subscriber costs one
+blocked thread (or greenlet) and no database queries.
+
+change_log would otherwise grow with every check-in, so the compaction job
+trims it with trim(). Changes older than the retention window are gone, and
+a client that asks to resume from before them has to reload instead.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+
+READ_LIMIT = 500
+
+
+class ChangeFeed:
+    def __init__(self, connect, poll_interval=0.5, buffer_size=2000):
+        self.connect = connect
+        self.poll_interval = poll_interval
+        self._buffer = deque(maxlen=buffer_size)
+        self._last_id = 0
+        self._cond = threading.Condition()
+        self._wake = threading.Event()
+        self._pid = None
+
+    def start(self):
+        """Start the poller thread, once per process (and again after a fork)."""
+        with self._cond:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._buffer.clear()
+            row = self.connect().execute('SELECT MAX(id) FROM change_log').fetchone()
+            self._last_id = row[0] or 0
+        threading.Thread(target=self._run, name='change-feed', daemon=True).start()
+
+    def notify(self):
+        """Poll right away instead of at the next interval (after a local commit)."""
+        self._wake.set()
+
+    def latest_id(self):
+        self.start()
+        return self._last_id
+
+    def wait(self, after_id, timeout):
+        """Return changes newer than after_id, blocking up to timeout seconds."""
+        self.start()
+        with self._cond:
+            self._cond.wait_for(lambda: self._last_id > after_id, timeout)
+            if self._buffer and self._buffer[0]['id'] <= after_id + 1:
+                return [change for change in self._buffer if change['id'] > after_id]
+        if self._last_id <= after_id:
+            return []
+        # The subscriber fell behind the in-memory buffer; read from the table
+        return self.read(self.connect(), after_id)
+
+    @staticmethod
+    def read(conn, after_id, limit=READ_LIMIT, until_id=None, topics=None):
+        """Changes after after_id, up to until_id and only of topics when given."""
+        conditions = ['id > ?']
+        values = [after_id]
+        if until_id is not None:
+            conditions.append('id <= ?')
+            values.append(until_id)
+        if topics is not None:
+            conditions.append(f"topic IN ({', '.join('?' for _ in topics)})")
+            values.extend(topics)
+        rows = conn.execute(f'''
+            SELECT id, topic, action, payload, created_at FROM change_log
+            WHERE {' AND '.join(conditions)} ORDER BY id LIMIT ?
+        ''', values + [limit]).fetchall()
+        return [{
+            'id': row['id'],
+            'topic': row['topic'],
+            'action': row['action'],
+            'data': json.loads(row['payload']),
+            'created_at': row['created_at']
+        } for row in rows]
+
+    @staticmethod
+    def trim(conn, keep_days):
+        """Delete changes older than keep_days, in the caller's transaction.
+
+        The newest change is always kept so MAX(id), the clients' version, never
+        goes backwards. Returns the number of changes deleted.
+        """
+        # Ids and times rise together, so this reads only the rows to delete
+        row = conn.execute('''
+            SELECT id FROM change_log WHERE created_at >= datetime('now', ?) ORDER BY id LIMIT 1
+        ''', (f'-{keep_days} days',)).fetchone()
+        if row is None:
+            row = conn.execute('SELECT MAX(id) FROM change_log').fetchone()
+        if row[0] is None:
+            return 0
+        return conn.execute('DELETE FROM change_log WHERE id < ?', (row[0],)).rowcount
+
+    def _run(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            try:
+                changes = self.read(self.connect(), self._last_id)
+            except Exception:
+                time.sleep(self.poll_interval)
+                continue
+            if len(changes) == READ_LIMIT:
+                self._wake.set()
+            if changes:
+                with self._cond:
+                    self._buffer.extend(changes)
+                    self._last_id = changes[-1]['id']
+                    self._cond.notify_all()
@@ -0,0 +1,192 @@
+"""Attendance compaction: roll old sign-in rows up into attendance_daily.
+
+Reports only ever read old attendance in aggregate, so closed rows for events
+older than a horizon are folded into one attendance_daily row per athlete,
+event type and day, then deleted. Each batch of days is inserted, archived
+and deleted in one write transaction, so a row is always counted exactly
+once, either raw or rolled up. Open rows left by athletes who never signed
+out are closed at the event's end first, so they can be compacted too.
+
+Once a day is rolled up its raw rows are gone, so a row that arrived for it
+later could not be told apart from the ones already counted. The app
+therefore refuses attendance for events on or before the last compacted day
+(MAX(day) in attendance_daily), so nothing new reaches a day once its totals
+are written.
+
+The raw rows can be kept in a gzipped JSON Lines archive that is written
+before each batch commits. Rows that are archived but then fail to commit
+are archived again on the next run, so the archive may repeat rows but never
+misses one.
+"""
+import gzip
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime
+
+# Late arrivals are counted against the grace period in effect when the day
+# is compacted; minutes are totals, so averages can be rebuilt from them.
+ROLLUP_SQL = '''
+    INSERT INTO attendance_daily (day, user_id, event_type, attended, mandatory_attended,
+                                  late, minutes_late, completed, minutes_on_site)
+    SELECT day, user_id, event_type, COUNT(*), SUM(is_mandatory),
+           SUM(minutes_late > :late_grace),
+           TOTAL(CASE WHEN minutes_late > :late_grace THEN minutes_late END),
+           COUNT(*), TOTAL(minutes_on_site)
+    FROM (
+        SELECT a.user_id, e.date AS day, e.event_type, e.is_mandatory,
+               (julianday(MIN(a.sign_in_time)) - julianday(e.date || ' ' || e.start_time)) * 1440
+                   AS minutes_late,
+               (julianday(MAX(a.sign_out_time)) - julianday(MIN(a.sign_in_time))) * 1440
+                   AS minutes_on_site
+        FROM events e
+        JOIN attendance a ON a.event_id = e.id
+        WHERE e.date >= :day_from AND e.date < :day_to AND a.sign_out_time IS NOT NULL
+        GROUP BY a.user_id, e.id
+    )
+    WHERE true
+    GROUP BY day, user_id, event_type
+    ON CONFLICT (day, user_id, event_type) DO UPDATE SET
+        attended = attended + excluded.attended,
+        mandatory_attended = mandatory_attended + excluded.mandatory_attended,
+        late = late + excluded.late,
+        minutes_late = minutes_late + excluded.minutes_late,
+        completed = completed + excluded.completed,
+        minutes_on_site = minutes_on_site + excluded.minutes_on_site
+'''
+
+DELETE_SQL = '''
+    DELETE FROM attendance
+    WHERE sign_out_time IS NOT NULL
+      AND event_id IN (SELECT id FROM events WHERE date >= :day_from AND date < :day_to)
+'''
+
+
+def close_stale_attendance(conn, ended_before):
+    """Sign out open rows whose event ended before ended_before.
+
+    The sign-out time is the event's end (its start when it has none), or
+    the sign-in time for athletes who arrived after that. Returns the closed
+    rows as (user_id, event_id, sign_out_time).
+    """
+    rows = conn.execute('''
+        SELECT a.id, a.user_id, a.event_id,
+               MAX(a.sign_in_time, datetime(e.date || ' ' || COALESCE(e.end_time, e.start_time)))
+                   AS sign_out_time
+        FROM attendance a INDEXED BY idx_attendance_open
+        JOIN events e ON e.id = a.event_id
+        WHERE a.sign_out_time IS NULL
+          AND datetime(e.date || ' ' || COALESCE(e.end_time, e.start_time)) < :ended_before
+    ''', {'ended_before': ended_before.strftime('%Y-%m-%d %H:%M:%S')}).fetchall()
+    conn.executemany('''
+        UPDATE attendance SET sign_out_time = ?, status = 'auto_closed' WHERE id = ?
+    ''', [(row['sign_out_time'], row['id']) for row in rows])
+    return [(row['user_id'], row['event_id'], row['sign_out_time']) for row in rows]
+
+
+def oldest_compactable_day(conn, before):
+    row = conn.execute('''
+        SELECT e.date FROM events e
+        WHERE e.date < ?
+          AND EXISTS (SELECT 1 FROM attendance a
+                      WHERE a.event_id = e.id AND a.sign_out_time IS NOT NULL)
+        ORDER BY e.date
+        LIMIT 1
+    ''', (before,)).fetchone()
+    return row[0] if row else None
+
+
+def compact_days(conn, day_from, day_to, late_grace, archive=None):
+    """Roll up closed attendance for events on [day_from, day_to) and delete it.
+
+    Runs inside the caller's transaction. Returns the number of raw rows removed.
+    """
+    params = {'day_from': day_from, 'day_to': day_to, 'late_grace': late_grace}
+    conn.execute(ROLLUP_SQL, params)
+    if archive is not None:
+        archive.write(conn.execute('''
+            SELECT a.*, e.date AS event_date, e.event_type
+            FROM events e
+            JOIN attendance a ON a.event_id = e.id
+            WHERE e.date >= :day_from AND e.date < :day_to AND a.sign_out_time IS NOT NULL
+            ORDER BY e.date, a.event_id, a.id
+        ''', params))
+        archive.flush()
+    return conn.execute(DELETE_SQL, params).rowcount
+
+
+class Archive:
+    """Gzipped JSON Lines file of raw attendance rows, one object per row.
+
+    Rows go to a .part file that is renamed into place by close(), so a
+    finished archive is never truncated.
+    """
+
+    def __init__(self, directory, label):
+        os.makedirs(directory, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        self.path = os.path.join(directory, f'attendance-{label}-{stamp}.jsonl.gz')
+        self._file = gzip.open(self.path + '.part', 'wt', compresslevel=6, encoding='utf-8')
+        self.rows = 0
+
+    def write(self, cursor, batch_size=5000):
+        columns = [column[0] for column in cursor.description]
+        encode = json.JSONEncoder(default=str).encode
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            self._file.write(''.join(encode(dict(zip(columns, row))) + '\n' for row in rows))
+            self.rows += len(rows)
+
+    def flush(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+        if self.rows:
+            os.replace(self.path + '.part', self.path)
+        else:
+            os.remove(self.path + '.part')
+
+
+class PeriodicJob:
+    """Run job() every interval seconds on a daemon thread in each worker process.
+
+    The first run waits a random part of the interval so that gunicorn
+    workers started together do not all run at once. The job must be safe to
+    run concurrently from several processes.
+    """
+
+    def __init__(self, job, interval, name='periodic-job', log=None):
+        self.job = job
+        self.interval = interval
+        self.name = name
+        self.log = log
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def start(self):
+        """Start the thread, once per process (and again after a fork)."""
+        if not self.interval or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        threading.Thread(target=self._run, name=self.name, daemon=True).start()
+
+    def _run(self):
+        pid = os.getpid()
+        delay = random.uniform(0, self.interval)
+        while self._pid == pid:
+            time.sleep(delay)
+            delay = self.interval
+            try:
+                self.job()
+            except Exception:
+                if self.log is not None:
+                    self.log.exception('%s failed', self.name)
@@ -0,0 +1,172 @@
+"""Content-Encoding negotiation for API responses.
+
+JSON (and other text) bodies of at least min_bytes are compressed with
+brotli, when the optional brotli package is installed and the client accepts
+it, or else with gzip. Bodies up to stream_bytes are compressed in one call.
+Larger bodies, and responses that are already streamed, are compressed chunk
+by chunk as they are sent, so the compressed copy is never held whole and
+the first bytes leave early.
+
+The list endpoints serve the same cached body to many clients, so recent
+compressed bodies, up to memo_bytes in all, are kept and reused for an
+identical body instead of compressing it again. Time spent compressing and
+bytes in and out are counted per process for /metrics, which shows the CPU
+cost next to the bytes saved.
+"""
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class ResponseCompressor:
+    def __init__(self, min_bytes=1024, gzip_level=6, brotli_quality=4, stream_bytes=256 * 1024,
+                 chunk_bytes=64 * 1024, memo_bytes=8 * 1024 * 1024,
+                 mimetypes=('application/json', 'application/x-ndjson', 'text/calendar', 'text/csv',
+                            'text/plain')):
+        self.min_bytes = min_bytes
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.stream_bytes = stream_bytes
+        self.chunk_bytes = chunk_bytes
+        self.memo_bytes = memo_bytes
+        self.mimetypes = set(mimetypes)
+        self.responses = 0
+        self.memo_hits = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+        self._memo = OrderedDict()   # (encoding, body) -> compressed body
+        self._memo_size = 0
+        self._lock = threading.Lock()
+
+    def choose(self, accept_encodings):
+        """The encoding to use for a request's parsed Accept-Encoding, or None."""
+        for encoding in ('br', 'gzip') if brotli is not None else ('gzip',):
+            if accept_encodings[encoding] > 0:
+                return encoding
+        return None
+
+    def compress(self, response, accept_encodings):
+        """Compress response in place when it is worth it.
+
+        Returns the seconds spent; streamed bodies are compressed, and
+        counted, only as they are sent.
+        """
+        if (response.status_code < 200 or response.status_code in (204, 206, 304)
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in self.mimetypes
+                or 'no-transform' in response.headers.get('Cache-Control', '')):
+            return 0.0
+        response.vary.add('Accept-Encoding')
+        encoding = self.choose(accept_encodings)
+        if encoding is None:
+            return 0.0
+        body = None if response.is_streamed else response.get_data()
+        if body is not None and len(body) < self.min_bytes:
+            return 0.0
+
+        response.headers['Content-Encoding'] = encoding
+        # The compressed bytes differ, but the content is the same
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+
+        if body is not None:
+            start = time.perf_counter()
+            data = self._memoized(encoding, body)
+            if data is None and len(body) <= self.stream_bytes:
+                data = self._compress_body(encoding, body)
+            if data is not None:
+                response.set_data(data)
+                return time.perf_counter() - start
+
+        if body is None:
+            source = response.response
+            chunks = response.iter_encoded()
+        else:
+            source = None
+            chunks = (body[i:i + self.chunk_bytes] for i in range(0, len(body), self.chunk_bytes))
+        # Flush after each chunk of a streamed body so every part goes out as it is made
+        response.response = self._stream(encoding, chunks, source, flush=body is None,
+                                         memo_key=None if body is None else (encoding, body))
+        del response.headers['Content-Length']
+        return 0.0
+
+    def _compressor(self, encoding):
+        """Return (process, sync_flush, finish) for a new compression stream."""
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=self.brotli_quality)
+            return compressor.process, compressor.flush, compressor.finish
+        compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+    def _memoized(self, encoding, body):
+        with self._lock:
+            data = self._memo.get((encoding, body))
+            if data is not None:
+                self._memo.move_to_end((encoding, body))
+                self.memo_hits += 1
+                self.responses += 1
+                self.bytes_in += len(body)
+                self.bytes_out += len(data)
+            return data
+
+    def _remember(self, key, data):
+        size = len(key[1]) + len(data)
+        with self._lock:
+            if key in self._memo or size > self.memo_bytes:
+                return
+            self._memo[key] = data
+            self._memo_size += size
+            while self._memo_size > self.memo_bytes:
+                (_, old_body), old_data = self._memo.popitem(last=False)
+                self._memo_size -= len(old_body) + len(old_data)
+
+    def _compress_body(self, encoding, body):
+        start = time.perf_counter()
+        process, _, finish = self._compressor(encoding)
+        data = process(body) + finish()
+        self._record(len(body), len(data), time.perf_counter() - start)
+        self._remember((encoding, body), data)
+        return data
+
+    def _stream(self, encoding, chunks, source, flush, memo_key=None):
+        process, sync_flush, finish = self._compressor(encoding)
+        size_in = size_out = 0
+        seconds = 0.0
+        parts = []
+        try:
+            for chunk in chunks:
+                start = time.perf_counter()
+                data = process(chunk) + (sync_flush() if flush else b'')
+                seconds += time.perf_counter() - start
+                size_in += len(chunk)
+                size_out += len(data)
+                if data:
+                    if memo_key is not None:
+                        parts.append(data)
+                    yield data
+            start = time.perf_counter()
+            data = finish()
+            seconds += time.perf_counter() - start
+            size_out += len(data)
+            if memo_key is not None:
+                self._remember(memo_key, b''.join(parts) + data)
+            yield data
+        finally:
+            self._record(size_in, size_out, seconds)
+            if hasattr(source, 'close'):
+                source.close()
+
+    def _record(self, size_in, size_out, seconds):
+        with self._lock:
+            self.responses += 1
+            self.bytes_in += size_in
+            self.bytes_out += size_out
+            self.seconds += seconds
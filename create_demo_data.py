@@ -1,229 +1,247 @@
-import sqlite3
-import hashlib
-from datetime import datetime, timedelta
+"""Demo and synthetic data for the Aviators app.
+
+    python create_demo_data.py
+    python create_demo_data.py --students 250 --seasons 10 --out bench.db
+    TEAMS_CONFIG=teams.json python create_demo_data.py --students 250
+
+With no options this builds a small demo roster in database/app.db. With
+TEAMS_CONFIG set it builds every configured team's database instead, one
+file per team, and rebuilds the username directory login uses. The
+options scale it up to performance-testing fixtures: millions of attendance
+rows build in seconds because every table is filled with executemany inside
+a single transaction. The schema comes from main.init_db(), so generated
+databases always match the app. The same --seed and --today give the same
+rows every time.
+
+From Python:
+
+    from create_demo_data import generate
+    counts = generate('bench.db', students=1000, seasons=10)
+
+Accounts (password `password123` unless --password is given): coach,
+assistant, director, student1..N and parent1..N. With several teams the
+director belongs to the first, and every other team's accounts get its key
+as a prefix (e.g. jv.student14) so each username names one team.
+"""
+import argparse
 import os
+import random
+import time
+from datetime import date, datetime, timedelta
 
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
-
-def create_aviators_data():
-    # Ensure database directory exists
-    os.makedirs('database', exist_ok=True)
-    
-    conn = sqlite3.connect('database/app.db')
-    
-    # CREATE ALL TABLES FIRST
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            role TEXT NOT NULL,
-            first_name TEXT NOT NULL,
-            last_name TEXT NOT NULL,
-            email TEXT,
-            phone TEXT,
-            grade TEXT,
-            parent_id INTEGER,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (parent_id) REFERENCES users (id)
-        )
-    ''')
-    
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS events (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            description TEXT,
-            event_type TEXT NOT NULL,
-            date DATE NOT NULL,
-            start_time TIME NOT NULL,
-            end_time TIME,
-            location TEXT,
-            created_by INTEGER,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (created_by) REFERENCES users (id)
-        )
-    ''')
-    
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS attendance (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            event_id INTEGER NOT NULL,
-            sign_in_time TIMESTAMP,
-            sign_out_time TIMESTAMP,
-            status TEXT DEFAULT 'signed_in',
-            FOREIGN KEY (user_id) REFERENCES users (id),
-            FOREIGN KEY (event_id) REFERENCES events (id)
-        )
-    ''')
-    
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS academic_requirements (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            student_id INTEGER NOT NULL,
-            subject TEXT NOT NULL,
-            grade_required REAL NOT NULL,
-            current_grade REAL,
-            semester TEXT NOT NULL,
-            due_date DATE,
-            status TEXT DEFAULT 'pending',
-            notes TEXT,
-            created_by INTEGER,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (student_id) REFERENCES users (id),
-            FOREIGN KEY (created_by) REFERENCES users (id)
-        )
-    ''')
-    
-    # NOW CLEAR EXISTING DATA (tables exist now)
-    conn.execute('DELETE FROM attendance')
-    conn.execute('DELETE FROM academic_requirements')
-    conn.execute('DELETE FROM events')
-    conn.execute('DELETE FROM users')
-    
-    # AVIATORS COACHING STAFF
-    coaches_staff = [
-        # Format: (username, password, role, first_name, last_name, email, phone, grade, parent_id)
-        ('coach.llevada', hash_password('Aviators2025!'), 'coach', 'Y', 'Llevada', 'y.llevada@aviators.edu', '555-0101', None, None),
-        ('coach.atherly', hash_password('Aviators2025!'), 'coach', 'Kat', 'Atherly', 'k.atherly@aviators.edu', '555-0102', None, None),
-    ]
-    
-    for user in coaches_staff:
-        conn.execute('''
-            INSERT INTO users (username, password, role, first_name, last_name, email, phone, grade, parent_id)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', user)
-    
-    # AVIATORS CHEERLEADING TEAM BY GRADE
-    # Temporary students for testing - replace after tryouts
-    
-    # 9TH GRADE CHEERLEADERS
-    ninth_graders = [
-        # Format: (username, password, role, first_name, last_name, email, phone, grade, parent_id)
-        ('emma.smith', hash_password('Aviators2025!'), 'student', 'Emma', 'Smith', 'emma.smith@student.aviators.edu', '555-1001', '9th', None),
-        ('sophia.johnson', hash_password('Aviators2025!'), 'student', 'Sophia', 'Johnson', 'sophia.johnson@student.aviators.edu', '555-1002', '9th', None),
-        ('olivia.williams', hash_password('Aviators2025!'), 'student', 'Olivia', 'Williams', 'olivia.williams@student.aviators.edu', '555-1003', '9th', None),
-    ]
-    
-    # 10TH GRADE CHEERLEADERS
-    tenth_graders = [
-        ('ava.brown', hash_password('Aviators2025!'), 'student', 'Ava', 'Brown', 'ava.brown@student.aviators.edu', '555-1101', '10th', None),
-        ('isabella.davis', hash_password('Aviators2025!'), 'student', 'Isabella', 'Davis', 'isabella.davis@student.aviators.edu', '555-1102', '10th', None),
-        ('mia.miller', hash_password('Aviators2025!'), 'student', 'Mia', 'Miller', 'mia.miller@student.aviators.edu', '555-1103', '10th', None),
-    ]
-    
-    # 11TH GRADE CHEERLEADERS
-    eleventh_graders = [
-        ('charlotte.wilson', hash_password('Aviators2025!'), 'student', 'Charlotte', 'Wilson', 'charlotte.wilson@student.aviators.edu', '555-1201', '11th', None),
-        ('amelia.moore', hash_password('Aviators2025!'), 'student', 'Amelia', 'Moore', 'amelia.moore@student.aviators.edu', '555-1202', '11th', None),
-        ('harper.taylor', hash_password('Aviators2025!'), 'student', 'Harper', 'Taylor', 'harper.taylor@student.aviators.edu', '555-1203', '11th', None),
-    ]
-    
-    # 12TH GRADE CHEERLEADERS (SENIORS)
-    seniors = [
-        ('evelyn.anderson', hash_password('Aviators2025!'), 'student', 'Evelyn', 'Anderson', 'evelyn.anderson@student.aviators.edu', '555-1301', '12th', None),
-        ('abigail.thomas', hash_password('Aviators2025!'), 'student', 'Abigail', 'Thomas', 'abigail.thomas@student.aviators.edu', '555-1302', '12th', None),
-        ('emily.jackson', hash_password('Aviators2025!'), 'student', 'Emily', 'Jackson', 'emily.jackson@student.aviators.edu', '555-1303', '12th', None),
-    ]
-    
-    # Insert all students
-    all_students = ninth_graders + tenth_graders + eleventh_graders + seniors
-    for student in all_students:
-        conn.execute('''
-            INSERT INTO users (username, password, role, first_name, last_name, email, phone, grade, parent_id)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', student)
-    
-    # GET COACH ID FOR EVENTS
-    coach_id = conn.execute('SELECT id FROM users WHERE role = "coach" LIMIT 1').fetchone()[0]
-    
-    # CREATE AVIATORS PRACTICE SCHEDULE AND EVENTS
-    today = datetime.now()
-    events = [
-        # THIS WEEK'S PRACTICES
-        ('Monday Practice', 'Regular team practice - stunts and tumbling', 'practice', 
-         (today + timedelta(days=1)).strftime('%Y-%m-%d'), '15:30', '17:30', 'Main Gym', coach_id),
-        
-        ('Wednesday Practice', 'Game routine practice', 'practice', 
-         (today + timedelta(days=3)).strftime('%Y-%m-%d'), '15:30', '17:30', 'Main Gym', coach_id),
-        
-        ('Friday Practice', 'Competition prep', 'practice', 
-         (today + timedelta(days=5)).strftime('%Y-%m-%d'), '15:30', '17:30', 'Main Gym', coach_id),
-        
-        # UPCOMING EVENTS
-        ('Team Meeting', 'Monthly team meeting and announcements', 'meeting', 
-         (today + timedelta(days=7)).strftime('%Y-%m-%d'), '16:00', '17:00', 'Conference Room', coach_id),
-        
-        ('Home Football Game', 'Halftime performance vs Eagles', 'performance', 
-         (today + timedelta(days=10)).strftime('%Y-%m-%d'), '18:00', '21:00', 'Aviators Stadium', coach_id),
-        
-        ('Regional Competition', 'Regional cheerleading competition', 'competition', 
-         (today + timedelta(days=21)).strftime('%Y-%m-%d'), '08:00', '18:00', 'Regional Sports Center', coach_id),
-        
-        ('Homecoming Performance', 'Homecoming halftime show', 'performance', 
-         (today + timedelta(days=28)).strftime('%Y-%m-%d'), '19:00', '22:00', 'Aviators Stadium', coach_id),
-        
-        ('Car Wash Fundraiser', 'Team fundraising event', 'fundraiser', 
-         (today + timedelta(days=35)).strftime('%Y-%m-%d'), '09:00', '15:00', 'School Parking Lot', coach_id),
-    ]
-    
-    for event in events:
-        conn.execute('''
-            INSERT INTO events (title, description, event_type, date, start_time, end_time, location, created_by)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', event)
-    
-    # ADD SAMPLE PARENTS (OPTIONAL)
-    # Get some student IDs for parent relationships
-    sample_students = conn.execute('SELECT id, first_name, last_name FROM users WHERE role = "student" LIMIT 3').fetchall()
-    
-    if sample_students:
-        sample_parents = [
-            ('parent.smith', hash_password('Aviators2025!'), 'parent', 'Robert', 'Smith', 'robert.smith@email.com', '555-2001', None, sample_students[0][0]),
-            ('parent.johnson', hash_password('Aviators2025!'), 'parent', 'Maria', 'Johnson', 'maria.johnson@email.com', '555-2002', None, sample_students[1][0]),
-            ('parent.williams', hash_password('Aviators2025!'), 'parent', 'David', 'Williams', 'david.williams@email.com', '555-2003', None, sample_students[2][0]),
-        ]
-        
-        for parent in sample_parents:
-            conn.execute('''
-                INSERT INTO users (username, password, role, first_name, last_name, email, phone, grade, parent_id)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', parent)
-    
-    # CREATE SAMPLE ACADEMIC REQUIREMENTS
-    student_ids = [row[0] for row in conn.execute('SELECT id FROM users WHERE role = "student" LIMIT 5').fetchall()]
-    
-    for student_id in student_ids:
-        requirements = [
-            (student_id, 'Mathematics', 80.0, None, 'Fall 2024', (today + timedelta(days=30)).strftime('%Y-%m-%d'), 'pending', 'Grade pending', coach_id),
-            (student_id, 'English', 75.0, None, 'Fall 2024', (today + timedelta(days=30)).strftime('%Y-%m-%d'), 'pending', 'Grade pending', coach_id),
-            (student_id, 'History', 75.0, None, 'Fall 2024', (today + timedelta(days=30)).strftime('%Y-%m-%d'), 'pending', 'Grade pending', coach_id),
-        ]
-        
-        for req in requirements:
-            conn.execute('''
-                INSERT INTO academic_requirements 
-                (student_id, subject, grade_required, current_grade, semester, due_date, status, notes, created_by)
+import main
+from passwords import hash_password
+from tenancy import Tenant
+
+FIRST_NAMES = [
+    'Emma', 'Sophia', 'Olivia', 'Ava', 'Isabella', 'Mia', 'Charlotte', 'Amelia',
+    'Harper', 'Evelyn', 'Abigail', 'Emily', 'Ella', 'Madison', 'Avery', 'Chloe',
+    'Layla', 'Riley', 'Zoey', 'Nora', 'Lily', 'Hannah', 'Addison', 'Aubrey',
+]
+LAST_NAMES = [
+    'Smith', 'Johnson', 'Williams', 'Brown', 'Davis', 'Miller', 'Wilson', 'Moore',
+    'Taylor', 'Anderson', 'Thomas', 'Jackson', 'White', 'Harris', 'Martin', 'Garcia',
+    'Clark', 'Lewis', 'Walker', 'Young', 'King', 'Wright', 'Lopez', 'Hill',
+]
+PARENT_NAMES = ['John', 'Maria', 'David', 'Jennifer', 'Robert', 'Linda', 'Michael', 'Susan']
+SUBJECTS = ['Mathematics', 'English', 'History', 'Science', 'Spanish', 'Chemistry']
+
+# (title, event_type, start, end, location, is_mandatory), drawn by weight
+EVENT_KINDS = [
+    ('Practice', 'practice', '15:30', '17:30', 'Main Gym', 1),
+    ('Practice', 'practice', '15:30', '17:30', 'Main Gym', 1),
+    ('Practice', 'practice', '15:30', '17:30', 'Main Gym', 1),
+    ('Practice', 'practice', '15:30', '17:30', 'Main Gym', 1),
+    ('Open Gym', 'practice', '16:00', '18:00', 'Auxiliary Gym', 0),
+    ('Home Game', 'performance', '18:00', '21:00', 'Aviators Stadium', 1),
+    ('Team Meeting', 'meeting', '16:00', '17:00', 'Conference Room', 0),
+    ('Competition', 'competition', '08:00', '18:00', 'Regional Sports Center', 1),
+    ('Car Wash Fundraiser', 'fundraiser', '09:00', '15:00', 'School Parking Lot', 0),
+]
+SEASON_DAYS = 180
+DEFAULT_PASSWORD = 'password123'
+
+
+def season_start(today, seasons_ago):
+    """Season start dates are August 1st; the newest season is the current school year."""
+    year = today.year if today.month >= 8 else today.year - 1
+    return date(year - seasons_ago, 8, 1)
+
+
+def generate(path, students=12, parent_rate=0.5, seasons=1, events_per_season=40,
+             attendance_rate=0.9, subjects=4, pending=0, seed=2025, password=DEFAULT_PASSWORD,
+             today=None, team=None, prefix='', director=True):
+    """Build a fresh team database at path and return the number of rows per table.
+
+    Each student attends past events with their own rate drawn around
+    attendance_rate; future events get no attendance. With a team key the
+    team's usernames replace its entries in main.user_directory.
+    """
+    rng = random.Random(seed)
+    today = today or date.today()
+    password_hash = hash_password(password)
+
+    main.close_db()
+    try:
+        with main.use_tenant(Tenant(team or 'demo', team or 'Demo', None, path)):
+            main.init_db()
+            conn = main.get_db()
+            conn.execute('BEGIN')
+            user_rows = []
+            if director:
+                user_rows.append(('director', 'athletic_director', 'Pat', 'Director', None, None, 'active'))
+            user_rows += [
+                (f'{prefix}coach', 'coach', 'Y', 'Llevada', None, None, 'active'),
+                (f'{prefix}assistant', 'assistant_coach', 'Kat', 'Atherly', None, None, 'active'),
+            ]
+            # Ids are assigned in insert order, so they are computed here rather than read back
+            coach_id = len(user_rows) - 1
+            next_id = len(user_rows) + 1
+            roster = []
+            for k in range(1, students + 1):
+                first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+                parent_id = None
+                # student1 always has one so every roster includes parent1
+                if k == 1 or rng.random() < parent_rate:
+                    parent_id = next_id
+                    user_rows.append((f'{prefix}parent{k}', 'parent', rng.choice(PARENT_NAMES), last,
+                                      None, None, 'active'))
+                    next_id += 1
+                status = 'pending' if k > students - pending else 'active'
+                user_rows.append((f'{prefix}student{k}', 'student', first, last, 9 + rng.randrange(4),
+                                  parent_id, status))
+                if status == 'active':
+                    # (id, personal attendance rate, punctuality in minutes)
+                    roster.append((next_id, min(1.0, max(0.0, rng.gauss(attendance_rate, 0.08))),
+                                   rng.choice([-10, -5, -5, 0, 0, 5])))
+                next_id += 1
+
+            conn.executemany('''
+                INSERT INTO users (username, password, role, first_name, last_name, email, grade,
+                                   parent_id, status)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', req)
-    
-    conn.commit()
-    conn.close()
-    print("✅ Aviators Cheerleading Team data created successfully!")
-    print("\n🏆 AVIATORS LOGIN CREDENTIALS:")
-    print("="*50)
-    print("COACHES:")
-    print("Coach Y. Llevada: coach.llevada / Aviators2025!")
-    print("Coach Kat Atherly: coach.atherly / Aviators2025!")
-    print("\nTEST STUDENTS (Replace after tryouts):")
-    print("All students: firstname.lastname / Aviators2025!")
-    print("Example: emma.smith / Aviators2025!")
-    print("\nPARENTS:")
-    print("Parents: parent.lastname / Aviators2025!")
-    print("Example: parent.smith / Aviators2025!")
-    print("="*50)
+            ''', ((username, password_hash, role, first, last,
+                   f"{username}@{'student.' if role == 'student' else ''}aviators.edu", grade, parent_id, status)
+                  for username, role, first, last, grade, parent_id, status in user_rows))
+
+            event_rows, events = [], []
+            for season in range(seasons):
+                start = season_start(today, seasons - 1 - season)
+                for j in range(events_per_season):
+                    day = start + timedelta(days=j * SEASON_DAYS // events_per_season)
+                    title, event_type, start_time, end_time, location, mandatory = rng.choice(EVENT_KINDS)
+                    event_rows.append((title, event_type, day.isoformat(), start_time, end_time,
+                                       location, mandatory, coach_id))
+                    events.append((len(event_rows), day, start_time, end_time))
+            conn.executemany('''
+                INSERT INTO events (title, event_type, date, start_time, end_time, location,
+                                    is_mandatory, created_by)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', event_rows)
+
+            def attendance_rows():
+                random_value = rng.random
+                for event_id, day, start_time, end_time in events:
+                    if day >= today:
+                        continue
+                    # Format each possible minute once per event instead of once per row
+                    starts = datetime.combine(day, datetime.strptime(start_time, '%H:%M').time())
+                    ends = datetime.combine(day, datetime.strptime(end_time, '%H:%M').time())
+                    sign_ins = [(starts + timedelta(minutes=m)).strftime('%Y-%m-%d %H:%M:%S')
+                                for m in range(-15, 16)]
+                    sign_outs = [(ends + timedelta(minutes=m)).strftime('%Y-%m-%d %H:%M:%S')
+                                 for m in range(-15, 11)]
+                    for user_id, rate, punctuality in roster:
+                        if random_value() < rate:
+                            yield (user_id, event_id,
+                                   sign_ins[punctuality + 10 + int(random_value() * 16)],
+                                   sign_outs[int(random_value() * 26)])
+
+            conn.executemany('''
+                INSERT INTO attendance (user_id, event_id, sign_in_time, sign_out_time, status)
+                VALUES (?, ?, ?, ?, 'completed')
+            ''', attendance_rows())
+
+            requirement_rows = [
+                (subject, rng.choice([70.0, 75.0, 80.0]), 'Fall', season_start(today, seasons_ago).year)
+                for seasons_ago in reversed(range(seasons))
+                for subject in SUBJECTS[:subjects]
+            ]
+            conn.executemany('''
+                INSERT INTO academic_requirements (subject, grade_required, semester, year)
+                VALUES (?, ?, ?, ?)
+            ''', requirement_rows)
+            conn.executemany('''
+                INSERT INTO student_grades (student_id, requirement_id, current_grade)
+                VALUES (?, ?, ?)
+            ''', ((user_id, requirement_id, round(min(100.0, rng.gauss(84, 9)), 1))
+                  for user_id, _, _ in roster
+                  for requirement_id in range(1, len(requirement_rows) + 1)))
+            conn.commit()
+
+            if team:
+                main.user_directory.replace(team, [row[0] for row in user_rows])
+            return {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                    for table in ('users', 'events', 'attendance', 'academic_requirements', 'student_grades')}
+    finally:
+        main.close_db()
+
+
+def generate_teams(tenants, seed=2025, **options):
+    """generate() every team's database; returns {team key: rows per table}."""
+    counts = {}
+    for n, tenant in enumerate(tenants):
+        counts[tenant.key] = generate(main.tenant_database(tenant), seed=seed + n, team=tenant.key,
+                                      prefix=f'{tenant.key}.' if n else '', director=not n, **options)
+    return counts
+
+
+def remove_database(path):
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description='Create a demo or synthetic Aviators database.')
+    parser.add_argument('--out', default=main.DATABASE,
+                        help='database file (replaced if it exists); ignored when TEAMS_CONFIG is set')
+    parser.add_argument('--students', type=int, default=12, help='students per team')
+    parser.add_argument('--parent-rate', type=float, default=0.5, help='share of students with a parent account')
+    parser.add_argument('--pending', type=int, default=0, help='students per team awaiting approval')
+    parser.add_argument('--seasons', type=int, default=1)
+    parser.add_argument('--events-per-season', type=int, default=40)
+    parser.add_argument('--attendance-rate', type=float, default=0.9)
+    parser.add_argument('--subjects', type=int, default=4, choices=range(1, len(SUBJECTS) + 1))
+    parser.add_argument('--seed', type=int, default=2025, help='random seed')
+    parser.add_argument('--today', type=date.fromisoformat, help='anchor date (YYYY-MM-DD) for reproducible runs')
+    parser.add_argument('--password', default=DEFAULT_PASSWORD)
+    args = parser.parse_args()
+    options = dict(students=args.students, parent_rate=args.parent_rate, seasons=args.seasons,
+                   events_per_season=args.events_per_season, attendance_rate=args.attendance_rate,
+                   subjects=args.subjects, pending=args.pending, password=args.password, today=args.today)
+
+    started = time.perf_counter()
+    if main.TEAMS_CONFIG:
+        for tenant in main.tenants:
+            remove_database(main.tenant_database(tenant))
+        counts = generate_teams(main.tenants, seed=args.seed, **options)
+    else:
+        remove_database(args.out)
+        # The default database is the default team's, so login finds its accounts
+        team = main.tenants.default.key if args.out == main.DATABASE else None
+        counts = {team: generate(args.out, seed=args.seed, team=team, **options)}
+    elapsed = time.perf_counter() - started
+    for team, team_counts in counts.items():
+        path = main.tenant_database(main.tenants.get(team)) if main.TEAMS_CONFIG else args.out
+        print(f'✅ Created {path}' + (f' for {team}' if main.TEAMS_CONFIG else ''))
+        for table, count in team_counts.items():
+            print(f'   {table:<22}{count:>12,}')
+    print(f'   in {elapsed:.1f}s')
+    print(f'\n🏆 Log in as coach, student1 or director / {args.password}')
+    for team in list(counts)[1:]:
+        print(f'   {team} team: {team}.coach, {team}.student1')
+
 
 if __name__ == '__main__':
-    create_aviators_data()
+    main_cli()
@@ -0,0 +1,123 @@
+"""Streaming JSON encoding for the list endpoints.
+
+A list built with fetchall() holds every row three times over before the
+first byte is sent: as sqlite3.Row objects, as dicts and as one encoded
+string. The encoders here read a cursor chunk_rows rows at a time, as plain
+tuples, and encode each chunk with a single dumps() call, so a request holds
+one chunk however long the list is and the first chunk goes out while SQLite
+is still producing the rest.
+
+encode_array() writes exactly what dumps() of the whole list would (a JSON
+array of objects followed by a newline), so cached and streamed bodies are
+byte for byte the same. encode_ndjson() writes one object per line instead,
+which clients can parse as it arrives.
+
+decode_array() goes the other way for uploads: it yields the items of a JSON
+array as they are read from a text stream, holding one item and one read
+chunk at a time.
+
+The cursor is read after the view has returned, while the response is being
+sent, so it must come from a connection that stays with the thread serving
+the request, and the rows must not depend on the request context.
+"""
+import itertools
+import json
+
+CHUNK_ROWS = 500
+READ_CHARS = 64 * 1024
+MAX_ITEM_CHARS = 64 * 1024
+
+
+def column_names(cursor):
+    return [column[0] for column in cursor.description]
+
+
+def fetch_rows(cursor, chunk_rows=CHUNK_ROWS):
+    """Yield a cursor's rows as plain tuples, fetching chunk_rows at a time."""
+    cursor.row_factory = None
+    try:
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                return
+            yield from rows
+    finally:
+        cursor.close()
+
+
+def _chunks(columns, rows, chunk_rows):
+    rows = iter(rows)
+    while True:
+        chunk = [dict(zip(columns, row)) for row in itertools.islice(rows, chunk_rows)]
+        if not chunk:
+            return
+        yield chunk
+
+
+def encode_array(columns, rows, dumps, chunk_rows=CHUNK_ROWS):
+    """Yield the JSON array of rows as objects keyed by columns, one chunk of rows at a time."""
+    separator = b'['
+    for chunk in _chunks(columns, rows, chunk_rows):
+        yield separator + dumps(chunk)[1:-1].encode()
+        separator = b', '
+    yield b'[]\n' if separator == b'[' else b']\n'
+
+
+def encode_ndjson(columns, rows, dumps, chunk_rows=CHUNK_ROWS):
+    """Yield rows as newline-delimited JSON objects, one chunk of rows at a time."""
+    for chunk in _chunks(columns, rows, chunk_rows):
+        yield ''.join(dumps(row) + '\n' for row in chunk).encode()
+
+
+def decode_array(text, read_chars=READ_CHARS, max_item_chars=MAX_ITEM_CHARS):
+    """Yield the items of the JSON array read from text, whose opening '[' has been consumed.
+
+    Raises ValueError for malformed JSON and for any item longer than
+    max_item_chars, which bounds the memory one item can take.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+    
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = text.read(read_chars)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+    
+    def next_char():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer) or eof:
+                return buffer[pos:pos + 1]
+            fill()
+    
+    if next_char() == ']':
+        return
+    while True:
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                # A number at the end of the buffer may continue in the next chunk
+                if end < len(buffer) or eof:
+                    break
+            if len(buffer) - pos > max_item_chars:
+                raise ValueError(f'array item longer than {max_item_chars} characters')
+            fill()
+        pos = end
+        yield item
+        separator = next_char()
+        if separator == ']':
+            return
+        if separator != ',':
+            raise ValueError("expected ',' or ']' after an array item")
+        pos += 1
+        next_char()
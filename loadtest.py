@@ -0,0 +1,614 @@
+"""Load test covering every /api route in main.py.
+
+    python create_demo_data.py --students 1000 --seasons 10 --out bench.db
+    python loadtest.py run --db bench.db --mode both --output results.json
+    python loadtest.py compare baseline.json results.json
+
+run copies the database (so every run starts from the same data), or
+generates one at the requested scale, and drives each route in turn. It goes
+through the Flask test client, through a real gunicorn process, or both, and
+writes throughput, p50/p95/p99 latency and the SQLite time reported in each
+response's Server-Timing header to a JSON file. compare diffs two such files and exits
+non-zero when a route regresses beyond the threshold.
+"""
+import argparse
+import contextlib
+import csv
+import gzip
+import http.client
+import io
+import json
+import os
+import random
+import re
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import main
+from benchmark import percentile, run_threads
+from create_demo_data import DEFAULT_PASSWORD, generate
+
+PASSWORD = DEFAULT_PASSWORD
+
+
+# Clients -------------------------------------------------------------------
+
+def decode_body(content, encoding):
+    if encoding == 'gzip':
+        return gzip.decompress(content)
+    if encoding == 'br':
+        import brotli
+        return brotli.decompress(content)
+    return content
+
+
+class FlaskClient:
+    def __init__(self, accept_encoding=None):
+        self.client = main.app.test_client()
+        self.headers = {'Accept-Encoding': accept_encoding} if accept_encoding else {}
+
+    def request(self, method, path, body=None, data=None, content_type=None, stream=False, headers=None):
+        kwargs = {'json': body} if body is not None else {'data': data, 'content_type': content_type}
+        response = self.client.open(path, method=method, buffered=not stream,
+                                    headers={**self.headers, **(headers or {})}, **kwargs)
+        if stream:
+            next(iter(response.response), None)
+            response.close()
+            return response.status_code, b'', None
+        content = decode_body(response.get_data(), response.headers.get('Content-Encoding'))
+        return response.status_code, content, response.headers.get('Server-Timing')
+
+
+class HttpClient:
+    def __init__(self, port, accept_encoding=None):
+        self.port = port
+        self.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        self.cookie = None
+        self.accept_encoding = accept_encoding
+
+    def request(self, method, path, body=None, data=None, content_type=None, stream=False, headers=None):
+        headers = dict(headers or {})
+        if self.accept_encoding:
+            headers['Accept-Encoding'] = self.accept_encoding
+        if body is not None:
+            data = json.dumps(body)
+            content_type = 'application/json'
+        if content_type:
+            headers['Content-Type'] = content_type
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+        payload = data.encode() if isinstance(data, str) else data
+
+        if stream:
+            conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+            conn.request(method, path, payload, headers)
+            response = conn.getresponse()
+            response.readline()
+            conn.close()
+            return response.status, b'', None
+
+        try:
+            self.conn.request(method, path, payload, headers)
+            response = self.conn.getresponse()
+        except (http.client.RemoteDisconnected, ConnectionError):
+            # The server closed an idle keep-alive connection; retry on a new one
+            self.conn.close()
+            self.conn.request(method, path, payload, headers)
+            response = self.conn.getresponse()
+
+        content = decode_body(response.read(), response.getheader('Content-Encoding'))
+        cookie = response.getheader('Set-Cookie')
+        if cookie:
+            self.cookie = cookie.split(';')[0]
+        return response.status, content, response.getheader('Server-Timing')
+
+
+def db_milliseconds(server_timing):
+    """The db;dur= entry of a Server-Timing header, as float milliseconds."""
+    match = server_timing and re.search(r'\bdb;dur=([\d.]+)', server_timing)
+    return float(match.group(1)) if match else None
+
+
+# Routes --------------------------------------------------------------------
+
+# make(ctx) returns the request to send; record(ctx, payload) keeps whatever
+# later routes need (created ids and so on).
+Route = namedtuple('Route', 'name role make record')
+
+
+class Context:
+    def __init__(self, thread, index, per_thread, args, state):
+        self.thread = thread
+        self.i = index
+        self.n = thread * per_thread + index
+        self.args = args
+        self.state = state
+
+    def created(self, kind):
+        return self.state.setdefault(kind, {}).setdefault(self.thread, [])
+
+    @property
+    def student_id(self):
+        return self.args.student_ids[self.thread % len(self.args.student_ids)]
+
+    def random_student(self):
+        return random.Random(self.n).choice(self.args.student_ids)
+
+
+def grades_csv(ctx):
+    rng = random.Random(ctx.n)
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(['student_id', 'requirement_id', 'grade'])
+    for _ in range(100):
+        writer.writerow([rng.choice(ctx.args.student_ids), rng.choice(ctx.args.requirement_ids),
+                         round(rng.uniform(50, 100), 1)])
+    return out.getvalue()
+
+
+def record_id(kind):
+    def record(ctx, payload):
+        ctx.created(kind).append(json.loads(payload)['id'])
+    return record
+
+
+def record_pending(ctx, payload):
+    ctx.state.setdefault('pending', [user['id'] for user in json.loads(payload)])
+
+
+def created_event(ctx):
+    events = ctx.created('events')
+    return events[ctx.i] if ctx.i < len(events) else None
+
+
+def event_request(method, suffix=''):
+    def make(ctx):
+        event_id = created_event(ctx)
+        if event_id is None:
+            return None
+        return {'method': method, 'path': f'/api/events/{event_id}{suffix}',
+                'body': {'title': f'Updated {ctx.n}'} if method == 'PUT' else None}
+    return make
+
+
+def created_series(ctx):
+    series = ctx.created('series')
+    return series[ctx.i] if ctx.i < len(series) else None
+
+
+def series_request(method):
+    def make(ctx):
+        series_id = created_series(ctx)
+        return series_id and {'method': method, 'path': f'/api/events/series/{series_id}',
+                              'body': {'location': f'Gym {ctx.n}'} if method == 'PUT' else None}
+    return make
+
+
+def occurrence_request(method, days_ahead):
+    def make(ctx):
+        series_id = created_series(ctx)
+        if series_id is None:
+            return None
+        day = datetime.now().date() + timedelta(days=days_ahead)
+        return {'method': method, 'path': f'/api/events/series/{series_id}/occurrences/{day}',
+                'body': {'title': f'Moved {ctx.n}', 'start_time': '17:00'} if method == 'PUT' else None}
+    return make
+
+
+def occurrence_sign_in(ctx):
+    series_id = created_series(ctx)
+    return series_id and {'method': 'POST', 'path': '/api/attendance/sign-in',
+                          'body': {'event_id': f'series:{series_id}:{datetime.now().date()}'}}
+
+
+def record_calendar(ctx, payload):
+    url = json.loads(payload)['url']
+    ctx.state.setdefault('calendar', {})[ctx.thread] = url[url.index('/api/'):]
+
+
+def calendar_feed(ctx):
+    path = ctx.state.get('calendar', {}).get(ctx.thread)
+    return path and {'method': 'GET', 'path': path}
+
+
+def attendance_request(path):
+    def make(ctx):
+        event_id = created_event(ctx)
+        return event_id and {'method': 'POST', 'path': path, 'body': {'event_id': event_id}}
+    return make
+
+
+def offline_sign_in(ctx):
+    # The same key every time it is called for ctx, so a second route replays it
+    event_id = created_event(ctx)
+    if event_id is None:
+        return None
+    client_time = (datetime.now() - timedelta(minutes=30)).isoformat(timespec='seconds')
+    return {'method': 'POST', 'path': '/api/attendance/sign-in',
+            'headers': {'Idempotency-Key': f'load-{ctx.state["run"]}-{ctx.n}'},
+            'body': {'event_id': event_id, 'client_time': client_time}}
+
+
+def record_sync(ctx, payload):
+    ctx.state.setdefault('sync', {})[ctx.thread] = json.loads(payload)['version']
+
+
+def sync_since(ctx):
+    version = ctx.state.get('sync', {}).get(ctx.thread)
+    return version is not None and {'method': 'GET', 'path': f'/api/sync?since={version}'}
+
+
+def bulk_sign_in(ctx):
+    event_id = created_event(ctx)
+    if event_id is None:
+        return None
+    entries = [{'user_id': user_id, 'event_id': event_id}
+               for user_id in ctx.args.student_ids[:40]]
+    return {'method': 'POST', 'path': '/api/attendance/bulk-sign-in', 'body': {'entries': entries}}
+
+
+def approve(ctx):
+    pending = ctx.state.get('pending', [])
+    if ctx.n >= len(pending):
+        return None
+    return {'method': 'POST', 'path': f'/api/users/{pending[ctx.n]}/approve',
+            'body': {'action': 'approve'}}
+
+
+def delete_requirement(ctx):
+    created = ctx.created('requirements')
+    if ctx.i >= len(created):
+        return None
+    return {'method': 'DELETE', 'path': f'/api/academics/requirements/{created[ctx.i]}'}
+
+
+def window(ctx):
+    today = datetime.now().date()
+    return f'/api/events?from={today - timedelta(days=30)}&to={today + timedelta(days=30)}'
+
+
+ROUTES = [
+    Route('POST /api/auth/login', 'student',
+          lambda ctx: {'method': 'POST', 'path': '/api/auth/login',
+                       'body': {'username': student_username(ctx.thread, ctx.args),
+                                'password': PASSWORD}}, None),
+    Route('GET /api/auth/me', 'student',
+          lambda ctx: {'method': 'GET', 'path': '/api/auth/me'}, None),
+    Route('POST /api/auth/register', 'student',
+          lambda ctx: {'method': 'POST', 'path': '/api/auth/register',
+                       'body': {'team_code': 'AVIATORS2025', 'username': f'bench.new{ctx.state["run"]}.{ctx.n}',
+                                'password': PASSWORD, 'role': 'student', 'first_name': 'New',
+                                'last_name': f'Athlete{ctx.n}', 'email': f'new{ctx.n}@example.com'}}, None),
+    Route('GET /api/users/pending', 'coach',
+          lambda ctx: {'method': 'GET', 'path': '/api/users/pending'}, record_pending),
+    Route('POST /api/users/<id>/approve', 'coach', approve, None),
+    Route('GET /api/users/students', 'coach',
+          lambda ctx: {'method': 'GET', 'path': '/api/users/students'}, None),
+    Route('GET /api/events', 'student',
+          lambda ctx: {'method': 'GET', 'path': '/api/events'}, None),
+    Route('GET /api/events?from&to', 'student',
+          lambda ctx: {'method': 'GET', 'path': window(ctx)}, None),
+    Route('GET /api/events?all=1', 'student',
+          lambda ctx: {'method': 'GET', 'path': '/api/events?all=1'}, None),
+    Route('GET /api/events/today', 'student',
+          lambda ctx: {'method': 'GET', 'path': '/api/events/today'}, None),
+    Route('GET /api/calendar/subscription', 'student',
+          lambda ctx: {'method': 'GET', 'path': '/api/calendar/subscription'}, record_calendar),
+    Route('GET /api/calendar/<token>.ics', 'student', calendar_feed, None),
+    Route('GET /api/sync', 'student',
+          lambda ctx: {'method': 'GET', 'path': '/api/sync'}, record_sync),
+    Route('POST /api/events', 'coach',
+          lambda ctx: {'method': 'POST', 'path': '/api/events',
+                       'body': {'title': f'Load test {ctx.n}', 'event_type': 'practice',
+                                'date': datetime.now().date().isoformat(), 'start_time': '18:00',
+                                'end_time': '19:00', 'location': 'Main Gym'}},
+          record_id('events')),
+    Route('PUT /api/events/<id>', 'coach', event_request('PUT'), None),
+    Route('POST /api/attendance/sign-in', 'student', attendance_request('/api/attendance/sign-in'), None),
+    Route('POST /api/attendance/sign-out', 'student', attendance_request('/api/attendance/sign-out'), None),
+    Route('POST /api/attendance/sign-in (offline)', 'student', offline_sign_in, None),
+    Route('POST /api/attendance/sign-in (replayed)', 'student', offline_sign_in, None),
+    Route('GET /api/sync?since', 'student', sync_since, None),
+    Route('POST /api/attendance/bulk-sign-in', 'coach', bulk_sign_in, None),
+    Route('POST /api/attendance/bulk-sign-out', 'coach',
+          attendance_request('/api/attendance/bulk-sign-out'), None),
+    Route('DELETE /api/events/<id>', 'coach', event_request('DELETE'), None),
+    Route('POST /api/events/series', 'coach',
+          lambda ctx: {'method': 'POST', 'path': '/api/events/series',
+                       'body': {'title': f'Load test series {ctx.n}', 'event_type': 'practice',
+                                'start_time': '18:00', 'end_time': '19:00', 'location': 'Main Gym',
+                                'weekdays': ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU'],
+                                'start_date': (datetime.now().date() - timedelta(days=28)).isoformat()}},
+          record_id('series')),
+    Route('GET /api/events/series', 'student',
+          lambda ctx: {'method': 'GET', 'path': '/api/events/series'}, None),
+    Route('POST /api/attendance/sign-in (occurrence)', 'student', occurrence_sign_in, None),
+    Route('PUT /api/events/series/<id>/occurrences/<date>', 'coach', occurrence_request('PUT', 7), None),
+    Route('DELETE /api/events/series/<id>/occurrences/<date>', 'coach', occurrence_request('DELETE', 14), None),
+    Route('PUT /api/events/series/<id>', 'coach', series_request('PUT'), None),
+    Route('DELETE /api/events/series/<id>', 'coach', series_request('DELETE'), None),
+    Route('GET /api/academics/requirements', 'student',
+          lambda ctx: {'method': 'GET', 'path': '/api/academics/requirements'}, None),
+    Route('POST /api/academics/requirements', 'coach',
+          lambda ctx: {'method': 'POST', 'path': '/api/academics/requirements',
+                       'body': {'subject': f'Elective {ctx.n}', 'grade_required': 65}},
+          record_id('requirements')),
+    Route('POST /api/students/<id>/grades', 'coach',
+          lambda ctx: {'method': 'POST', 'path': f'/api/students/{ctx.random_student()}/grades',
+                       'body': {'requirement_id': ctx.args.requirement_ids[ctx.n % len(ctx.args.requirement_ids)],
+                                'grade': 40 + ctx.n % 60}},
+          None),
+    Route('POST /api/academics/grades/import', 'coach',
+          lambda ctx: {'method': 'POST', 'path': '/api/academics/grades/import?format=csv',
+                       'data': grades_csv(ctx), 'content_type': 'text/csv'}, None),
+    Route('GET /api/academics/alerts', 'coach',
+          lambda ctx: {'method': 'GET', 'path': '/api/academics/alerts'}, None),
+    Route('GET /api/academics/alerts?student_id', 'student',
+          lambda ctx: {'method': 'GET', 'path': f'/api/academics/alerts?student_id={ctx.student_id}'}, None),
+    Route('GET /api/analytics/attendance', 'coach',
+          lambda ctx: {'method': 'GET', 'path': '/api/analytics/attendance'}, None),
+    Route('GET /api/analytics/attendance (student)', 'student',
+          lambda ctx: {'method': 'GET', 'path': '/api/analytics/attendance'}, None),
+    Route('DELETE /api/academics/requirements/<id>', 'coach', delete_requirement, None),
+    Route('GET /api/district/summary', 'director',
+          lambda ctx: {'method': 'GET', 'path': '/api/district/summary'}, None),
+    Route('GET /api/admin/cache-stats', 'coach',
+          lambda ctx: {'method': 'GET', 'path': '/api/admin/cache-stats'}, None),
+    Route('GET /metrics', 'coach',
+          lambda ctx: {'method': 'GET', 'path': '/metrics'}, None),
+    # A closed stream keeps its server thread until the next heartbeat, so
+    # each client opens only one
+    Route('GET /api/stream (first byte)', 'student',
+          lambda ctx: ctx.i == 0 and {'method': 'GET', 'path': '/api/stream', 'stream': True}, None),
+    Route('POST /api/auth/logout', 'student',
+          lambda ctx: {'method': 'POST', 'path': '/api/auth/logout'}, None),
+]
+
+
+def student_username(thread, args):
+    return f'student{thread % len(args.student_ids) + 1}'
+
+
+def login(client, username):
+    status, payload, _ = client.request('POST', '/api/auth/login',
+                                     body={'username': username, 'password': PASSWORD})
+    if status != 200:
+        raise RuntimeError(f'Could not log in as {username}: {status} {payload[:200]!r}')
+    return client
+
+
+def drive(make_client, args):
+    """Run every route in order and return {route name: stats}."""
+    per_thread = max(1, args.requests // args.threads)
+    state = {'run': int(time.time())}
+    clients = {}
+
+    def setup(thread):
+        if thread not in clients:
+            clients[thread] = {
+                'coach': login(make_client(), 'coach'),
+                'director': login(make_client(), 'director'),
+                'student': login(make_client(), student_username(thread, args)),
+            }
+        return thread
+
+    results = {}
+    for route in ROUTES:
+        latencies, db_times, errors = [], [], []
+
+        def work(thread):
+            client = clients[thread][route.role]
+            for index in range(per_thread):
+                ctx = Context(thread, index, per_thread, args, state)
+                spec = route.make(ctx)
+                if not spec:
+                    continue
+                start = time.perf_counter()
+                status, payload, server_timing = client.request(**spec)
+                latencies.append(time.perf_counter() - start)
+                db_times.append(db_milliseconds(server_timing))
+                if status >= 400:
+                    errors.append(f'{status} {payload[:120]!r}')
+                elif route.record:
+                    route.record(ctx, payload)
+
+        elapsed = run_threads(args.threads, setup, work)
+        results[route.name] = summarize(latencies, db_times, errors, elapsed)
+        if errors and args.verbose:
+            print(f'  {route.name}: {errors[0]}', file=sys.stderr)
+    return results
+
+
+def summarize(latencies, db_times, errors, elapsed):
+    if not latencies:
+        return {'requests': 0, 'errors': 0}
+    ms = lambda seconds: round(seconds * 1000, 3)
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'mean_ms': ms(statistics.mean(latencies)),
+        'p50_ms': ms(percentile(latencies, 0.50)),
+        'p95_ms': ms(percentile(latencies, 0.95)),
+        'p99_ms': ms(percentile(latencies, 0.99)),
+        'db_ms_mean': round(statistics.mean(db_times), 3) if None not in db_times else None,
+    }
+
+
+def run_flask(db_path, args):
+    original = main.SERVER_TIMING
+    main.close_db()
+    main.DATABASE = db_path
+    main.SERVER_TIMING = True
+    main.read_cache.clear()
+    try:
+        return drive(lambda: FlaskClient(args.accept_encoding), args)
+    finally:
+        main.SERVER_TIMING = original
+        main.close_db()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def gunicorn_server(db_path, workers, threads, env=None):
+    """Run gunicorn (gthread) against db_path and yield its port until the block exits."""
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}',
+         '--workers', str(workers), '--worker-class', 'gthread',
+         '--threads', str(threads), '--keep-alive', '30',
+         # Closed /api/stream responses linger until their next heartbeat
+         '--graceful-timeout', '1', '--log-level', 'warning', 'main:app'],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env={**os.environ, 'DATABASE': db_path, **(env or {})},
+    )
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline or server.poll() is not None:
+                    raise RuntimeError('gunicorn did not start')
+                time.sleep(0.1)
+        yield port
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def run_gunicorn(db_path, args):
+    with gunicorn_server(db_path, args.workers, args.threads * 2 + 2, {'SERVER_TIMING': '1'}) as port:
+        return drive(lambda: HttpClient(port, args.accept_encoding), args)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(mode, routes):
+    print(f'\n{mode}')
+    print(f"{'route':<52}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'db':>8}{'err':>5}")
+    for name, stats in routes.items():
+        if not stats['requests']:
+            continue
+        db = f"{stats['db_ms_mean']:.2f}" if stats['db_ms_mean'] is not None else '-'
+        print(f"{name:<52}{stats['throughput_rps']:>9.1f}{stats['p50_ms']:>9.2f}"
+              f"{stats['p95_ms']:>9.2f}{stats['p99_ms']:>9.2f}{db:>8}{stats['errors']:>5}")
+
+
+def cmd_run(args):
+    results = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'threads': args.threads,
+        'accept_encoding': args.accept_encoding,
+        'requests_per_route': args.requests,
+        'modes': {},
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        source = args.db
+        if not source:
+            source = os.path.join(workdir, 'seed.db')
+            generate(source, students=args.students, seasons=args.seasons,
+                     events_per_season=args.events_per_season, attendance_rate=args.attendance_rate,
+                     seed=args.seed)
+        with sqlite3.connect(source) as conn:
+            args.student_ids = [row[0] for row in conn.execute('''
+                SELECT id FROM users WHERE role = 'student' AND username GLOB 'student*' AND status = 'active'
+                ORDER BY id
+            ''')]
+            args.requirement_ids = [row[0] for row in conn.execute('SELECT id FROM academic_requirements')]
+            results['scale'] = {
+                table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                for table in ('users', 'events', 'attendance', 'student_grades')
+            }
+
+        modes = ['flask', 'gunicorn'] if args.mode == 'both' else [args.mode]
+        for mode in modes:
+            db_path = os.path.join(workdir, f'{mode}.db')
+            with sqlite3.connect(source) as src, sqlite3.connect(db_path) as dst:
+                src.backup(dst)
+            runner = run_flask if mode == 'flask' else run_gunicorn
+            results['modes'][mode] = runner(db_path, args)
+            print_table(mode, results['modes'][mode])
+
+    if args.output:
+        with open(args.output, 'w') as out:
+            json.dump(results, out, indent=2)
+        print(f'\nWrote {args.output}')
+
+
+def cmd_compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    regressions = 0
+    print(f"{'mode / route':<54}{'p95 before':>12}{'p95 after':>12}{'change':>9}")
+    for mode, routes in candidate['modes'].items():
+        for name, after in routes.items():
+            before = baseline.get('modes', {}).get(mode, {}).get(name)
+            if not before or not before.get('requests') or not after.get('requests'):
+                continue
+            change = (after['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100
+            flag = ''
+            if change > args.threshold:
+                regressions += 1
+                flag = '  REGRESSION'
+            print(f"{mode + ' ' + name:<54}{before['p95_ms']:>10.2f}ms{after['p95_ms']:>10.2f}ms"
+                  f'{change:>8.1f}%{flag}')
+    if regressions:
+        raise SystemExit(1)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='drive every route and report latency')
+    run.add_argument('--db', help='database from create_demo_data.py to copy instead of generating one')
+    run.add_argument('--students', type=int, default=200)
+    run.add_argument('--seasons', type=int, default=2)
+    run.add_argument('--events-per-season', type=int, default=150)
+    run.add_argument('--attendance-rate', type=float, default=0.9)
+    run.add_argument('--seed', type=int, default=2025, help='random seed')
+    run.add_argument('--mode', choices=['flask', 'gunicorn', 'both'], default='flask')
+    run.add_argument('--requests', type=int, default=200, help='requests per route')
+    run.add_argument('--threads', type=int, default=4, help='concurrent clients')
+    run.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+    run.add_argument('--accept-encoding', help="Accept-Encoding header to send, e.g. 'gzip, br'")
+    run.add_argument('--output', help='write results as JSON')
+    run.add_argument('--verbose', action='store_true', help='print the first error per route')
+    run.set_defaults(run=cmd_run)
+
+    compare = commands.add_parser('compare', help='diff two result files')
+    compare.add_argument('baseline')
+    compare.add_argument('candidate')
+    compare.add_argument('--threshold', type=float, default=10.0, help='allowed p95 increase in percent')
+    compare.set_defaults(run=cmd_compare)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == '__main__':
+    main_cli()
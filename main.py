@@ -1,27 +1,310 @@
-from flask import Flask, request, jsonify, session, send_from_directory
+from flask import Flask, request, jsonify, session, send_from_directory, make_response, g, has_request_context
 from flask_cors import CORS
+import click
+import codecs
+import contextlib
 import sqlite3
-import hashlib
+import base64
+import csv
+import functools
+import heapq
+import hmac
 import os
-from datetime import datetime, timedelta
+import re
+import secrets
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
 import json
 
-app = Flask(__name__, static_folder='static', static_url_path='')
+from admission import AdmissionController
+from assets import AssetBundle
+from cache import LocalBackend, ReadCache
+from changefeed import ChangeFeed
+from compaction import Archive, PeriodicJob, close_stale_attendance, compact_days, oldest_compactable_day
+from compression import ResponseCompressor
+from jsonstream import column_names, decode_array, encode_array, encode_ndjson, fetch_rows
+from metrics import Metrics
+from passwords import HasherBusy, PasswordHasher, needs_upgrade
+from sessions import SQLiteSessionStore, ServerSessionInterface, TTLCache
+from tenancy import MAX_ATTACHED, ConnectionCache, Tenant, TenantRegistry, UserDirectory, attached
+from writequeue import AttendanceWriteQueue, QueueFull
+
+app = Flask(__name__, static_folder=None)
 app.secret_key = 'your-secret-key-change-in-production'
 CORS(app, supports_credentials=True)
 
-DATABASE = 'database/app.db'
+DATABASE = os.environ.get('DATABASE', 'database/app.db')
 
-def get_db():
-    conn = sqlite3.connect(DATABASE)
+# Teams and their database files; see tenancy.py. Without TEAMS_CONFIG there
+# is one team, whose database is DATABASE.
+TEAMS_CONFIG = os.environ.get('TEAMS_CONFIG')
+TEAM_CODE = os.environ.get('TEAM_CODE', 'AVIATORS2025')
+TENANT_MAX_CONNECTIONS = int(os.environ.get('TENANT_MAX_CONNECTIONS', 4))
+
+tenants = (TenantRegistry.load(TEAMS_CONFIG) if TEAMS_CONFIG
+           else TenantRegistry([Tenant('aviators', 'Aviators', TEAM_CODE, None)]))
+
+# Username -> team lookup for login, shared by every team
+USER_DIRECTORY_DATABASE = os.environ.get('USER_DIRECTORY_DATABASE', 'database/directory.db')
+
+user_directory = UserDirectory(USER_DIRECTORY_DATABASE)
+
+# SQLite connection tuning, applied once when a connection is opened
+DB_BUSY_TIMEOUT_MS = 5000
+DB_CACHE_SIZE_KB = 16384
+DB_MMAP_SIZE = 128 * 1024 * 1024
+
+# Connections are kept per worker thread and reused across requests, one
+# per team database the thread has served recently
+_db_local = threading.local()
+
+# Per-request timing and SQL profiling, exposed on /metrics; see metrics.py
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '0') == '1'
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+metrics = Metrics(slow_query_seconds=SLOW_QUERY_MS / 1000)
+
+# sqlite3.Connection subclass used for new connections
+DB_CONNECTION_FACTORY = metrics.connection_factory() if METRICS_ENABLED else sqlite3.Connection
+
+def connect_db(path=None):
+    conn = sqlite3.connect(path or DATABASE, timeout=DB_BUSY_TIMEOUT_MS / 1000,
+                           factory=DB_CONNECTION_FACTORY)
     conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute(f'PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}')
+    conn.execute(f'PRAGMA cache_size = -{DB_CACHE_SIZE_KB}')
+    conn.execute(f'PRAGMA mmap_size = {DB_MMAP_SIZE}')
     return conn
 
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+def tenant_database(tenant):
+    return tenant.database or DATABASE
+
+def current_tenant():
+    """The team whose database get_db() opens.
+
+    Background jobs pick one with use_tenant(); requests use the team in
+    their session, resolved by load_tenant().
+    """
+    tenant = getattr(_db_local, 'tenant', None)
+    if tenant is None and has_request_context():
+        tenant = g.get('tenant')
+    return tenant or tenants.default
+
+@contextlib.contextmanager
+def use_tenant(tenant):
+    previous = getattr(_db_local, 'tenant', None)
+    _db_local.tenant = tenant
+    try:
+        yield tenant
+    finally:
+        _db_local.tenant = previous
+
+def tenant_db(tenant):
+    connections = getattr(_db_local, 'connections', None)
+    # Start afresh after a fork (gunicorn preload)
+    if connections is None or _db_local.pid != os.getpid():
+        connections = ConnectionCache(connect_db, max_open=TENANT_MAX_CONNECTIONS)
+        _db_local.connections = connections
+        _db_local.pid = os.getpid()
+    return connections.get(tenant_database(tenant))
+
+def get_db():
+    return tenant_db(current_tenant())
+
+def close_db():
+    """Close this thread's connections; the next get_db() opens fresh ones."""
+    connections = getattr(_db_local, 'connections', None)
+    if connections is not None:
+        # A cache inherited across a fork belongs to the parent; leave its handles alone
+        if _db_local.pid == os.getpid():
+            connections.close()
+        _db_local.connections = None
+
+@app.before_request
+def load_tenant():
+    tenant = tenants.get(session.get('team', tenants.default.key))
+    if tenant is None:
+        # The team was removed from TEAMS_CONFIG; its user ids mean nothing elsewhere
+        session.clear()
+    g.tenant = tenant
+
+@app.teardown_appcontext
+def release_db(exc):
+    # Connections stay open for the next request on this thread; just make
+    # sure nothing a failed request left uncommitted leaks into them.
+    for conn in getattr(_db_local, 'connections', None) or ():
+        if conn.in_transaction:
+            conn.rollback()
+
+def request_route():
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    if METRICS_ENABLED:
+        metrics.begin_request(request_route())
+
+@app.after_request
+def record_request_metrics(response):
+    if not METRICS_ENABLED or 'request_started' not in g:
+        return response
+    seconds = time.perf_counter() - g.request_started
+    stats = metrics.end_request(request.method, request_route(), response.status_code,
+                               seconds, response.content_length)
+    if SERVER_TIMING and stats is not None:
+        response.headers['Server-Timing'] = (
+            f'app;dur={seconds * 1000:.2f}, '
+            f'db;dur={stats.db_seconds * 1000:.2f};desc="{stats.queries} queries, {stats.rows} rows"'
+            + (f', compress;dur={g.compress_seconds * 1000:.2f}' if g.get('compress_seconds') else '')
+        )
+    return response
+
+# Response compression for JSON and other text API bodies; see compression.py.
+# Registered after the metrics hook so it runs first and the metrics see the
+# bytes actually sent.
+COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', '1') == '1'
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))
+COMPRESS_GZIP_LEVEL = int(os.environ.get('COMPRESS_GZIP_LEVEL', 6))
+COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 4))
+
+compressor = ResponseCompressor(min_bytes=COMPRESS_MIN_BYTES, gzip_level=COMPRESS_GZIP_LEVEL,
+                                brotli_quality=COMPRESS_BROTLI_QUALITY)
+
+@app.after_request
+def compress_response(response):
+    if COMPRESS_ENABLED:
+        g.compress_seconds = compressor.compress(response, request.accept_encodings)
+    return response
+
+metrics.add_collector(lambda: [
+    ('http_compressed_responses_total', 'counter', 'Responses sent compressed.', compressor.responses),
+    ('http_compression_reused_total', 'counter', 'Compressed bodies reused from memory.',
+     compressor.memo_hits),
+    ('http_compression_input_bytes_total', 'counter', 'Bytes before compression.', compressor.bytes_in),
+    ('http_compression_output_bytes_total', 'counter', 'Bytes after compression.', compressor.bytes_out),
+    ('http_compression_seconds_total', 'counter', 'Time spent compressing responses.', compressor.seconds),
+] if COMPRESS_ENABLED else [])
+
+# Admission control: with ADMISSION_CONTROL=1, each worker runs at most a
+# pool's limit of reads or writes at once, queues a few more briefly and
+# answers the rest with 503 + Retry-After; see admission.py.
+# ADMISSION_ROUTE_LIMITS gives routes pools of their own, e.g.
+# 'POST /api/auth/register=2:4, POST /api/students/<int:student_id>/grades=2:8'.
+ADMISSION_CONTROL = os.environ.get('ADMISSION_CONTROL', '0') == '1'
+ADMISSION_READ_LIMIT = int(os.environ.get('ADMISSION_READ_LIMIT', 32))
+ADMISSION_READ_QUEUE = int(os.environ.get('ADMISSION_READ_QUEUE', 32))
+ADMISSION_WRITE_LIMIT = int(os.environ.get('ADMISSION_WRITE_LIMIT', 4))
+ADMISSION_WRITE_QUEUE = int(os.environ.get('ADMISSION_WRITE_QUEUE', 8))
+ADMISSION_MAX_WAIT_MS = float(os.environ.get('ADMISSION_MAX_WAIT_MS', 250))
+ADMISSION_ROUTE_LIMITS = os.environ.get('ADMISSION_ROUTE_LIMITS', 'POST /api/auth/register=2:4')
+ADMISSION_RETRY_AFTER = '1'
+
+admission = AdmissionController(
+    read=(ADMISSION_READ_LIMIT, ADMISSION_READ_QUEUE),
+    write=(ADMISSION_WRITE_LIMIT, ADMISSION_WRITE_QUEUE),
+    routes=AdmissionController.parse_routes(ADMISSION_ROUTE_LIMITS),
+    max_wait=ADMISSION_MAX_WAIT_MS / 1000,
+    # Live streams stay open for minutes and would pin a slot each
+    exempt={'/api/stream'}
+)
+
+@app.before_request
+def admit_request():
+    pool = admission.pool_for(request.method, request_route()) if ADMISSION_CONTROL else None
+    if pool is None:
+        return None
+    if not pool.acquire():
+        return jsonify({'error': 'Server busy, please try again'}), 503, {'Retry-After': ADMISSION_RETRY_AFTER}
+    g.admission_release = pool.releaser()
+    return None
+
+@app.after_request
+def release_admission_on_close(response):
+    release = g.get('admission_release')
+    if release is not None:
+        # Streamed bodies are sent after teardown, so the slot is held until the server closes the response
+        response.call_on_close(release)
+    return response
+
+@app.teardown_request
+def release_admission(exc):
+    release = g.pop('admission_release', None)
+    # A request that raised may never have made the response that would release it
+    if release is not None and exc is not None:
+        release()
+
+metrics.add_collector(lambda: [
+    ('admission_in_flight', 'gauge', 'Requests running, by admission pool.',
+     [({'pool': pool.name}, pool.active) for pool in admission.pools()]),
+    ('admission_queue_depth', 'gauge', 'Requests waiting for a slot, by admission pool.',
+     [({'pool': pool.name}, pool.waiting) for pool in admission.pools()]),
+    ('admission_admitted_total', 'counter', 'Requests admitted, by admission pool.',
+     [({'pool': pool.name}, pool.admitted) for pool in admission.pools()]),
+    ('admission_shed_total', 'counter', 'Requests refused with 503, by admission pool.',
+     [({'pool': pool.name}, pool.shed) for pool in admission.pools()]),
+    ('admission_wait_seconds_total', 'counter', 'Time spent waiting for a slot, by admission pool.',
+     [({'pool': pool.name}, pool.wait_seconds) for pool in admission.pools()]),
+] if ADMISSION_CONTROL else [])
+
+# Server-side sessions, and the signed-in user's record loaded once per
+# request into g.user for every role check. Each worker caches both and
+# drops them whenever the session store changes; see sessions.py.
+SESSION_DATABASE = os.environ.get('SESSION_DATABASE', 'database/sessions.db')
+SESSION_CACHE_SECONDS = float(os.environ.get('SESSION_CACHE_SECONDS', 300))
+USER_CACHE_SECONDS = float(os.environ.get('USER_CACHE_SECONDS', 60))
+
+user_cache = TTLCache(USER_CACHE_SECONDS)
+session_store = SQLiteSessionStore(SESSION_DATABASE, timeout=DB_BUSY_TIMEOUT_MS / 1000)
+app.session_interface = ServerSessionInterface(session_store, cache_seconds=SESSION_CACHE_SECONDS,
+                                               dependents=[user_cache])
+
+@app.before_request
+def load_user():
+    g.user = None
+    if 'user_id' not in session:
+        return
+    key = (current_tenant().key, session['user_id'])
+    user = user_cache.get(key)
+    if user is None:
+        row = get_db().execute('''
+            SELECT id, username, role, first_name, last_name, email, status FROM users WHERE id = ?
+        ''', (session['user_id'],)).fetchone()
+        user = dict(row) if row else {}
+        user_cache.set(key, user)
+    if not user or user['status'] == 'pending':
+        # The account was removed or unapproved since this session began
+        session.clear()
+        return
+    g.user = user
+
+def forget_user(user_id):
+    """Reload a changed user's record, in every worker, on their next request."""
+    user_cache.pop((current_tenant().key, user_id))
+    app.session_interface.invalidate()
+
+metrics.add_collector(lambda: [
+    ('session_cache_hits_total', 'counter', 'Sessions answered from worker memory.',
+     app.session_interface.cache.hits),
+    ('session_store_reads_total', 'counter', 'Sessions read from the session store.', session_store.reads),
+    ('session_cache_flushes_total', 'counter', 'Session and user caches dropped after a store change.',
+     app.session_interface.flushes),
+    ('user_cache_hits_total', 'counter', 'Signed-in user records answered from worker memory.', user_cache.hits),
+    ('user_cache_misses_total', 'counter', 'Signed-in user records read from the database.', user_cache.misses),
+])
+
+# Password hashing runs on a CPU-sized pool; see passwords.py
+password_hasher = PasswordHasher()
 
 def init_db():
-    os.makedirs('database', exist_ok=True)
+    """Create or migrate the current team's database."""
+    os.makedirs(os.path.dirname(tenant_database(current_tenant())) or '.', exist_ok=True)
     conn = get_db()
     
     # Users table with status field for approval system
@@ -102,7 +385,496 @@ def init_db():
     ''')
     
     conn.commit()
-    conn.close()
+    migrate_db(conn)
+
+# Schema migrations, applied in order by init_db() and tracked in
+# PRAGMA user_version. Only ever append; never edit a step that has shipped.
+MIGRATIONS = [
+    # 1: indexes for the hot lookup paths
+    '''
+    CREATE INDEX IF NOT EXISTS idx_attendance_open
+        ON attendance (user_id, event_id) WHERE sign_out_time IS NULL;
+    CREATE INDEX IF NOT EXISTS idx_attendance_event ON attendance (event_id);
+    CREATE INDEX IF NOT EXISTS idx_events_date ON events (date, start_time);
+    CREATE INDEX IF NOT EXISTS idx_users_role_name ON users (role, last_name, first_name);
+    CREATE INDEX IF NOT EXISTS idx_users_status_created ON users (status, created_at);
+    CREATE INDEX IF NOT EXISTS idx_student_grades_requirement ON student_grades (requirement_id);
+    ''',
+    # 2: per-table change counters behind the ETag / Last-Modified headers
+    '''
+    CREATE TABLE IF NOT EXISTS table_versions (
+        table_name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    INSERT OR IGNORE INTO table_versions (table_name)
+    VALUES ('users'), ('events'), ('academic_requirements'), ('student_grades');
+    ''',
+    # 3: academic alerts materialized from the grades join, kept current by triggers
+    '''
+    CREATE VIEW IF NOT EXISTS academic_alerts_live AS
+        SELECT sg.student_id, sg.requirement_id, u.first_name, u.last_name,
+               ar.subject, ar.grade_required, sg.current_grade
+        FROM student_grades sg
+        JOIN users u ON sg.student_id = u.id
+        JOIN academic_requirements ar ON sg.requirement_id = ar.id
+        WHERE sg.current_grade < ar.grade_required
+        AND u.role = 'student';
+    
+    CREATE TABLE IF NOT EXISTS academic_alerts (
+        student_id INTEGER NOT NULL,
+        requirement_id INTEGER NOT NULL,
+        first_name TEXT NOT NULL,
+        last_name TEXT NOT NULL,
+        subject TEXT NOT NULL,
+        grade_required REAL NOT NULL,
+        current_grade REAL,
+        PRIMARY KEY (student_id, requirement_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_academic_alerts_name ON academic_alerts (last_name, first_name);
+    INSERT OR REPLACE INTO academic_alerts SELECT * FROM academic_alerts_live;
+    
+    CREATE TRIGGER IF NOT EXISTS academic_alerts_grade_insert AFTER INSERT ON student_grades
+    BEGIN
+        INSERT OR REPLACE INTO academic_alerts SELECT * FROM academic_alerts_live
+        WHERE student_id = NEW.student_id AND requirement_id = NEW.requirement_id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS academic_alerts_grade_update AFTER UPDATE ON student_grades
+    BEGIN
+        DELETE FROM academic_alerts
+        WHERE student_id = OLD.student_id AND requirement_id = OLD.requirement_id;
+        INSERT OR REPLACE INTO academic_alerts SELECT * FROM academic_alerts_live
+        WHERE student_id = NEW.student_id AND requirement_id = NEW.requirement_id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS academic_alerts_grade_delete AFTER DELETE ON student_grades
+    BEGIN
+        DELETE FROM academic_alerts
+        WHERE student_id = OLD.student_id AND requirement_id = OLD.requirement_id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS academic_alerts_requirement_update AFTER UPDATE ON academic_requirements
+    BEGIN
+        DELETE FROM academic_alerts WHERE requirement_id = OLD.id;
+        INSERT OR REPLACE INTO academic_alerts SELECT * FROM academic_alerts_live
+        WHERE requirement_id = NEW.id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS academic_alerts_requirement_delete AFTER DELETE ON academic_requirements
+    BEGIN
+        DELETE FROM academic_alerts WHERE requirement_id = OLD.id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS academic_alerts_user_update
+    AFTER UPDATE OF role, first_name, last_name ON users
+    BEGIN
+        DELETE FROM academic_alerts WHERE student_id = OLD.id;
+        INSERT OR REPLACE INTO academic_alerts SELECT * FROM academic_alerts_live
+        WHERE student_id = NEW.id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS academic_alerts_user_delete AFTER DELETE ON users
+    BEGIN
+        DELETE FROM academic_alerts WHERE student_id = OLD.id;
+    END;
+    ''',
+    # 4: append-only log of committed changes, tailed by the live stream
+    '''
+    CREATE TABLE IF NOT EXISTS change_log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        topic TEXT NOT NULL,
+        action TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    INSERT OR IGNORE INTO table_versions (table_name) VALUES ('attendance');
+    ''',
+    # 5: per-athlete, per-event-type, per-day rollup of compacted attendance
+    '''
+    CREATE TABLE IF NOT EXISTS attendance_daily (
+        day DATE NOT NULL,
+        user_id INTEGER NOT NULL,
+        event_type TEXT NOT NULL,
+        attended INTEGER NOT NULL,
+        mandatory_attended INTEGER NOT NULL,
+        late INTEGER NOT NULL,
+        minutes_late REAL NOT NULL,
+        completed INTEGER NOT NULL,
+        minutes_on_site REAL NOT NULL,
+        PRIMARY KEY (day, user_id, event_type)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_attendance_daily_user ON attendance_daily (user_id, day);
+    ''',
+    # 6: secret tokens for the per-user iCalendar feed URLs
+    '''
+    ALTER TABLE users ADD COLUMN calendar_token TEXT;
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_users_calendar_token ON users (calendar_token);
+    ''',
+    # 7: weekly recurring event series, expanded into occurrences when read
+    '''
+    CREATE TABLE IF NOT EXISTS event_series (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        description TEXT,
+        event_type TEXT NOT NULL,
+        start_time TIME NOT NULL,
+        end_time TIME,
+        location TEXT,
+        is_mandatory BOOLEAN DEFAULT 0,
+        weekdays INTEGER NOT NULL,
+        start_date DATE NOT NULL,
+        until DATE,
+        created_by INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (created_by) REFERENCES users (id)
+    );
+    CREATE TABLE IF NOT EXISTS event_series_exceptions (
+        series_id INTEGER NOT NULL,
+        occurrence_date DATE NOT NULL,
+        PRIMARY KEY (series_id, occurrence_date)
+    ) WITHOUT ROWID;
+    ALTER TABLE events ADD COLUMN series_id INTEGER REFERENCES event_series (id);
+    ALTER TABLE events ADD COLUMN occurrence_date DATE;
+    ALTER TABLE events ADD COLUMN overridden BOOLEAN DEFAULT 0;
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_events_series_occurrence ON events (series_id, occurrence_date);
+    ''',
+    # 8: idempotency keys of sign-ins and sign-outs replayed by offline clients
+    '''
+    CREATE TABLE IF NOT EXISTS attendance_requests (
+        user_id INTEGER NOT NULL,
+        idempotency_key TEXT NOT NULL,
+        action TEXT NOT NULL,
+        event_id INTEGER,
+        client_time TIMESTAMP,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (user_id, idempotency_key)
+    ) WITHOUT ROWID;
+    ''',
+]
+
+def migrate_db(conn):
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    for number, script in enumerate(MIGRATIONS[version:], start=version + 1):
+        conn.executescript(f'BEGIN; {script}; PRAGMA user_version = {number}; COMMIT;')
+
+def init_tenants():
+    for tenant in tenants:
+        with use_tenant(tenant):
+            init_db()
+            # Accounts may have been added straight to the database (demo data, restores)
+            usernames = [row['username'] for row in get_db().execute('SELECT username FROM users')]
+            user_directory.replace(tenant.key, usernames)
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create or migrate every team's database."""
+    init_tenants()
+    for tenant in tenants:
+        print(f'{tenant.key}: {tenant_database(tenant)} is at schema version {len(MIGRATIONS)}.')
+
+def team_option(every=False):
+    """Add --team to a CLI command, which then runs against that team's database.
+
+    Without --team the command runs for the first team, or for every team in
+    turn when every=True.
+    """
+    def decorator(command):
+        @click.option('--team', 'team_key', type=click.Choice([tenant.key for tenant in tenants]),
+                      help='Team to run for; defaults to ' + ('every team.' if every else 'the first team.'))
+        @functools.wraps(command)
+        def wrapper(team_key, **kwargs):
+            if team_key:
+                chosen = [tenants.get(team_key)]
+            else:
+                chosen = list(tenants) if every else [tenants.default]
+            for tenant in chosen:
+                if len(chosen) > 1:
+                    print(f'{tenant.key}:')
+                with use_tenant(tenant):
+                    command(**kwargs)
+        return wrapper
+    return decorator
+
+def check_academic_alerts(conn, rebuild=False):
+    """Diff academic_alerts against the live grades join, optionally rebuilding it.
+
+    Returns (missing, stale): rows the table lacks and rows it should not hold.
+    """
+    missing = conn.execute('''
+        SELECT * FROM academic_alerts_live EXCEPT SELECT * FROM academic_alerts
+    ''').fetchall()
+    stale = conn.execute('''
+        SELECT * FROM academic_alerts EXCEPT SELECT * FROM academic_alerts_live
+    ''').fetchall()
+    if rebuild:
+        conn.execute('DELETE FROM academic_alerts')
+        conn.execute('INSERT INTO academic_alerts SELECT * FROM academic_alerts_live')
+        commit_changes(conn, 'student_grades')
+    return missing, stale
+
+@app.cli.command('check-alerts')
+@team_option()
+@click.option('--rebuild', is_flag=True, help='Rebuild academic_alerts from scratch.')
+def check_alerts_command(rebuild):
+    """Compare the academic_alerts table with the live grades join."""
+    missing, stale = check_academic_alerts(get_db(), rebuild=rebuild)
+    for row in missing:
+        print(f"missing: student {row['student_id']} requirement {row['requirement_id']}")
+    for row in stale:
+        print(f"stale: student {row['student_id']} requirement {row['requirement_id']}")
+    if rebuild:
+        print('academic_alerts rebuilt.')
+    elif missing or stale:
+        raise SystemExit(1)
+    else:
+        print('academic_alerts is consistent.')
+
+# Requests replayed by check_query_plans(): every statement they issue must be
+# answered from an index rather than a full table scan.
+HOT_ROUTES = [
+    ('POST', '/api/attendance/sign-in', {'event_id': 1}),
+    ('POST', '/api/attendance/sign-out', {'event_id': 1}),
+    ('GET', '/api/sync?since=0', None),
+    ('GET', '/api/events', None),
+    ('GET', '/api/events?from=2025-01-01&to=2025-12-31', None),
+    ('GET', '/api/events/today', None),
+    ('GET', '/api/users/students', None),
+    ('GET', '/api/users/pending', None),
+    ('GET', '/api/academics/alerts', None),
+    ('GET', '/api/academics/alerts?student_id=1', None),
+    ('DELETE', '/api/events/1', None),
+    ('GET', '/api/calendar/subscription', None),
+    ('GET', '/api/calendar/plan-token.ics', None),
+]
+
+def find_full_scans(conn, statement):
+    scans = []
+    for row in conn.execute(f'EXPLAIN QUERY PLAN {statement}'):
+        detail = row['detail']
+        if detail.startswith('SCAN ') and 'INDEX' not in detail and 'CONSTANT ROW' not in detail:
+            scans.append(detail)
+    return scans
+
+def check_query_plans():
+    """Replay HOT_ROUTES against a scratch database and report full scans.
+
+    Returns a list of (route, statement, plan detail) tuples; empty means every
+    hot path is served by an index.
+    """
+    with tempfile.TemporaryDirectory() as workdir, \
+            use_tenant(Tenant('plans', 'Plans', None, os.path.join(workdir, 'plans.db'))):
+        try:
+            init_db()
+            conn = get_db()
+            conn.execute('''
+                INSERT INTO users (username, password, role, first_name, last_name, calendar_token)
+                VALUES ('plan.coach', '', 'coach', 'Plan', 'Coach', 'plan-token')
+            ''')
+            conn.execute('''
+                INSERT INTO events (title, event_type, date, start_time)
+                VALUES ('Practice', 'practice', '2025-01-01', '15:30')
+            ''')
+            conn.commit()
+
+            # Run every query for real rather than answering from the read cache
+            read_cache.enabled = False
+            statements = []
+            conn.set_trace_callback(statements.append)
+            client = app.test_client()
+            with client.session_transaction() as sess:
+                sess['user_id'] = 1
+
+            problems = []
+            for method, path, body in HOT_ROUTES:
+                statements.clear()
+                client.open(path, method=method, json=body)
+                for statement in list(statements):
+                    if not statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+                        continue
+                    for detail in find_full_scans(conn, statement):
+                        problems.append((f'{method} {path}', ' '.join(statement.split()), detail))
+            conn.set_trace_callback(None)
+            return problems
+        finally:
+            read_cache.enabled = True
+            close_db()
+
+@app.cli.command('check-query-plans')
+def check_query_plans_command():
+    """Fail if any hot route falls back to a full table scan."""
+    problems = check_query_plans()
+    for route, statement, detail in problems:
+        print(f'{route}: {detail}\n    {statement}')
+    if problems:
+        raise SystemExit(1)
+    print('All hot routes use indexes.')
+
+# Read cache for the list endpoints. Entries are keyed on the table_versions
+# counters of the tables they read, so a write committed by any worker is seen
+# by every worker; swap read_cache.backend for a cache.SharedBackend to let
+# the workers share entries as well.
+READ_CACHE_TTL = int(os.environ.get('READ_CACHE_TTL', 300))
+READ_CACHE_MAX_BYTES = int(os.environ.get('READ_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+# Streamed lists (see jsonstream.py) up to this size are cached as well;
+# longer ones are read again each time rather than buffered
+READ_CACHE_STREAM_BYTES = int(os.environ.get('READ_CACHE_STREAM_BYTES', 4 * 1024 * 1024))
+
+read_cache = ReadCache(LocalBackend(max_bytes=READ_CACHE_MAX_BYTES), ttl=READ_CACHE_TTL)
+
+metrics.add_collector(lambda: [
+    ('read_cache_hits_total', 'counter', 'Read cache hits.', read_cache.hits),
+    ('read_cache_misses_total', 'counter', 'Read cache misses.', read_cache.misses),
+    ('read_cache_bytes', 'gauge', 'Bytes held by the local read cache.',
+     read_cache.backend.usage().get('bytes', 0)),
+])
+
+def tenant_scoped(*names):
+    """Cache keys and tags of the current team, so teams never see each other's entries."""
+    return [f'{current_tenant().key}/{name}' for name in names]
+
+def cache_key(key, tags):
+    """The read_cache key and tags for an entry of the current team that reads tables tags.
+
+    The key carries the tables' versions from the database, the same ones the
+    ETag is built from, so a write committed by another worker changes it
+    even though that worker's invalidation only reached its own cache.
+    """
+    versions = '-'.join(f'{table}.{version}' for table, version, _ in table_versions(get_db(), tags))
+    return f'{tenant_scoped(key)[0]}@{versions}', tenant_scoped(*tags)
+
+def cached_json(key, tags, load):
+    """Respond with the JSON encoding of load(), served from read_cache when possible."""
+    body = read_cache.get_or_compute(*cache_key(key, tags),
+                                     lambda: (app.json.dumps(load()) + '\n').encode())
+    return app.response_class(body, mimetype='application/json')
+
+def query_rows(query, values=()):
+    """Run query and return (columns, rows) for streamed_json, rows read as they are sent."""
+    cursor = get_db().execute(query, values)
+    return column_names(cursor), fetch_rows(cursor)
+
+def streamed_json(key, tags, rows):
+    """Respond with the rows() returns as a JSON array streamed from the cursor.
+
+    ?format=ndjson sends one object per line instead. With a key the body is
+    served from, and stored in, read_cache; without one it is always read.
+    """
+    ndjson = request.args.get('format') == 'ndjson'
+    encode = encode_ndjson if ndjson else encode_array
+    
+    def stream():
+        columns, records = rows()
+        return encode(columns, records, app.json.dumps)
+    
+    if key is None:
+        body = stream()
+    else:
+        key = f'{key}:ndjson' if ndjson else key
+        body = read_cache.get_or_stream(*cache_key(key, tags), stream, READ_CACHE_STREAM_BYTES)
+    return app.response_class(body, mimetype='application/x-ndjson' if ndjson else 'application/json')
+
+# Conditional GET: read-mostly endpoints are tagged with the change counters
+# of the tables they read, and write routes bump those counters on commit.
+def bump_version(conn, *tables):
+    conn.executemany('''
+        UPDATE table_versions
+        SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+        WHERE table_name = ?
+    ''', [(table,) for table in tables])
+
+def record_changes(conn, topic, action, payloads):
+    """Append changes to change_log for /api/stream; they commit with the caller's write."""
+    conn.executemany(
+        'INSERT INTO change_log (topic, action, payload) VALUES (?, ?, ?)',
+        [(topic, action, json.dumps(payload, default=str)) for payload in payloads]
+    )
+
+def record_change(conn, topic, action, payload):
+    record_changes(conn, topic, action, [payload])
+
+def commit_changes(conn, *tables):
+    """Commit a write that touched tables and invalidate everything reading them."""
+    bump_version(conn, *tables)
+    conn.commit()
+    if has_request_context():
+        g.pop('table_versions', None)
+    read_cache.invalidate(*tenant_scoped(*tables))
+    tenant_change_feed().notify()
+
+def table_versions(conn, tables):
+    """(table, version, updated_at) for each of tables, in name order.
+
+    The counters are read once per request, so the ETag and the read_cache
+    key of a response always agree.
+    """
+    known = g.setdefault('table_versions', {}) if has_request_context() else {}
+    missing = [table for table in tables if table not in known]
+    if missing:
+        placeholders = ', '.join('?' for _ in missing)
+        for row in conn.execute(f'''
+            SELECT table_name, version, updated_at FROM table_versions
+            WHERE table_name IN ({placeholders})
+        ''', missing):
+            known[row['table_name']] = (row['version'], row['updated_at'])
+    return [(table, *known[table]) for table in sorted(set(tables))]
+
+def table_versions_tag(conn, tables):
+    versions = table_versions(conn, tables)
+    # Every team's counters start at 0, so the team is part of the tag
+    etag = current_tenant().key + ':' + '-'.join(f'{table}.{version}' for table, version, _ in versions)
+    last_modified = max(
+        datetime.strptime(updated_at, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+        for _, _, updated_at in versions
+    )
+    return etag, last_modified
+
+def conditional_response(tables, render, daily=False, variant=None):
+    """Return render()'s response, or a 304 if the client already has it.
+
+    variant is folded into the ETag for responses that also depend on the
+    request, such as a date window.
+    """
+    etag, last_modified = table_versions_tag(get_db(), tables)
+    if daily:
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        etag = f"{etag}-{today.strftime('%Y%m%d')}"
+        last_modified = max(last_modified, today.astimezone(timezone.utc))
+    if variant:
+        etag = f'{etag}-{variant}'
+    
+    if request.if_none_match:
+        # Weak comparison: a compressed response carries the same ETag as W/"..."
+        not_modified = request.if_none_match.contains_weak(etag)
+    else:
+        not_modified = (request.if_modified_since is not None
+                        and last_modified <= request.if_modified_since)
+    
+    if not_modified:
+        response = app.response_class(status=304)
+    else:
+        response = make_response(render())
+        if response.status_code != 200:
+            return response
+    
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def conditional_get(*tables, daily=False, roles=None, per_user=False):
+    """Answer If-None-Match / If-Modified-Since with 304 before the view runs.
+
+    daily=True folds today's date into the ETag for views whose result
+    depends on the current date as well as on the tables. A 304 tells the
+    client the resource is still there, so a view that checks the role gives
+    the roles it admits; everyone else goes straight to the view and its 403.
+    per_user=True gives each user their own ETag, for views that answer
+    each user differently.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if 'user_id' not in session or (roles is not None and g.user['role'] not in roles):
+                return view(*args, **kwargs)
+            return conditional_response(tables, lambda: view(*args, **kwargs), daily=daily,
+                                        variant=f"u{session['user_id']}" if per_user else None)
+        return wrapper
+    return decorator
 
 # Authentication routes
 @app.route('/api/auth/login', methods=['POST'])
@@ -114,20 +886,50 @@ def login():
     if not username or not password:
         return jsonify({'error': 'Username and password required'}), 400
     
-    conn = get_db()
-    user = conn.execute(
-        'SELECT * FROM users WHERE username = ?', (username,)
-    ).fetchone()
-    conn.close()
+    # Usernames are unique per team. Find the one team to check, from the
+    # client or the directory, so a login opens one database and hashes once.
+    if data.get('team'):
+        tenant = tenants.get(data['team'])
+        if tenant is None:
+            return jsonify({'error': 'Unknown team'}), 400
+    elif len(tenants) == 1:
+        tenant = tenants.default
+    else:
+        matches = [tenants.get(key) for key in user_directory.teams(username) if tenants.get(key)]
+        if len(matches) > 1:
+            return jsonify({
+                'error': 'That username is on more than one team. Choose your team.',
+                'teams': [{'key': tenant.key, 'name': tenant.name} for tenant in matches]
+            }), 409
+        tenant = matches[0] if matches else None
+    user = None
+    if tenant is not None:
+        g.tenant = tenant
+        user = get_db().execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
     
-    if user and user['password'] == hash_password(password):
+    try:
+        valid = password_hasher.verify(password, user['password'] if user else None)
+    except HasherBusy:
+        return jsonify({'error': 'Too many sign-ins at once, please try again'}), 503, {'Retry-After': '1'}
+    
+    if valid:
+        # Transparently move legacy or weaker hashes to the current parameters
+        if needs_upgrade(user['password']):
+            try:
+                conn = get_db()
+                conn.execute('UPDATE users SET password = ? WHERE id = ?',
+                             (password_hasher.hash(password), user['id']))
+                conn.commit()
+            except HasherBusy:
+                pass
+        
         # Check if user is approved (not pending)
         user_dict = dict(user)
         if user_dict.get('status') == 'pending':
             return jsonify({'error': 'Your account is pending approval. Please wait for coach approval.'}), 403
         
         session['user_id'] = user['id']
-        session['role'] = user['role']
+        session['team'] = g.tenant.key
         return jsonify({
             'success': True,
             'user': {
@@ -135,7 +937,8 @@ def login():
                 'username': user['username'],
                 'role': user['role'],
                 'first_name': user['first_name'],
-                'last_name': user['last_name']
+                'last_name': user['last_name'],
+                'team': g.tenant.key
             }
         })
     
@@ -146,10 +949,11 @@ def login():
 def register():
     data = request.get_json()
     
-    # Validate team code
-    TEAM_CODE = "AVIATORS2025"  # Your team's registration code
-    if data.get('team_code') != TEAM_CODE:
+    # The team code picks the team, and with it the database, to join
+    tenant = tenants.by_code(data.get('team_code'))
+    if tenant is None:
         return jsonify({'error': 'Invalid team code'}), 400
+    g.tenant = tenant
     
     # Validate required fields
     required = ['username', 'password', 'role', 'first_name', 'last_name', 'email']
@@ -168,9 +972,10 @@ def register():
         existing = conn.execute('SELECT id FROM users WHERE username = ?', 
                                (data['username'],)).fetchone()
         if existing:
-            conn.close()
             return jsonify({'error': 'Username already taken'}), 400
         
+        password_hash = password_hasher.hash(data['password'])
+        
         # Create pending user
         conn.execute('''
             INSERT INTO users (username, password, role, first_name, last_name, 
@@ -178,7 +983,7 @@ def register():
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'pending')
         ''', (
             data['username'],
-            hash_password(data['password']),
+            password_hash,
             data['role'],
             data['first_name'],
             data['last_name'],
@@ -186,20 +991,24 @@ def register():
             data.get('phone', ''),
             data.get('grade') if data['role'] == 'student' else None
         ))
-        conn.commit()
-        conn.close()
+        commit_changes(conn, 'users')
+        user_directory.add(data['username'], tenant.key)
         
         return jsonify({
             'success': True,
             'message': 'Registration request submitted! Please wait for coach approval.'
         }), 201
         
+    except HasherBusy:
+        return jsonify({'error': 'Too many requests at once, please try again'}), 503, {'Retry-After': '1'}
     except Exception as e:
-        conn.close()
         return jsonify({'error': str(e)}), 400
 
 @app.route('/api/auth/logout', methods=['POST'])
 def logout():
+    # ?everywhere=1 also signs the user out on every other device
+    if request.args.get('everywhere') == '1' and 'user_id' in session:
+        app.session_interface.revoke_user(current_tenant().key, session['user_id'])
     session.clear()
     return jsonify({'success': True})
 
@@ -208,41 +1017,241 @@ def get_current_user():
     if 'user_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
     
-    conn = get_db()
-    user = conn.execute(
-        'SELECT id, username, role, first_name, last_name, email FROM users WHERE id = ?',
-        (session['user_id'],)
-    ).fetchone()
-    conn.close()
-    
-    if user:
-        return jsonify({
-            'id': user['id'],
-            'username': user['username'],
-            'role': user['role'],
-            'first_name': user['first_name'],
-            'last_name': user['last_name'],
-            'email': user['email']
-        })
-    
-    return jsonify({'error': 'User not found'}), 404
+    user = g.user
+    return jsonify({
+        'id': user['id'],
+        'username': user['username'],
+        'role': user['role'],
+        'first_name': user['first_name'],
+        'last_name': user['last_name'],
+        'email': user['email'],
+        'team': current_tenant().key,
+        'team_name': current_tenant().name
+    })
+
+# Events routes - GET events, newest first, in keyset-paginated pages
+EVENTS_PAGE_SIZE = 50
+EVENTS_MAX_PAGE_SIZE = 200
+
+# Recurring series are stored once in event_series and expanded into
+# occurrences only for the date window being read. An occurrence gets an
+# events row of its own (series_id, occurrence_date) once it is overridden
+# or someone signs in to it; until then its id is 'series:<id>:<date>'.
+# Cancelled dates are kept in event_series_exceptions. Without ?to=,
+# occurrences are listed up to SERIES_DEFAULT_DAYS ahead, so the newest-first
+# default page starts near today rather than a year out; ?to= can reach
+# SERIES_HORIZON_DAYS ahead.
+SERIES_DEFAULT_DAYS = 28
+SERIES_HORIZON_DAYS = 366
+SERIES_WEEKDAYS = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']
+OCCURRENCE_ID = re.compile(r'series:(\d+):(\d{4}-\d{2}-\d{2})')
+
+# Common table expressions for WITH RECURSIVE; format {window} with the two
+# parameters bounding the window (inclusive, the first may be NULL). Rows of
+# series_occurrences have the same columns as events. weekdays is a bitmask
+# with Monday as bit 0.
+SERIES_OCCURRENCES_CTES = '''
+    occurrence_window (window_from, window_to) AS (SELECT {window}),
+    occurrence_days (series_id, day, last_day) AS (
+        SELECT s.id, MAX(s.start_date, COALESCE(w.window_from, s.start_date)),
+               MIN(COALESCE(s.until, w.window_to), w.window_to)
+        FROM occurrence_window w, event_series s
+        WHERE s.start_date <= w.window_to
+          AND (s.until IS NULL OR w.window_from IS NULL OR s.until >= w.window_from)
+        UNION ALL
+        SELECT series_id, date(day, '+1 day'), last_day
+        FROM occurrence_days
+        WHERE day < last_day
+    ),
+    series_occurrences AS (
+        SELECT 'series:' || s.id || ':' || d.day AS id, s.title, s.description, s.event_type,
+               d.day AS date, s.start_time, s.end_time, s.location, s.is_mandatory, s.created_by,
+               s.created_at, s.id AS series_id, d.day AS occurrence_date, 0 AS overridden
+        FROM occurrence_days d
+        JOIN event_series s ON s.id = d.series_id
+        WHERE (s.weekdays >> ((CAST(strftime('%w', d.day) AS INTEGER) + 6) % 7)) & 1
+          AND NOT EXISTS (SELECT 1 FROM event_series_exceptions x
+                          WHERE x.series_id = s.id AND x.occurrence_date = d.day)
+          AND NOT EXISTS (SELECT 1 FROM events c
+                          WHERE c.series_id = s.id AND c.occurrence_date = d.day)
+    )
+'''
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_cursor(cursor):
+    """Return the [date, start_time, id] a cursor holds; ValueError if it is not one of ours."""
+    values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if not isinstance(values, list) or len(values) != 3:
+        raise ValueError('Malformed cursor')
+    date, start_time, event_id = values
+    if not isinstance(date, str) or not isinstance(start_time, str):
+        raise ValueError('Malformed cursor')
+    datetime.strptime(date, '%Y-%m-%d')
+    if isinstance(event_id, bool) or not (isinstance(event_id, int)
+                                          or (isinstance(event_id, str) and OCCURRENCE_ID.fullmatch(event_id))):
+        raise ValueError('Malformed cursor')
+    return values
+
+def parse_date_arg(name):
+    value = request.args.get(name)
+    if value:
+        datetime.strptime(value, '%Y-%m-%d')
+    return value
+
+def event_order(event):
+    # SQLite's order: integer ids sort before the text ids of series occurrences
+    return (event['date'], event['start_time'], isinstance(event['id'], str), event['id'])
+
+def stored_event_id(conn, event_id, create=True):
+    """concrete_event_id(), but None as well for a numeric id with no events row."""
+    event_id = concrete_event_id(conn, event_id, create)
+    if event_id is None or conn.execute('SELECT 1 FROM events WHERE id = ?', (event_id,)).fetchone() is None:
+        return None
+    return event_id
+
+def concrete_event_id(conn, event_id, create=True):
+    """Return the events row id behind an API event id, or None if there is none.
+
+    A 'series:<id>:<date>' id is looked up by occurrence. With create=True an
+    occurrence without a row gets one, so attendance can attach to it; that
+    commits on its own.
+    """
+    if isinstance(event_id, int) or (isinstance(event_id, str) and event_id.isdigit()):
+        return int(event_id)
+    match = OCCURRENCE_ID.fullmatch(event_id) if isinstance(event_id, str) else None
+    if match is None:
+        return None
+    
+    series_id, day = int(match[1]), match[2]
+    row = conn.execute('SELECT id FROM events WHERE series_id = ? AND occurrence_date = ?',
+                       (series_id, day)).fetchone()
+    if row is not None or not create:
+        return row and row['id']
+    
+    cursor = conn.execute(f'''
+        WITH RECURSIVE {SERIES_OCCURRENCES_CTES.format(window='?, ?')}
+        INSERT OR IGNORE INTO events (title, description, event_type, date, start_time, end_time,
+                                      location, is_mandatory, created_by, series_id, occurrence_date)
+        SELECT title, description, event_type, date, start_time, end_time,
+               location, is_mandatory, created_by, series_id, occurrence_date
+        FROM series_occurrences
+        WHERE series_id = ?
+    ''', (day, day, series_id))
+    event = conn.execute('SELECT * FROM events WHERE series_id = ? AND occurrence_date = ?',
+                         (series_id, day)).fetchone()
+    if event is not None and cursor.rowcount:
+        record_change(conn, 'events', 'created', dict(event))
+        commit_changes(conn, 'events')
+    else:
+        # Not on the series' schedule, cancelled, or stored by someone else first
+        conn.rollback()
+    return event and event['id']
 
-# Events routes - GET all events
 @app.route('/api/events', methods=['GET'])
+@conditional_get('events', 'users', daily=True)
 def get_events():
     if 'user_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
     
-    conn = get_db()
-    events = conn.execute('''
+    try:
+        date_from = parse_date_arg('from')
+        date_to = parse_date_arg('to')
+    except ValueError:
+        return jsonify({'error': 'from and to must be YYYY-MM-DD dates'}), 400
+    
+    conditions = []
+    values = []
+    if date_from:
+        conditions.append('e.date >= ?')
+        values.append(date_from)
+    if date_to:
+        conditions.append('e.date <= ?')
+        values.append(date_to)
+    
+    # Series occurrences are expanded no further than needed for this page.
+    # The default window moves with the date, so the date is part of the key.
+    today = datetime.now()
+    cache_name = f"events:{today.strftime('%Y-%m-%d')}?{request.query_string.decode()}"
+    horizon = (today + timedelta(days=SERIES_HORIZON_DAYS)).strftime('%Y-%m-%d')
+    window_to = min(date_to or (today + timedelta(days=SERIES_DEFAULT_DAYS)).strftime('%Y-%m-%d'), horizon)
+    
+    # ?all=1 keeps the old unbounded list for callers that really need it
+    unbounded = request.args.get('all') == '1'
+    
+    if not unbounded:
+        try:
+            limit = min(int(request.args.get('limit', EVENTS_PAGE_SIZE)), EVENTS_MAX_PAGE_SIZE)
+        except ValueError:
+            return jsonify({'error': 'Invalid limit'}), 400
+        if limit < 1:
+            return jsonify({'error': 'Invalid limit'}), 400
+        cursor = request.args.get('cursor')
+        if cursor:
+            try:
+                cursor_values = decode_cursor(cursor)
+            except ValueError:
+                return jsonify({'error': 'Invalid cursor'}), 400
+            conditions.append('(e.date, e.start_time, e.id) < (?, ?, ?)')
+            values.extend(cursor_values)
+            window_to = min(window_to, cursor_values[0])
+    
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    query = f'''
         SELECT e.*, u.first_name, u.last_name 
         FROM events e
         LEFT JOIN users u ON e.created_by = u.id
-        ORDER BY e.date DESC, e.start_time DESC
-    ''').fetchall()
-    conn.close()
+        {where}
+        ORDER BY e.date DESC, e.start_time DESC, e.id DESC
+    '''
+    occurrences_query = f'''
+        WITH RECURSIVE {SERIES_OCCURRENCES_CTES.format(window='?, ?')}
+        SELECT e.*, u.first_name, u.last_name
+        FROM series_occurrences e
+        LEFT JOIN users u ON e.created_by = u.id
+        {where}
+        ORDER BY e.date DESC, e.start_time DESC, e.id DESC
+    '''
+    occurrence_values = [date_from, window_to] + values
+    
+    if unbounded:
+        def rows():
+            conn = get_db()
+            events = conn.execute(query, values)
+            occurrences = conn.execute(occurrences_query, occurrence_values)
+            columns = column_names(events)
+            date, start_time, event_id = (columns.index(name) for name in ('date', 'start_time', 'id'))
+            
+            def order(row):
+                return (row[date], row[start_time], isinstance(row[event_id], str), row[event_id])
+            
+            # Both queries are already in this order, so merge them as they stream
+            return columns, heapq.merge(fetch_rows(events), fetch_rows(occurrences), key=order, reverse=True)
+        
+        return streamed_json(cache_name, ['events', 'users'], rows)
     
-    return jsonify([dict(event) for event in events])
+    def load():
+        conn = get_db()
+        
+        # Fetch one extra row to learn whether another page exists
+        events = sorted(
+            conn.execute(f'{query} LIMIT ?', values + [limit + 1]).fetchall()
+            + conn.execute(f'{occurrences_query} LIMIT ?', occurrence_values + [limit + 1]).fetchall(),
+            key=event_order, reverse=True
+        )[:limit + 1]
+        next_cursor = None
+        if len(events) > limit:
+            events = events[:limit]
+            last = events[-1]
+            next_cursor = encode_cursor([last['date'], last['start_time'], last['id']])
+        
+        return {
+            'events': [dict(event) for event in events],
+            'next_cursor': next_cursor
+        }
+    
+    return cached_json(cache_name, ['events', 'users'], load)
 
 # Events routes - CREATE event
 @app.route('/api/events', methods=['POST'])
@@ -250,7 +1259,7 @@ def create_event():
     if 'user_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
     
-    if session['role'] not in ['coach', 'assistant_coach', 'athletic_director']:
+    if g.user['role'] not in ['coach', 'assistant_coach', 'athletic_director']:
         return jsonify({'error': 'Unauthorized'}), 403
     
     data = request.get_json()
@@ -276,11 +1285,11 @@ def create_event():
         data.get('is_mandatory', False),
         session['user_id']
     ))
-    conn.commit()
     event_id = cursor.lastrowid
     
     event = conn.execute('SELECT * FROM events WHERE id = ?', (event_id,)).fetchone()
-    conn.close()
+    record_change(conn, 'events', 'created', dict(event))
+    commit_changes(conn, 'events')
     
     return jsonify(dict(event)), 201
 
@@ -290,7 +1299,7 @@ def update_event(event_id):
     if 'user_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
     
-    if session['role'] not in ['coach', 'assistant_coach', 'athletic_director']:
+    if g.user['role'] not in ['coach', 'assistant_coach', 'athletic_director']:
         return jsonify({'error': 'Unauthorized'}), 403
     
     data = request.get_json()
@@ -310,22 +1319,26 @@ def update_event(event_id):
     if not update_fields:
         return jsonify({'error': 'No fields to update'}), 400
     
+    # An edited series occurrence no longer follows later edits to its series
+    update_fields.append('overridden = series_id IS NOT NULL')
     values.append(event_id)
     
     try:
-        conn.execute(
+        cursor = conn.execute(
             f"UPDATE events SET {', '.join(update_fields)} WHERE id = ?",
             values
         )
-        conn.commit()
+        if not cursor.rowcount:
+            conn.rollback()
+            return jsonify({'error': 'Event not found'}), 404
         
         event = conn.execute('SELECT * FROM events WHERE id = ?', (event_id,)).fetchone()
-        conn.close()
+        record_change(conn, 'events', 'updated', dict(event))
+        commit_changes(conn, 'events')
         
         return jsonify(dict(event))
         
     except Exception as e:
-        conn.close()
         return jsonify({'error': str(e)}), 400
 
 # DELETE event
@@ -334,41 +1347,610 @@ def delete_event(event_id):
     if 'user_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
     
-    if session['role'] not in ['coach', 'assistant_coach', 'athletic_director']:
+    if g.user['role'] not in ['coach', 'assistant_coach', 'athletic_director']:
         return jsonify({'error': 'Unauthorized'}), 403
     
     conn = get_db()
     
     try:
+        # A deleted series occurrence must not reappear from its series
+        conn.execute('''
+            INSERT OR IGNORE INTO event_series_exceptions (series_id, occurrence_date)
+            SELECT series_id, occurrence_date FROM events WHERE id = ? AND series_id IS NOT NULL
+        ''', (event_id,))
         conn.execute('DELETE FROM attendance WHERE event_id = ?', (event_id,))
-        conn.execute('DELETE FROM events WHERE id = ?', (event_id,))
-        conn.commit()
-        conn.close()
+        if not conn.execute('DELETE FROM events WHERE id = ?', (event_id,)).rowcount:
+            conn.rollback()
+            return jsonify({'error': 'Event not found'}), 404
+        record_change(conn, 'events', 'deleted', {'id': event_id})
+        commit_changes(conn, 'events', 'attendance')
         
         return jsonify({'message': 'Event deleted successfully'})
         
     except Exception as e:
-        conn.close()
         return jsonify({'error': str(e)}), 400
 
 @app.route('/api/events/today', methods=['GET'])
+@conditional_get('events', daily=True)
 def get_today_events():
     if 'user_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
     
     today = datetime.now().strftime('%Y-%m-%d')
     
+    def load():
+        conn = get_db()
+        events = conn.execute('''
+            SELECT * FROM events 
+            WHERE date = ?
+            ORDER BY start_time ASC
+        ''', (today,)).fetchall()
+        events += conn.execute(f'''
+            WITH RECURSIVE {SERIES_OCCURRENCES_CTES.format(window='?, ?')}
+            SELECT * FROM series_occurrences
+        ''', (today, today)).fetchall()
+        return [dict(event) for event in sorted(events, key=lambda event: event['start_time'])]
+    
+    return cached_json(f'events/today:{today}', ['events'], load)
+
+# Recurring event series
+def parse_series(data, partial=False):
+    """Validate a series payload; returns (column values, error message)."""
+    fields = {}
+    for field in ['title', 'description', 'event_type', 'start_time', 'end_time', 'location',
+                  'is_mandatory', 'start_date', 'until']:
+        if field in data:
+            fields[field] = data[field]
+    if 'weekdays' in data:
+        try:
+            fields['weekdays'] = functools.reduce(
+                lambda mask, day: mask | 1 << SERIES_WEEKDAYS.index(day.upper()), data['weekdays'], 0)
+        except (AttributeError, TypeError, ValueError):
+            return None, f"weekdays must be a list of {', '.join(SERIES_WEEKDAYS)}"
+        if not fields['weekdays']:
+            return None, 'weekdays must name at least one day'
+    if not partial:
+        for field in ['title', 'event_type', 'start_time', 'start_date', 'weekdays']:
+            if field not in fields:
+                return None, f'{field} is required'
+    if partial and 'start_date' in fields:
+        return None, 'start_date cannot be changed; end the series and start a new one'
+    try:
+        for field in ['start_date', 'until']:
+            if fields.get(field) is not None:
+                datetime.strptime(fields[field], '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return None, 'start_date and until must be YYYY-MM-DD dates'
+    if not partial and fields.get('until') is not None and fields['until'] < fields['start_date']:
+        return None, 'until must not be before start_date'
+    return fields, None
+
+def series_json(series):
+    series = dict(series)
+    series['weekdays'] = [day for bit, day in enumerate(SERIES_WEEKDAYS) if series['weekdays'] >> bit & 1]
+    return series
+
+@app.route('/api/events/series', methods=['GET'])
+@conditional_get('events')
+def get_event_series():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    series = get_db().execute('SELECT * FROM event_series ORDER BY start_date, id').fetchall()
+    return jsonify([series_json(row) for row in series])
+
+@app.route('/api/events/series', methods=['POST'])
+def create_event_series():
+    """Create a weekly series, e.g. {"weekdays": ["MO", "WE", "FR"], "start_date": ...}."""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    if g.user['role'] not in ['coach', 'assistant_coach', 'athletic_director']:
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    fields, error = parse_series(request.get_json())
+    if error:
+        return jsonify({'error': error}), 400
+    fields.setdefault('description', '')
+    fields.setdefault('location', '')
+    fields['created_by'] = session['user_id']
+    
+    conn = get_db()
+    cursor = conn.execute(f'''
+        INSERT INTO event_series ({', '.join(fields)})
+        VALUES ({', '.join('?' for _ in fields)})
+    ''', list(fields.values()))
+    
+    series = conn.execute('SELECT * FROM event_series WHERE id = ?', (cursor.lastrowid,)).fetchone()
+    record_change(conn, 'events', 'series_created', series_json(series))
+    commit_changes(conn, 'events')
+    
+    return jsonify(series_json(series)), 201
+
+@app.route('/api/events/series/<int:series_id>', methods=['PUT'])
+def update_event_series(series_id):
+    """Edit a series from today on. Stored occurrences follow unless overridden."""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    if g.user['role'] not in ['coach', 'assistant_coach', 'athletic_director']:
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    fields, error = parse_series(request.get_json(), partial=True)
+    if error:
+        return jsonify({'error': error}), 400
+    if not fields:
+        return jsonify({'error': 'No fields to update'}), 400
+    
+    conn = get_db()
+    series = conn.execute('SELECT * FROM event_series WHERE id = ?', (series_id,)).fetchone()
+    if series is None:
+        return jsonify({'error': 'Series not found'}), 404
+    
+    today = datetime.now()
+    params = {
+        'series_id': series_id,
+        'today': today.strftime('%Y-%m-%d'),
+        'yesterday': (today - timedelta(days=1)).strftime('%Y-%m-%d')
+    }
+    if series['until'] is not None and series['until'] < params['today']:
+        return jsonify({'error': 'Series has already ended'}), 400
+    if fields.get('until') is not None and fields['until'] < max(series['start_date'], params['today']):
+        return jsonify({'error': 'until must not be before today or start_date'}), 400
+    
+    # Past occurrences keep the old rule for the attendance history: they are
+    # split off into a series of their own that ends yesterday
+    if series['start_date'] < params['today']:
+        params['history_id'] = conn.execute('''
+            INSERT INTO event_series (title, description, event_type, start_time, end_time, location,
+                                      is_mandatory, weekdays, start_date, until, created_by, created_at)
+            SELECT title, description, event_type, start_time, end_time, location,
+                   is_mandatory, weekdays, start_date, :yesterday, created_by, created_at
+            FROM event_series WHERE id = :series_id
+        ''', params).lastrowid
+        conn.execute('''
+            UPDATE events SET series_id = :history_id
+            WHERE series_id = :series_id AND occurrence_date < :today
+        ''', params)
+        conn.execute('''
+            UPDATE event_series_exceptions SET series_id = :history_id
+            WHERE series_id = :series_id AND occurrence_date < :today
+        ''', params)
+        fields['start_date'] = params['today']
+    
+    conn.execute(f"UPDATE event_series SET {', '.join(f'{field} = ?' for field in fields)} WHERE id = ?",
+                 list(fields.values()) + [series_id])
+    conn.execute('''
+        UPDATE events
+        SET (title, description, event_type, start_time, end_time, location, is_mandatory) = (
+            SELECT title, description, event_type, start_time, end_time, location, is_mandatory
+            FROM event_series WHERE id = :series_id
+        )
+        WHERE series_id = :series_id AND occurrence_date >= :today AND NOT overridden
+    ''', params)
+    
+    # Stored occurrences that the new weekdays or end date drop go away
+    dropped = '''
+        SELECT e.id FROM events e
+        JOIN event_series s ON s.id = e.series_id
+        WHERE e.series_id = :series_id AND e.occurrence_date >= :today AND NOT e.overridden
+          AND NOT ((s.weekdays >> ((CAST(strftime('%w', e.occurrence_date) AS INTEGER) + 6) % 7)) & 1
+                   AND e.occurrence_date <= COALESCE(s.until, e.occurrence_date))
+    '''
+    conn.execute(f'DELETE FROM attendance WHERE event_id IN ({dropped})', params)
+    conn.execute(f'DELETE FROM events WHERE id IN ({dropped})', params)
+    
+    series = conn.execute('SELECT * FROM event_series WHERE id = ?', (series_id,)).fetchone()
+    record_change(conn, 'events', 'series_updated', series_json(series))
+    commit_changes(conn, 'events', 'attendance')
+    
+    return jsonify(series_json(series))
+
+@app.route('/api/events/series/<int:series_id>', methods=['DELETE'])
+def delete_event_series(series_id):
+    """End a series as of yesterday. Past occurrences stay for the attendance history."""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    if g.user['role'] not in ['coach', 'assistant_coach', 'athletic_director']:
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    conn = get_db()
+    series = conn.execute('SELECT * FROM event_series WHERE id = ?', (series_id,)).fetchone()
+    if series is None:
+        return jsonify({'error': 'Series not found'}), 404
+    
+    today = datetime.now()
+    params = {
+        'series_id': series_id,
+        'today': today.strftime('%Y-%m-%d'),
+        'yesterday': (today - timedelta(days=1)).strftime('%Y-%m-%d')
+    }
+    conn.execute('''
+        DELETE FROM attendance WHERE event_id IN (
+            SELECT id FROM events WHERE series_id = :series_id AND occurrence_date >= :today
+        )
+    ''', params)
+    conn.execute('DELETE FROM events WHERE series_id = :series_id AND occurrence_date >= :today', params)
+    if series['start_date'] > params['yesterday']:
+        conn.execute('DELETE FROM event_series_exceptions WHERE series_id = :series_id', params)
+        conn.execute('DELETE FROM event_series WHERE id = :series_id', params)
+    else:
+        conn.execute('''
+            UPDATE event_series SET until = MIN(COALESCE(until, :yesterday), :yesterday)
+            WHERE id = :series_id
+        ''', params)
+    record_change(conn, 'events', 'series_deleted', {'series_id': series_id})
+    commit_changes(conn, 'events', 'attendance')
+    
+    return jsonify({'message': 'Series ended successfully'})
+
+@app.route('/api/events/series/<int:series_id>/occurrences/<occurrence_date>', methods=['PUT'])
+def update_series_occurrence(series_id, occurrence_date):
+    """Override one occurrence; it is stored and edited like any other event."""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    if g.user['role'] not in ['coach', 'assistant_coach', 'athletic_director']:
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    event_id = concrete_event_id(get_db(), f'series:{series_id}:{occurrence_date}')
+    if event_id is None:
+        return jsonify({'error': 'Occurrence not found'}), 404
+    
+    return update_event(event_id)
+
+@app.route('/api/events/series/<int:series_id>/occurrences/<occurrence_date>', methods=['DELETE'])
+def cancel_series_occurrence(series_id, occurrence_date):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    if g.user['role'] not in ['coach', 'assistant_coach', 'athletic_director']:
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    try:
+        datetime.strptime(occurrence_date, '%Y-%m-%d')
+    except ValueError:
+        return jsonify({'error': 'Occurrence date must be YYYY-MM-DD'}), 400
+    
+    conn = get_db()
+    if conn.execute('SELECT 1 FROM event_series WHERE id = ?', (series_id,)).fetchone() is None:
+        return jsonify({'error': 'Series not found'}), 404
+    
+    params = {'series_id': series_id, 'day': occurrence_date}
+    conn.execute('''
+        INSERT OR IGNORE INTO event_series_exceptions (series_id, occurrence_date)
+        VALUES (:series_id, :day)
+    ''', params)
+    stored = conn.execute('''
+        SELECT id FROM events WHERE series_id = :series_id AND occurrence_date = :day
+    ''', params).fetchone()
+    if stored is not None:
+        conn.execute('DELETE FROM attendance WHERE event_id = ?', (stored['id'],))
+        conn.execute('DELETE FROM events WHERE id = ?', (stored['id'],))
+        record_change(conn, 'events', 'deleted', {'id': stored['id']})
+    record_change(conn, 'events', 'deleted', {'id': f'series:{series_id}:{occurrence_date}'})
+    commit_changes(conn, 'events', 'attendance')
+    
+    return jsonify({'message': 'Occurrence cancelled successfully'})
+
+# Calendar feeds - the team schedule as iCalendar (RFC 5545) for phone
+# calendar apps. Those cannot log in, so each user's feed URL carries a
+# secret token instead; rotating it revokes the old URL.
+CALENDAR_PAST_DAYS = 30
+CALENDAR_FUTURE_DAYS = 365
+CALENDAR_MAX_DAYS = 2 * 366
+# Each team's feed is its own calendar, named after the team
+CALENDAR_NAME = '{team} Cheer'
+
+def ical_text(value):
+    return (value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+def ical_line(name, value):
+    """One content line, folded at 75 octets without splitting a UTF-8 character."""
+    data = f'{name}:{value}'.encode()
+    parts = []
+    # Continuation lines start with a space, which counts toward their 75
+    while len(data) > (74 if parts else 75):
+        cut = 74 if parts else 75
+        while data[cut] & 0xC0 == 0x80:
+            cut -= 1
+        parts.append(data[:cut])
+        data = data[cut:]
+    parts.append(data)
+    return b'\r\n '.join(parts).decode() + '\r\n'
+
+def ical_datetime(day, clock):
+    # Event times are the team's local wall-clock times, so they stay floating
+    return day.replace('-', '') + 'T' + (clock.replace(':', '') + '0000')[:6]
+
+@functools.lru_cache(maxsize=4096)
+def ical_event(event, team):
+    """VEVENT text for one calendar row of team's, memoized on the row's values.
+
+    A feed rebuilt after an edit only renders the events that changed. Event
+    ids repeat across teams' databases, so UIDs carry the team key.
+    """
+    (event_id, title, description, event_type, day, start_time, end_time, location,
+     is_mandatory, created_at, series_id, occurrence_date) = event
+    # Series occurrences keep their UID once stored, so calendars update them in place
+    if series_id is None:
+        uid = f'event-{event_id}.{team}@aviators'
+    else:
+        uid = f"series-{series_id}-{occurrence_date.replace('-', '')}.{team}@aviators"
+    stamp = (created_at or f'{day} {start_time}').replace('-', '').replace(':', '').replace(' ', 'T')[:15]
+    notes = [description] if description else []
+    if is_mandatory:
+        notes.append('Attendance is mandatory.')
+    lines = [
+        'BEGIN:VEVENT\r\n',
+        ical_line('UID', uid),
+        ical_line('DTSTAMP', f'{stamp}Z'),
+        ical_line('DTSTART', ical_datetime(day, start_time)),
+    ]
+    if end_time:
+        lines.append(ical_line('DTEND', ical_datetime(day, end_time)))
+    lines.append(ical_line('SUMMARY', ical_text(title)))
+    if notes:
+        lines.append(ical_line('DESCRIPTION', ical_text('\n\n'.join(notes))))
+    if location:
+        lines.append(ical_line('LOCATION', ical_text(location)))
+    lines.append(ical_line('CATEGORIES', ical_text(event_type) + (',MANDATORY' if is_mandatory else '')))
+    lines.append(ical_line('X-AVIATORS-MANDATORY', 'TRUE' if is_mandatory else 'FALSE'))
+    lines.append('STATUS:CONFIRMED\r\nEND:VEVENT\r\n')
+    return ''.join(lines)
+
+def render_calendar(conn, tenant, date_from, date_to, mandatory_only=False):
+    columns = '''id, title, description, event_type, date, start_time, end_time, location,
+                 is_mandatory, created_at, series_id, occurrence_date'''
+    mandatory = 'AND is_mandatory' if mandatory_only else ''
+    events = conn.execute(f'''
+        WITH RECURSIVE {SERIES_OCCURRENCES_CTES.format(window='?, ?')}
+        SELECT {columns} FROM events
+        WHERE date BETWEEN ? AND ? {mandatory}
+        UNION ALL
+        SELECT {columns} FROM series_occurrences
+        WHERE true {mandatory}
+        ORDER BY date, start_time, id
+    ''', (date_from, date_to, date_from, date_to)).fetchall()
+    return ''.join([
+        'BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//Aviators//Team Calendar//EN\r\n',
+        'CALSCALE:GREGORIAN\r\nMETHOD:PUBLISH\r\n',
+        ical_line('X-WR-CALNAME', ical_text(CALENDAR_NAME.format(team=tenant.name))),
+        'REFRESH-INTERVAL;VALUE=DURATION:PT1H\r\nX-PUBLISHED-TTL:PT1H\r\n',
+        *(ical_event(tuple(event), tenant.key) for event in events),
+        'END:VCALENDAR\r\n',
+    ]).encode()
+
+@app.route('/api/calendar/subscription', methods=['GET', 'POST'])
+def calendar_subscription():
+    """Return the caller's feed URL; POST issues a new one and revokes the old."""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
     conn = get_db()
-    events = conn.execute('''
-        SELECT * FROM events 
-        WHERE date = ?
-        ORDER BY start_time ASC
-    ''', (today,)).fetchall()
-    conn.close()
+    row = conn.execute('SELECT calendar_token FROM users WHERE id = ?', (session['user_id'],)).fetchone()
+    if row is None:
+        return jsonify({'error': 'User not found'}), 404
+    
+    token = row['calendar_token']
+    if token is None or request.method == 'POST':
+        # Prefixed with the team, since the feed is fetched without a session
+        token = f'{current_tenant().key}.{secrets.token_urlsafe(24)}'
+        conn.execute('UPDATE users SET calendar_token = ? WHERE id = ?', (token, session['user_id']))
+        conn.commit()
     
-    return jsonify([dict(event) for event in events])
+    url = f'{request.url_root}api/calendar/{token}.ics'
+    return jsonify({'url': url, 'webcal': 'webcal://' + url.split('://', 1)[1]})
+
+@app.route('/api/calendar/<token>.ics', methods=['GET'])
+def get_calendar_feed(token):
+    """Team events from ?from= to ?to= (default: last 30 days to a year ahead).
+
+    ?mandatory=1 keeps only mandatory events.
+    """
+    # Tokens issued before teams had their own databases carry no team
+    team, _, _ = token.rpartition('.')
+    g.tenant = tenants.get(team) if team else tenants.default
+    if g.tenant is None:
+        return jsonify({'error': 'Unknown calendar'}), 404
+    
+    conn = get_db()
+    user = conn.execute('''
+        SELECT id FROM users
+        WHERE calendar_token = ? AND (status = 'active' OR status IS NULL)
+    ''', (token,)).fetchone()
+    if user is None:
+        return jsonify({'error': 'Unknown calendar'}), 404
+    
+    try:
+        date_from = parse_date_arg('from')
+        date_to = parse_date_arg('to')
+    except ValueError:
+        return jsonify({'error': 'from and to must be YYYY-MM-DD dates'}), 400
+    
+    today = datetime.now()
+    date_from = date_from or (today - timedelta(days=CALENDAR_PAST_DAYS)).strftime('%Y-%m-%d')
+    date_to = date_to or (today + timedelta(days=CALENDAR_FUTURE_DAYS)).strftime('%Y-%m-%d')
+    span = datetime.strptime(date_to, '%Y-%m-%d') - datetime.strptime(date_from, '%Y-%m-%d')
+    if not 0 <= span.days <= CALENDAR_MAX_DAYS:
+        return jsonify({'error': f'to must be after from and at most {CALENDAR_MAX_DAYS} days later'}), 400
+    mandatory_only = request.args.get('mandatory') == '1'
+    
+    def render():
+        body = read_cache.get_or_compute(
+            *cache_key(f'calendar:{date_from}:{date_to}:{int(mandatory_only)}', ['events']),
+            lambda: render_calendar(get_db(), current_tenant(), date_from, date_to, mandatory_only)
+        )
+        response = app.response_class(body, mimetype='text/calendar')
+        response.headers['Content-Disposition'] = f'inline; filename="{current_tenant().key}.ics"'
+        return response
+    
+    return conditional_response(['events'], render, variant=f'{date_from}.{date_to}.{int(mandatory_only)}')
+
+# Attendance routes. With ATTENDANCE_WRITE_QUEUE=1, sign-ins and sign-outs
+# are acknowledged once validated and group-committed by a writer thread
+# every ATTENDANCE_WRITE_BATCH_MS; see writequeue.py.
+ATTENDANCE_WRITE_QUEUE = os.environ.get('ATTENDANCE_WRITE_QUEUE', '0') == '1'
+ATTENDANCE_WRITE_BATCH_MS = float(os.environ.get('ATTENDANCE_WRITE_BATCH_MS', 5))
+ATTENDANCE_WRITE_QUEUE_MAX = int(os.environ.get('ATTENDANCE_WRITE_QUEUE_MAX', 10000))
+
+# Offline check-in: the app queues sign-ins and sign-outs while it has no
+# signal and replays them later with client_time (when they happened) and an
+# Idempotency-Key header. A replay of a write that already went through is
+# acknowledged again instead of being applied twice. Keys are kept for
+# ATTENDANCE_IDEMPOTENCY_DAYS; client times may be at most
+# ATTENDANCE_CLIENT_TIME_MAX_HOURS old.
+ATTENDANCE_CLIENT_TIME_MAX_HOURS = float(os.environ.get('ATTENDANCE_CLIENT_TIME_MAX_HOURS', 72))
+ATTENDANCE_CLIENT_TIME_SKEW_SECONDS = 300
+ATTENDANCE_IDEMPOTENCY_DAYS = 7
+IDEMPOTENCY_KEY_MAX_LENGTH = 100
+# A replayed sign-out never lands before its sign-in, whatever the client's clock said
+SIGN_OUT_TIME = 'CASE WHEN julianday(?) < julianday(sign_in_time) THEN sign_in_time ELSE ? END'
+
+def idempotency_key():
+    key = request.headers.get('Idempotency-Key')
+    if key is not None and not 0 < len(key) <= IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise ValueError(f'Idempotency-Key must be 1 to {IDEMPOTENCY_KEY_MAX_LENGTH} characters')
+    return key
+
+def attendance_time(data):
+    """When a sign-in or sign-out happened: client_time (ISO 8601) if sent, otherwise now."""
+    now = datetime.now()
+    if data.get('client_time') is None:
+        return now
+    try:
+        at = datetime.fromisoformat(str(data['client_time']))
+    except ValueError:
+        raise ValueError('client_time must be an ISO 8601 date and time')
+    # Times with an offset are stored in server local time, like datetime.now()
+    if at.tzinfo is not None:
+        at = at.astimezone().replace(tzinfo=None)
+    if at > now + timedelta(seconds=ATTENDANCE_CLIENT_TIME_SKEW_SECONDS):
+        raise ValueError('client_time is in the future')
+    if at < now - timedelta(hours=ATTENDANCE_CLIENT_TIME_MAX_HOURS):
+        raise ValueError(f'client_time is more than {ATTENDANCE_CLIENT_TIME_MAX_HOURS:g} hours old')
+    return at
+
+def replayed_attendance(conn, user_id, key, action, event_id):
+    """The response to repeat for an Idempotency-Key that was used before, or None."""
+    row = conn.execute('''
+        SELECT action, event_id FROM attendance_requests
+        WHERE user_id = ? AND idempotency_key = ?
+    ''', (user_id, key)).fetchone()
+    if row is None:
+        return None
+    if (row['action'], row['event_id']) != (action, event_id):
+        return jsonify({'error': 'Idempotency-Key was already used for a different request'}), 422
+    return jsonify({'success': True, 'replayed': True})
+
+def claim_idempotency_key(conn, user_id, key, action, event_id, at):
+    """Record key in the write's transaction; False if another request already has."""
+    # Sweep this user's expired keys while the write lock is held anyway
+    conn.execute('''
+        DELETE FROM attendance_requests
+        WHERE user_id = ? AND created_at < datetime('now', ?)
+    ''', (user_id, f'-{ATTENDANCE_IDEMPOTENCY_DAYS} days'))
+    return conn.execute('''
+        INSERT OR IGNORE INTO attendance_requests (user_id, idempotency_key, action, event_id, client_time)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (user_id, key, action, event_id, at)).rowcount == 1
+
+def apply_attendance_writes(batch):
+    """Apply queued (kind, user_id, event_id, time, key) writes in one transaction, in order."""
+    conn = get_db()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        record_attendance_writes(conn, batch)
+        commit_changes(conn, 'attendance')
+    finally:
+        # Never leave the writer's connection inside a failed transaction
+        if conn.in_transaction:
+            conn.rollback()
+
+def record_attendance_writes(conn, batch):
+    signed_in, signed_out = [], []
+    for kind, user_id, event_id, at, key in batch:
+        if key is not None and not claim_idempotency_key(conn, user_id, key, kind, event_id, at):
+            continue
+        if kind == 'sign_in':
+            # Checked again here in case compaction ran after the request was answered
+            cursor = conn.execute(f'''
+                INSERT INTO attendance (user_id, event_id, sign_in_time, status)
+                SELECT ?, ?, ?, 'signed_in'
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM attendance
+                    WHERE user_id = ? AND event_id = ? AND sign_out_time IS NULL
+                ) AND NOT EXISTS (
+                    SELECT 1 FROM events WHERE id = ? AND {COMPACTED_EVENT_SQL}
+                )
+            ''', (user_id, event_id, at, user_id, event_id, event_id))
+            changed = signed_in
+        else:
+            cursor = conn.execute(f'''
+                UPDATE attendance
+                SET sign_out_time = {SIGN_OUT_TIME}, status = 'completed'
+                WHERE user_id = ? AND event_id = ? AND sign_out_time IS NULL
+            ''', (at, at, user_id, event_id))
+            changed = signed_out
+        if cursor.rowcount:
+            changed.append({'user_id': user_id, 'event_id': event_id, 'time': at})
+    record_changes(conn, 'attendance', 'signed_in', signed_in)
+    record_changes(conn, 'attendance', 'signed_out', signed_out)
+
+def database_busy(error):
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in str(error) or 'busy' in str(error))
+
+# Each team's database has its own writer lock, so each gets its own queue
+attendance_write_queues = {}
+attendance_write_queues_lock = threading.Lock()
+
+def attendance_writes():
+    tenant = current_tenant()
+    queue = attendance_write_queues.get(tenant.key)
+    if queue is None:
+        with attendance_write_queues_lock:
+            queue = attendance_write_queues.get(tenant.key)
+            if queue is None:
+                def apply_batch(batch):
+                    with use_tenant(tenant):
+                        apply_attendance_writes(batch)
+                queue = attendance_write_queues[tenant.key] = AttendanceWriteQueue(
+                    apply_batch, max_delay=ATTENDANCE_WRITE_BATCH_MS / 1000,
+                    max_pending=ATTENDANCE_WRITE_QUEUE_MAX, log=app.logger, is_transient=database_busy)
+    return queue
+
+metrics.add_collector(lambda: [
+    ('attendance_write_queue_depth', 'gauge', 'Queued attendance writes not yet committed.',
+     sum(queue.depth() for queue in list(attendance_write_queues.values()))),
+    ('attendance_write_batches_total', 'counter', 'Group commits of queued attendance writes.',
+     sum(queue.batches for queue in list(attendance_write_queues.values()))),
+    ('attendance_writes_total', 'counter', 'Queued attendance writes committed.',
+     sum(queue.writes for queue in list(attendance_write_queues.values()))),
+    ('attendance_write_failures_total', 'counter', 'Queued attendance writes dropped after an error.',
+     sum(queue.failed for queue in list(attendance_write_queues.values()))),
+] if ATTENDANCE_WRITE_QUEUE else [])
+
+# Compacted days are totals in attendance_daily and their raw rows are gone,
+# so a late sign-in there could neither be merged nor recounted correctly
+COMPACTED_EVENT_SQL = 'date <= (SELECT MAX(day) FROM attendance_daily)'
+ATTENDANCE_COMPACTED_ERROR = 'Attendance for this event has been compacted and can no longer change'
+
+def compacted_events(conn, event_ids):
+    """The ids among event_ids whose day has been rolled up into attendance_daily."""
+    event_ids = list(event_ids)
+    return {row['id'] for row in conn.execute(f'''
+        SELECT id FROM events
+        WHERE id IN ({', '.join('?' for _ in event_ids)}) AND {COMPACTED_EVENT_SQL}
+    ''', event_ids)}
+
+def has_open_attendance(conn, user_id, event_id):
+    return conn.execute('''
+        SELECT 1 FROM attendance 
+        WHERE user_id = ? AND event_id = ? AND sign_out_time IS NULL
+    ''', (user_id, event_id)).fetchone() is not None
 
-# Attendance routes
 @app.route('/api/attendance/sign-in', methods=['POST'])
 def sign_in():
     if 'user_id' not in session:
@@ -380,23 +1962,54 @@ def sign_in():
     if not event_id:
         return jsonify({'error': 'Event ID required'}), 400
     
-    conn = get_db()
+    try:
+        key = idempotency_key()
+        now = attendance_time(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    existing = conn.execute('''
-        SELECT * FROM attendance 
-        WHERE user_id = ? AND event_id = ? AND sign_out_time IS NULL
-    ''', (session['user_id'], event_id)).fetchone()
+    conn = get_db()
     
-    if existing:
-        conn.close()
+    # Attendance attaches to a stored event, so a series occurrence gets its row now
+    event_id = stored_event_id(conn, event_id)
+    if event_id is None:
+        return jsonify({'error': 'Event not found'}), 404
+    
+    if key is not None:
+        replayed = replayed_attendance(conn, session['user_id'], key, 'sign_in', event_id)
+        if replayed is not None:
+            return replayed
+    
+    if compacted_events(conn, [event_id]):
+        return jsonify({'error': ATTENDANCE_COMPACTED_ERROR}), 409
+    
+    if ATTENDANCE_WRITE_QUEUE:
+        try:
+            queued = attendance_writes().sign_in(
+                session['user_id'], event_id, now,
+                lambda: has_open_attendance(conn, session['user_id'], event_id), key
+            )
+        except QueueFull:
+            return jsonify({'error': 'Too many check-ins at once, please try again'}), 503, {'Retry-After': '1'}
+        if not queued:
+            return jsonify({'error': 'Already signed in'}), 400
+        return jsonify({'success': True})
+    
+    if has_open_attendance(conn, session['user_id'], event_id):
         return jsonify({'error': 'Already signed in'}), 400
     
+    if key is not None and not claim_idempotency_key(conn, session['user_id'], key, 'sign_in', event_id, now):
+        # A copy of this request committed first
+        conn.rollback()
+        return replayed_attendance(conn, session['user_id'], key, 'sign_in', event_id)
+    
     conn.execute('''
         INSERT INTO attendance (user_id, event_id, sign_in_time, status)
         VALUES (?, ?, ?, 'signed_in')
-    ''', (session['user_id'], event_id, datetime.now()))
-    conn.commit()
-    conn.close()
+    ''', (session['user_id'], event_id, now))
+    record_change(conn, 'attendance', 'signed_in',
+                  {'user_id': session['user_id'], 'event_id': event_id, 'time': now})
+    commit_changes(conn, 'attendance')
     
     return jsonify({'success': True})
 
@@ -408,30 +2021,338 @@ def sign_out():
     data = request.get_json()
     event_id = data.get('event_id')
     
+    if not event_id:
+        return jsonify({'error': 'Event ID required'}), 400
+    
+    try:
+        key = idempotency_key()
+        now = attendance_time(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     conn = get_db()
-    conn.execute('''
+    
+    # Refuse unknown events before the idempotency key is claimed for them
+    event_id = stored_event_id(conn, event_id, create=False)
+    if event_id is None:
+        return jsonify({'error': 'Event not found'}), 404
+    
+    if key is not None:
+        replayed = replayed_attendance(conn, session['user_id'], key, 'sign_out', event_id)
+        if replayed is not None:
+            return replayed
+    
+    if ATTENDANCE_WRITE_QUEUE:
+        try:
+            attendance_writes().sign_out(session['user_id'], event_id, now, key)
+        except QueueFull:
+            return jsonify({'error': 'Too many check-outs at once, please try again'}), 503, {'Retry-After': '1'}
+        return jsonify({'success': True})
+    
+    if key is not None and not claim_idempotency_key(conn, session['user_id'], key, 'sign_out', event_id, now):
+        conn.rollback()
+        return replayed_attendance(conn, session['user_id'], key, 'sign_out', event_id)
+    
+    cursor = conn.execute(f'''
         UPDATE attendance 
-        SET sign_out_time = ?, status = 'completed'
+        SET sign_out_time = {SIGN_OUT_TIME}, status = 'completed'
         WHERE user_id = ? AND event_id = ? AND sign_out_time IS NULL
-    ''', (datetime.now(), session['user_id'], event_id))
-    conn.commit()
-    conn.close()
+    ''', (now, now, session['user_id'], event_id))
+    if cursor.rowcount:
+        record_change(conn, 'attendance', 'signed_out',
+                      {'user_id': session['user_id'], 'event_id': event_id, 'time': now})
+    commit_changes(conn, 'attendance')
     
     return jsonify({'success': True})
 
+# Bulk attendance for coach-run roll call
+BULK_ATTENDANCE_MAX_ROWS = 500
+
+def values_placeholders(rows, width):
+    row = '(' + ', '.join('?' for _ in range(width)) + ')'
+    return ', '.join(row for _ in rows)
+
+@app.route('/api/attendance/bulk-sign-in', methods=['POST'])
+def bulk_sign_in():
+    """Sign in many athletes at once.
+
+    Accepts {"entries": [{"user_id": 1, "event_id": 2}, ...]} or
+    {"event_id": 2, "roster": true} for every active student.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    if g.user['role'] not in ['coach', 'assistant_coach', 'athletic_director']:
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    data = request.get_json()
+    roster = bool(data.get('roster'))
+    conn = get_db()
+    
+    if roster:
+        if not data.get('event_id'):
+            return jsonify({'error': 'Event ID required'}), 400
+        students = conn.execute('''
+            SELECT id FROM users
+            WHERE role = 'student' AND (status = 'active' OR status IS NULL)
+        ''').fetchall()
+        pairs = [(student['id'], str(data['event_id'])) for student in students]
+    else:
+        entries = data.get('entries', [])
+        try:
+            if not isinstance(entries, list):
+                raise TypeError
+            pairs = [(int(entry['user_id']), str(entry['event_id'])) for entry in entries]
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'error': 'Each entry needs a user_id and an event_id'}), 400
+    
+    if not pairs:
+        return jsonify({'error': 'No athletes to sign in'}), 400
+    if len(pairs) > BULK_ATTENDANCE_MAX_ROWS:
+        return jsonify({'error': f'At most {BULK_ATTENDANCE_MAX_ROWS} rows per request'}), 400
+    
+    # Only now that the request is known to be good, series occurrences get
+    # their events rows; ids that name no event are kept as sent and reported
+    # as unknown_event
+    resolved = {event_id: concrete_event_id(conn, event_id) or event_id
+                for event_id in {event_id for _, event_id in pairs}}
+    pairs = [(user_id, resolved[event_id]) for user_id, event_id in pairs]
+    
+    # Take the writer lock up front so no open row can appear between the
+    # duplicate check and the insert
+    conn.execute('BEGIN IMMEDIATE')
+    
+    user_ids = sorted({user_id for user_id, _ in pairs})
+    event_ids = sorted({event_id for _, event_id in pairs if isinstance(event_id, int)})
+    known_users = {row['id'] for row in conn.execute(f'''
+        SELECT id FROM users
+        WHERE id IN ({', '.join('?' for _ in user_ids)}) AND (status = 'active' OR status IS NULL)
+    ''', user_ids)}
+    known_events = {row['id'] for row in conn.execute(f'''
+        SELECT id FROM events WHERE id IN ({', '.join('?' for _ in event_ids)})
+    ''', event_ids)}
+    closed_events = compacted_events(conn, event_ids)
+    open_rows = {(row['user_id'], row['event_id']) for row in conn.execute(f'''
+        WITH requested (user_id, event_id) AS (VALUES {values_placeholders(pairs, 2)})
+        SELECT a.user_id, a.event_id
+        FROM requested r
+        JOIN attendance a ON a.user_id = r.user_id AND a.event_id = r.event_id
+        WHERE a.sign_out_time IS NULL
+    ''', [value for pair in pairs for value in pair])}
+    
+    results = []
+    to_insert = []
+    seen = set()
+    now = datetime.now()
+    for user_id, event_id in pairs:
+        if user_id not in known_users:
+            status = 'unknown_user'
+        elif event_id not in known_events:
+            status = 'unknown_event'
+        elif event_id in closed_events:
+            status = 'compacted'
+        elif (user_id, event_id) in open_rows or (user_id, event_id) in seen:
+            status = 'already_signed_in'
+        else:
+            status = 'signed_in'
+            seen.add((user_id, event_id))
+            to_insert.append((user_id, event_id, now))
+        results.append({'user_id': user_id, 'event_id': event_id, 'status': status})
+    
+    conn.executemany('''
+        INSERT INTO attendance (user_id, event_id, sign_in_time, status)
+        VALUES (?, ?, ?, 'signed_in')
+    ''', to_insert)
+    record_changes(conn, 'attendance', 'signed_in', [
+        {'user_id': user_id, 'event_id': event_id, 'time': signed_in_at}
+        for user_id, event_id, signed_in_at in to_insert
+    ])
+    commit_changes(conn, 'attendance')
+    
+    return jsonify({'signed_in': len(to_insert), 'results': results})
+
+@app.route('/api/attendance/bulk-sign-out', methods=['POST'])
+def bulk_sign_out():
+    """Close every open attendance row for an event, or only those of user_ids."""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    if g.user['role'] not in ['coach', 'assistant_coach', 'athletic_director']:
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    data = request.get_json()
+    event_id = data.get('event_id')
+    
+    if not event_id:
+        return jsonify({'error': 'Event ID required'}), 400
+    
+    user_ids = data.get('user_ids')
+    if user_ids is not None and (
+            not isinstance(user_ids, list)
+            or not all(isinstance(user_id, int) and not isinstance(user_id, bool) for user_id in user_ids)):
+        return jsonify({'error': 'user_ids must be a list of user ids'}), 400
+    if user_ids and len(user_ids) > BULK_ATTENDANCE_MAX_ROWS:
+        return jsonify({'error': f'At most {BULK_ATTENDANCE_MAX_ROWS} rows per request'}), 400
+    
+    conn = get_db()
+    event_id = concrete_event_id(conn, event_id, create=False)
+    
+    where = 'WHERE event_id = ? AND sign_out_time IS NULL'
+    values = [event_id]
+    if user_ids:
+        where += f" AND user_id IN ({', '.join('?' for _ in user_ids)})"
+        values.extend(user_ids)
+    
+    now = datetime.now()
+    conn.execute('BEGIN IMMEDIATE')
+    closing = conn.execute(f'SELECT user_id FROM attendance {where}', values).fetchall()
+    conn.execute(f'''
+        UPDATE attendance
+        SET sign_out_time = ?, status = 'completed'
+        {where}
+    ''', [now] + values)
+    record_changes(conn, 'attendance', 'signed_out', [
+        {'user_id': row['user_id'], 'event_id': event_id, 'time': now} for row in closing
+    ])
+    commit_changes(conn, 'attendance')
+    
+    return jsonify({'signed_out': len(closing)})
+
+# Live change stream (Server-Sent Events). Run gunicorn with threaded or
+# async workers (e.g. -k gthread --threads 100) so idle streams don't pin a
+# whole worker process each.
+STREAM_HEARTBEAT_SECONDS = 15
+STREAM_MAX_SECONDS = 300
+# change_log rows are kept this long for resuming streams and delta sync;
+# compact_attendance() deletes older ones
+CHANGE_LOG_RETENTION_DAYS = int(os.environ.get('CHANGE_LOG_RETENTION_DAYS', 14))
+STAFF_STREAM_TOPICS = {'events', 'attendance', 'requirements', 'grades', 'users'}
+MEMBER_STREAM_TOPICS = {'events', 'attendance', 'requirements'}
+
+# One feed per team, each tailing its own database's change_log
+change_feeds = {}
+change_feeds_lock = threading.Lock()
+
+def tenant_change_feed():
+    tenant = current_tenant()
+    feed = change_feeds.get(tenant.key)
+    if feed is None:
+        with change_feeds_lock:
+            feed = change_feeds.get(tenant.key)
+            if feed is None:
+                feed = change_feeds[tenant.key] = ChangeFeed(functools.partial(tenant_db, tenant))
+    return feed
+
+@app.route('/api/stream', methods=['GET'])
+def stream_changes():
+    """Push committed changes as they happen.
+
+    Resumes from the Last-Event-ID header (sent by EventSource on reconnect)
+    or ?since=<change id>; otherwise starts with changes made from now on.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    if g.user['role'] in ['coach', 'assistant_coach', 'athletic_director']:
+        topics = STAFF_STREAM_TOPICS
+    else:
+        topics = MEMBER_STREAM_TOPICS
+    
+    feed = tenant_change_feed()
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    if last_id is None:
+        last_id = request.args.get('since', type=int)
+    if last_id is None:
+        last_id = feed.latest_id()
+    
+    def generate(last_id):
+        yield 'retry: 3000\n\n'
+        # Streams end after a while; EventSource reconnects with Last-Event-ID
+        deadline = time.monotonic() + STREAM_MAX_SECONDS
+        while time.monotonic() < deadline:
+            changes = feed.wait(last_id, STREAM_HEARTBEAT_SECONDS)
+            if not changes:
+                yield ': keep-alive\n\n'
+                continue
+            for change in changes:
+                last_id = change['id']
+                if change['topic'] in topics:
+                    yield (f"id: {change['id']}\nevent: {change['topic']}\n"
+                           f"data: {json.dumps(change)}\n\n")
+    
+    response = app.response_class(generate(last_id), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# Delta sync for clients coming back online: everything they missed, read
+# from change_log in one request, with only the latest change per event,
+# series, requirement and check-in. Past SYNC_MAX_CHANGES the client is told
+# to reload instead.
+SYNC_TOPICS = ('events', 'requirements', 'attendance')
+SYNC_MAX_CHANGES = 1000
+
+def change_subject(change):
+    """What a change is about; a later change to the same subject supersedes it."""
+    data = change['data']
+    if change['action'].startswith('series_'):
+        return 'series', data.get('id', data.get('series_id'))
+    if change['topic'] == 'attendance':
+        return 'attendance', data['user_id'], data['event_id']
+    return change['topic'], data.get('id')
+
+@app.route('/api/sync', methods=['GET'])
+def sync_changes():
+    """Return the changes since ?since=<version>, and the version to ask from next time.
+
+    Without since, or when the client is too far behind or asks from before
+    the oldest change still kept, the answer has reset=true and no changes:
+    reload the lists, then sync from version.
+    Athletes and parents see only their own check-ins.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    conn = get_db()
+    since = request.args.get('since', type=int)
+    version, oldest = conn.execute('''
+        SELECT (SELECT MAX(id) FROM change_log), (SELECT MIN(id) FROM change_log)
+    ''').fetchone()
+    version = version or 0
+    # Changes before oldest were trimmed, so a client that missed them must reload
+    if since is None or since > version or (oldest is not None and since < oldest - 1):
+        return jsonify({'version': version, 'reset': True, 'changes': []})
+    
+    # Bounded by version so that nothing committed after it is skipped next time
+    changes = ChangeFeed.read(conn, since, SYNC_MAX_CHANGES + 1, until_id=version, topics=SYNC_TOPICS)
+    if len(changes) > SYNC_MAX_CHANGES:
+        return jsonify({'version': version, 'reset': True, 'changes': []})
+    
+    staff = g.user['role'] in ['coach', 'assistant_coach', 'athletic_director']
+    latest = {}
+    for change in changes:
+        if change['topic'] == 'attendance' and not staff and change['data']['user_id'] != session['user_id']:
+            continue
+        subject = change_subject(change)
+        latest.pop(subject, None)
+        latest[subject] = change
+    
+    return jsonify({'version': version, 'reset': False, 'changes': list(latest.values())})
+
 # Academic requirements routes - GET
 @app.route('/api/academics/requirements', methods=['GET'])
+@conditional_get('academic_requirements')
 def get_requirements():
     if 'user_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
     
-    conn = get_db()
-    requirements = conn.execute(
-        'SELECT * FROM academic_requirements ORDER BY subject'
-    ).fetchall()
-    conn.close()
+    def load():
+        requirements = get_db().execute(
+            'SELECT * FROM academic_requirements ORDER BY subject'
+        ).fetchall()
+        return [dict(req) for req in requirements]
     
-    return jsonify([dict(req) for req in requirements])
+    return cached_json('requirements', ['academic_requirements'], load)
 
 # Academic requirements routes - CREATE
 @app.route('/api/academics/requirements', methods=['POST'])
@@ -439,7 +2360,7 @@ def create_requirement():
     if 'user_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
     
-    if session['role'] not in ['coach', 'assistant_coach', 'athletic_director']:
+    if g.user['role'] not in ['coach', 'assistant_coach', 'athletic_director']:
         return jsonify({'error': 'Unauthorized'}), 403
     
     data = request.get_json()
@@ -462,18 +2383,17 @@ def create_requirement():
         ))
         
         req_id = cursor.lastrowid
-        conn.commit()
         
         requirement = conn.execute(
             'SELECT * FROM academic_requirements WHERE id = ?', 
             (req_id,)
         ).fetchone()
-        conn.close()
+        record_change(conn, 'requirements', 'created', dict(requirement))
+        commit_changes(conn, 'academic_requirements')
         
         return jsonify(dict(requirement)), 201
         
     except Exception as e:
-        conn.close()
         return jsonify({'error': str(e)}), 400
 
 # Academic requirements routes - DELETE
@@ -482,7 +2402,7 @@ def delete_requirement(req_id):
     if 'user_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
     
-    if session['role'] not in ['coach', 'assistant_coach', 'athletic_director']:
+    if g.user['role'] not in ['coach', 'assistant_coach', 'athletic_director']:
         return jsonify({'error': 'Unauthorized'}), 403
     
     conn = get_db()
@@ -490,57 +2410,472 @@ def delete_requirement(req_id):
     try:
         conn.execute('DELETE FROM student_grades WHERE requirement_id = ?', (req_id,))
         conn.execute('DELETE FROM academic_requirements WHERE id = ?', (req_id,))
-        conn.commit()
-        conn.close()
+        record_change(conn, 'requirements', 'deleted', {'id': req_id})
+        commit_changes(conn, 'academic_requirements', 'student_grades')
         
         return jsonify({'message': 'Requirement deleted successfully'})
         
     except Exception as e:
-        conn.close()
         return jsonify({'error': str(e)}), 400
 
 # Academic alerts
 @app.route('/api/academics/alerts', methods=['GET'])
+@conditional_get('student_grades', 'academic_requirements', 'users')
 def get_academic_alerts():
     if 'user_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
     
-    conn = get_db()
+    # academic_alerts is maintained by triggers, so this is an index read
+    # rather than a join over every grade
+    student_id = request.args.get('student_id', type=int)
+    
+    def rows():
+        query = '''
+            SELECT first_name, last_name, subject, grade_required, current_grade
+            FROM academic_alerts
+        '''
+        values = []
+        if student_id is not None:
+            query += ' WHERE student_id = ?'
+            values.append(student_id)
+        return query_rows(query + ' ORDER BY last_name, first_name', values)
+    
+    return streamed_json(
+        f'alerts:{student_id}', ['student_grades', 'academic_requirements', 'users'], rows
+    )
+
+# Analytics routes - attendance rates, tardiness, time on site and streaks
+ANALYTICS_DEFAULT_DAYS = 180
+MANDATORY_WEIGHT = 2
+LATE_GRACE_MINUTES = 5
+
+# Every active student is expected at every event in the window, stored or
+# expanded from a series. Attendance is read per student, event type and day:
+# compacted days straight from attendance_daily, the rest folded from raw
+# rows, where visits merges repeat sign-ins into one row per student and
+# event. Compaction moves rows from one source to the other in a single
+# transaction, so nothing counts twice, and everything scales with
+# attendance rather than with roster x events.
+ATTENDANCE_DAILY_SQL = '''
+    WITH RECURSIVE {series_occurrences},
+    window_days AS MATERIALIZED (
+        SELECT date AS day, COUNT(*) AS events, ROW_NUMBER() OVER (ORDER BY date) AS ordinal
+        FROM (
+            SELECT date FROM events WHERE date BETWEEN :date_from AND :date_to
+            UNION ALL
+            SELECT date FROM series_occurrences
+        )
+        GROUP BY date
+    ),
+    visits AS (
+        SELECT a.user_id, w.ordinal, w.events AS day_events, e.event_type, e.is_mandatory,
+               (julianday(MIN(a.sign_in_time)) - julianday(e.date || ' ' || e.start_time)) * 1440
+                   AS minutes_late,
+               (julianday(MAX(a.sign_out_time)) - julianday(MIN(a.sign_in_time))) * 1440
+                   AS minutes_on_site
+        FROM window_days w
+        CROSS JOIN events e ON e.date = w.day
+        JOIN attendance a ON a.event_id = e.id
+        WHERE {student_filter}
+        GROUP BY a.user_id, e.id
+    ),
+    daily AS MATERIALIZED (
+        SELECT d.user_id, w.ordinal, w.events AS day_events, d.event_type, d.attended,
+               d.mandatory_attended, d.late, d.minutes_late, d.completed, d.minutes_on_site
+        FROM window_days w
+        CROSS JOIN attendance_daily d ON d.day = w.day
+        WHERE {student_filter}
+        UNION ALL
+        SELECT user_id, ordinal, day_events, event_type, 1, is_mandatory,
+               minutes_late > :late_grace,
+               CASE WHEN minutes_late > :late_grace THEN minutes_late ELSE 0 END,
+               minutes_on_site IS NOT NULL, COALESCE(minutes_on_site, 0)
+        FROM visits
+    )
+'''
+
+def attendance_analytics(conn, date_from, date_to, student_id=None):
+    params = {
+        'date_from': date_from,
+        'date_to': date_to,
+        'student_id': student_id,
+        'mandatory_weight': MANDATORY_WEIGHT,
+        'late_grace': LATE_GRACE_MINUTES
+    }
+    
+    # Series occurrences that nobody signed in to were still expected
+    series_occurrences = SERIES_OCCURRENCES_CTES.format(window=':date_from, :date_to')
+    event_types = conn.execute(f'''
+        WITH RECURSIVE {series_occurrences}
+        SELECT event_type, COUNT(*) AS events,
+               SUM(CASE WHEN is_mandatory THEN :mandatory_weight ELSE 1 END) AS weight,
+               SUM(is_mandatory) AS mandatory
+        FROM (
+            SELECT event_type, is_mandatory FROM events WHERE date BETWEEN :date_from AND :date_to
+            UNION ALL
+            SELECT event_type, is_mandatory FROM series_occurrences
+        )
+        GROUP BY event_type
+        ORDER BY event_type
+    ''', params).fetchall()
+    
+    # One pass over daily yields a row per student and event type; the
+    # per-student and per-type totals are summed from those below. Streaks
+    # count events over runs of consecutive event days a student attended in
+    # full (gaps and islands: the day's ordinal minus the student's own day
+    # number is constant along each run), since compacted days no longer say
+    # which of several same-day events were attended.
+    student_filter = 'user_id = :student_id' if student_id is not None else 'true'
+    rows = conn.execute(ATTENDANCE_DAILY_SQL.format(series_occurrences=series_occurrences,
+                                                       student_filter=student_filter) + ''',
+        islands AS (
+            SELECT user_id, ordinal, events,
+                   ordinal - ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY ordinal) AS island
+            FROM (
+                SELECT user_id, ordinal, MAX(day_events) AS events
+                FROM daily
+                GROUP BY user_id, ordinal
+                HAVING SUM(attended) >= MAX(day_events)
+            )
+        ),
+        streaks AS (
+            SELECT user_id, MAX(length) AS longest_streak,
+                   MAX(CASE WHEN last_ordinal = (SELECT MAX(ordinal) FROM window_days)
+                            THEN length END) AS current_streak
+            FROM (
+                SELECT user_id, SUM(events) AS length, MAX(ordinal) AS last_ordinal
+                FROM islands
+                GROUP BY user_id, island
+            )
+            GROUP BY user_id
+        ),
+        per_type AS (
+            SELECT user_id, event_type,
+                   SUM(attended) AS attended,
+                   SUM(attended) + (:mandatory_weight - 1) * SUM(mandatory_attended)
+                       AS weighted_attended,
+                   SUM(mandatory_attended) AS mandatory_attended,
+                   SUM(late) AS late,
+                   TOTAL(minutes_late) AS minutes_late,
+                   SUM(completed) AS completed,
+                   TOTAL(minutes_on_site) AS minutes_on_site
+            FROM daily
+            GROUP BY user_id, event_type
+        )
+        SELECT u.id AS student_id, u.first_name, u.last_name, p.*,
+               COALESCE(s.current_streak, 0) AS current_streak,
+               COALESCE(s.longest_streak, 0) AS longest_streak
+        FROM users u
+        LEFT JOIN per_type p ON p.user_id = u.id
+        LEFT JOIN streaks s ON s.user_id = u.id
+        WHERE u.role = 'student' AND (u.status = 'active' OR u.status IS NULL)
+          AND (:student_id IS NULL OR u.id = :student_id)
+        ORDER BY u.last_name, u.first_name, u.id
+    ''', params).fetchall()
+    
+    counters = ('attended', 'weighted_attended', 'mandatory_attended', 'late',
+                'minutes_late', 'completed', 'minutes_on_site')
+    athletes = {}
+    by_type = {row['event_type']: dict.fromkeys(counters, 0) for row in event_types}
+    for row in rows:
+        athlete = athletes.get(row['student_id'])
+        if athlete is None:
+            athlete = athletes[row['student_id']] = dict(
+                dict.fromkeys(counters, 0), **{key: row[key] for key in (
+                    'student_id', 'first_name', 'last_name', 'current_streak', 'longest_streak')}
+            )
+        if row['event_type'] is None:
+            continue
+        for key in counters:
+            athlete[key] += row[key]
+            by_type[row['event_type']][key] += row[key]
+    
+    def rate(part, whole):
+        return round(part / whole, 3) if whole else None
+    
+    def average(total, count):
+        return round(total / count, 1) if count else None
+    
+    events = sum(row['events'] for row in event_types)
+    weight = sum(row['weight'] for row in event_types)
+    mandatory = sum(row['mandatory'] for row in event_types)
+    roster_size = len(athletes)
+    attended = sum(athlete['attended'] for athlete in athletes.values())
+    
+    return {
+        'from': date_from,
+        'to': date_to,
+        'mandatory_weight': MANDATORY_WEIGHT,
+        'late_grace_minutes': LATE_GRACE_MINUTES,
+        'team': {
+            'athletes': roster_size,
+            'events': events,
+            'expected': events * roster_size,
+            'attended': attended,
+            'attendance_rate': rate(attended, events * roster_size),
+            'weighted_rate': rate(sum(a['weighted_attended'] for a in athletes.values()),
+                                  weight * roster_size),
+            'late_rate': rate(sum(a['late'] for a in athletes.values()), attended)
+        },
+        'event_types': [{
+            'event_type': row['event_type'],
+            'events': row['events'],
+            'expected': row['events'] * roster_size,
+            'attended': by_type[row['event_type']]['attended'],
+            'attendance_rate': rate(by_type[row['event_type']]['attended'], row['events'] * roster_size),
+            'late_rate': rate(by_type[row['event_type']]['late'], by_type[row['event_type']]['attended']),
+            'avg_minutes_on_site': average(by_type[row['event_type']]['minutes_on_site'],
+                                           by_type[row['event_type']]['completed'])
+        } for row in event_types],
+        'athletes': [{
+            'student_id': athlete['student_id'],
+            'first_name': athlete['first_name'],
+            'last_name': athlete['last_name'],
+            'expected': events,
+            'attended': athlete['attended'],
+            'attendance_rate': rate(athlete['attended'], events),
+            'weighted_rate': rate(athlete['weighted_attended'], weight),
+            'mandatory_missed': mandatory - athlete['mandatory_attended'],
+            'late': athlete['late'],
+            'late_rate': rate(athlete['late'], athlete['attended']),
+            'avg_minutes_late': average(athlete['minutes_late'], athlete['late']),
+            'avg_minutes_on_site': average(athlete['minutes_on_site'], athlete['completed']),
+            'current_streak': athlete['current_streak'],
+            'longest_streak': athlete['longest_streak']
+        } for athlete in athletes.values()]
+    }
+
+@app.route('/api/analytics/attendance', methods=['GET'])
+@conditional_get('events', 'attendance', 'users', daily=True,
+                 roles=['coach', 'assistant_coach', 'athletic_director', 'student'], per_user=True)
+def get_attendance_analytics():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
     
-    alerts = conn.execute('''
-        SELECT 
-            u.first_name, 
-            u.last_name,
-            ar.subject,
-            ar.grade_required,
-            sg.current_grade
-        FROM student_grades sg
-        JOIN users u ON sg.student_id = u.id
-        JOIN academic_requirements ar ON sg.requirement_id = ar.id
-        WHERE sg.current_grade < ar.grade_required
-        AND u.role = 'student'
-        ORDER BY u.last_name, u.first_name
-    ''').fetchall()
+    # Students only ever see their own numbers
+    if g.user['role'] in ['coach', 'assistant_coach', 'athletic_director']:
+        student_id = request.args.get('student_id', type=int)
+    elif g.user['role'] == 'student':
+        student_id = session['user_id']
+    else:
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    try:
+        date_to = parse_date_arg('to')
+        date_from = parse_date_arg('from')
+    except ValueError:
+        return jsonify({'error': 'from and to must be YYYY-MM-DD dates'}), 400
+    
+    # Reports cover completed days, so today's events count from tomorrow on
+    yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+    date_to = min(date_to or yesterday, yesterday)
+    date_from = date_from or (
+        datetime.strptime(date_to, '%Y-%m-%d') - timedelta(days=ANALYTICS_DEFAULT_DAYS - 1)
+    ).strftime('%Y-%m-%d')
+    
+    return cached_json(
+        f'analytics/attendance:{date_from}:{date_to}:{student_id}',
+        ['events', 'attendance', 'users'],
+        lambda: attendance_analytics(get_db(), date_from, date_to, student_id)
+    )
+
+# District overview for the athletic director: the same numbers for every
+# team, read from all the team databases at once through ATTACH
+DISTRICT_DEFAULT_DAYS = 30
+
+DISTRICT_TEAM_SQL = '''
+    SELECT :key{n} AS team,
+           (SELECT COUNT(*) FROM {schema}.users
+            WHERE role = 'student' AND (status = 'active' OR status IS NULL)) AS students,
+           (SELECT COUNT(*) FROM {schema}.users WHERE status = 'pending') AS pending_users,
+           (SELECT COUNT(*) FROM (
+                SELECT DISTINCT a.user_id, a.event_id
+                FROM {schema}.events e JOIN {schema}.attendance a ON a.event_id = e.id
+                WHERE e.date BETWEEN :date_from AND :date_to
+            )) + (SELECT COALESCE(SUM(attended), 0) FROM {schema}.attendance_daily
+                  WHERE day BETWEEN :date_from AND :date_to) AS attendances,
+           (SELECT COUNT(DISTINCT student_id) FROM {schema}.academic_alerts) AS students_with_alerts,
+           (SELECT MAX(created_at) FROM {schema}.change_log) AS last_change
+'''
+
+def district_summary(date_from, date_to):
+    teams = list(tenants)
+    conn = sqlite3.connect(':memory:', uri=True, factory=DB_CONNECTION_FACTORY)
+    conn.row_factory = sqlite3.Row
+    rows = []
+    try:
+        for start in range(0, len(teams), MAX_ATTACHED):
+            group = teams[start:start + MAX_ATTACHED]
+            with attached(conn, [tenant_database(tenant) for tenant in group]) as schemas:
+                params = {'date_from': date_from, 'date_to': date_to}
+                params.update((f'key{n}', tenant.key) for n, tenant in enumerate(group))
+                rows += conn.execute(' UNION ALL '.join(
+                    DISTRICT_TEAM_SQL.format(n=n, schema=schema) for n, schema in enumerate(schemas)
+                ), params).fetchall()
+    finally:
+        conn.close()
+    return [dict(row, name=tenants.get(row['team']).name) for row in rows]
+
+@app.route('/api/district/summary', methods=['GET'])
+def get_district_summary():
+    """Per-team students, pending registrations, attendances and academic alerts.
+
+    Attendances are counted from ?from= to ?to= (default: the last 30 days).
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    if g.user['role'] != 'athletic_director':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    try:
+        date_from = parse_date_arg('from')
+        date_to = parse_date_arg('to')
+    except ValueError:
+        return jsonify({'error': 'from and to must be YYYY-MM-DD dates'}), 400
     
-    conn.close()
-    return jsonify([dict(alert) for alert in alerts])
+    date_to = date_to or datetime.now().strftime('%Y-%m-%d')
+    date_from = date_from or (
+        datetime.strptime(date_to, '%Y-%m-%d') - timedelta(days=DISTRICT_DEFAULT_DAYS - 1)
+    ).strftime('%Y-%m-%d')
+    
+    return jsonify({'from': date_from, 'to': date_to, 'teams': district_summary(date_from, date_to)})
+
+# Attendance compaction - closed rows for events older than the horizon are
+# rolled up into attendance_daily (see compaction.py). Set
+# ATTENDANCE_COMPACT_INTERVAL_HOURS to run it inside each worker process;
+# otherwise run `flask --app main compact-attendance` from cron.
+ATTENDANCE_COMPACT_AFTER_DAYS = int(os.environ.get('ATTENDANCE_COMPACT_AFTER_DAYS', 90))
+ATTENDANCE_COMPACT_INTERVAL_HOURS = float(os.environ.get('ATTENDANCE_COMPACT_INTERVAL_HOURS', 0))
+ATTENDANCE_STALE_HOURS = float(os.environ.get('ATTENDANCE_STALE_HOURS', 6))
+ATTENDANCE_ARCHIVE_DIR = os.environ.get('ATTENDANCE_ARCHIVE_DIR')
+ATTENDANCE_COMPACT_BATCH_DAYS = 30
+
+def compact_attendance(conn, horizon_days=ATTENDANCE_COMPACT_AFTER_DAYS, stale_hours=ATTENDANCE_STALE_HOURS,
+                       archive_dir=ATTENDANCE_ARCHIVE_DIR, now=None, change_log_days=CHANGE_LOG_RETENTION_DAYS):
+    """Close stale open rows, compact attendance for events before the horizon and trim change_log.
+
+    Each batch of days commits on its own so the writer lock is held briefly.
+    Returns counts of closed, compacted and trimmed rows and the archive
+    path, if any.
+    """
+    now = now or datetime.now()
+    cutoff = (now - timedelta(days=horizon_days)).strftime('%Y-%m-%d')
+    
+    conn.execute('BEGIN IMMEDIATE')
+    closed = close_stale_attendance(conn, now - timedelta(hours=stale_hours))
+    record_changes(conn, 'attendance', 'signed_out', [
+        {'user_id': user_id, 'event_id': event_id, 'time': signed_out_at, 'auto_closed': True}
+        for user_id, event_id, signed_out_at in closed
+    ])
+    commit_changes(conn, 'attendance')
+    
+    archive = Archive(archive_dir, f'before-{cutoff}') if archive_dir else None
+    compacted = 0
+    try:
+        while True:
+            conn.execute('BEGIN IMMEDIATE')
+            day_from = oldest_compactable_day(conn, cutoff)
+            if day_from is None:
+                conn.rollback()
+                break
+            day_to = min(cutoff, (datetime.strptime(day_from, '%Y-%m-%d')
+                                  + timedelta(days=ATTENDANCE_COMPACT_BATCH_DAYS)).strftime('%Y-%m-%d'))
+            compacted += compact_days(conn, day_from, day_to, LATE_GRACE_MINUTES, archive)
+            commit_changes(conn, 'attendance')
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        if archive is not None:
+            archive.close()
+    
+    conn.execute('BEGIN IMMEDIATE')
+    trimmed = ChangeFeed.trim(conn, change_log_days)
+    conn.commit()
+    
+    return {
+        'cutoff': cutoff,
+        'closed': len(closed),
+        'compacted': compacted,
+        'trimmed': trimmed,
+        'archive': archive.path if archive is not None and archive.rows else None
+    }
+
+def compact_every_tenant():
+    for tenant in tenants:
+        with use_tenant(tenant):
+            try:
+                compact_attendance(get_db())
+            except Exception:
+                app.logger.exception('attendance compaction failed for team %s', tenant.key)
+
+attendance_compactor = PeriodicJob(compact_every_tenant,
+                                   ATTENDANCE_COMPACT_INTERVAL_HOURS * 3600,
+                                   name='attendance-compaction', log=app.logger)
+
+@app.before_request
+def start_attendance_compactor():
+    attendance_compactor.start()
+
+@app.cli.command('compact-attendance')
+@team_option(every=True)
+@click.option('--older-than', 'horizon_days', type=int, default=ATTENDANCE_COMPACT_AFTER_DAYS, show_default=True,
+              help='Compact attendance for events more than this many days ago.')
+@click.option('--stale-hours', type=float, default=ATTENDANCE_STALE_HOURS, show_default=True,
+              help='Sign out rows still open this many hours after their event ended.')
+@click.option('--archive', 'archive_dir', type=click.Path(file_okay=False), default=ATTENDANCE_ARCHIVE_DIR,
+              help='Also write the raw rows to a gzipped JSON Lines file in this directory.')
+def compact_attendance_command(horizon_days, stale_hours, archive_dir):
+    """Roll old attendance rows up into the attendance_daily summary."""
+    started = time.perf_counter()
+    result = compact_attendance(get_db(), horizon_days, stale_hours, archive_dir)
+    print(f"Closed {result['closed']} stale rows and compacted {result['compacted']} rows "
+          f"for events before {result['cutoff']} in {time.perf_counter() - started:.1f}s.")
+    print(f"Trimmed {result['trimmed']} changes older than {CHANGE_LOG_RETENTION_DAYS} days from change_log.")
+    if result['archive']:
+        print(f"Archived raw rows to {result['archive']}.")
 
 # User management routes - Get students
 @app.route('/api/users/students', methods=['GET'])
+@conditional_get('users')
 def get_students():
     if 'user_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
     
-    conn = get_db()
-    students = conn.execute('''
-        SELECT id, username, first_name, last_name, email, phone, grade
-        FROM users 
-        WHERE role = 'student' AND (status = 'active' OR status IS NULL)
-        ORDER BY last_name, first_name
-    ''').fetchall()
-    conn.close()
+    def rows():
+        return query_rows('''
+            SELECT id, username, first_name, last_name, email, phone, grade
+            FROM users 
+            WHERE role = 'student' AND (status = 'active' OR status IS NULL)
+            ORDER BY last_name, first_name
+        ''')
+    
+    return streamed_json('students', ['users'], rows)
+
+# Read cache counters (for coaches)
+@app.route('/api/admin/cache-stats', methods=['GET'])
+def get_cache_stats():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    if g.user['role'] not in ['coach', 'assistant_coach', 'athletic_director']:
+        return jsonify({'error': 'Unauthorized'}), 403
     
-    return jsonify([dict(student) for student in students])
+    return jsonify(read_cache.stats())
+
+# Prometheus scrape endpoint: bearer METRICS_TOKEN if set, otherwise staff sessions
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    if METRICS_TOKEN:
+        supplied = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(supplied.encode(), f'Bearer {METRICS_TOKEN}'.encode()):
+            return jsonify({'error': 'Not authenticated'}), 401
+    elif 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    elif g.user['role'] not in ['coach', 'assistant_coach', 'athletic_director']:
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    return app.response_class(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 # Get pending users (for coaches)
 @app.route('/api/users/pending', methods=['GET'])
@@ -548,19 +2883,16 @@ def get_pending_users():
     if 'user_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
     
-    if session['role'] not in ['coach', 'assistant_coach', 'athletic_director']:
+    if g.user['role'] not in ['coach', 'assistant_coach', 'athletic_director']:
         return jsonify({'error': 'Unauthorized'}), 403
     
-    conn = get_db()
-    pending = conn.execute('''
+    # Pending sign-ups change with every registration, so they are not cached
+    return streamed_json(None, None, lambda: query_rows('''
         SELECT id, username, role, first_name, last_name, email, created_at
         FROM users 
         WHERE status = 'pending'
         ORDER BY created_at DESC
-    ''').fetchall()
-    conn.close()
-    
-    return jsonify([dict(user) for user in pending])
+    '''))
 
 # Approve or reject user
 @app.route('/api/users/<int:user_id>/approve', methods=['POST'])
@@ -568,7 +2900,7 @@ def approve_user(user_id):
     if 'user_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
     
-    if session['role'] not in ['coach', 'assistant_coach', 'athletic_director']:
+    if g.user['role'] not in ['coach', 'assistant_coach', 'athletic_director']:
         return jsonify({'error': 'Unauthorized'}), 403
     
     data = request.get_json()
@@ -583,21 +2915,45 @@ def approve_user(user_id):
         conn.execute("UPDATE users SET status = 'active' WHERE id = ?", (user_id,))
         message = 'User approved'
     else:
+        rejected = conn.execute("SELECT username FROM users WHERE id = ? AND status = 'pending'",
+                                (user_id,)).fetchone()
         conn.execute("DELETE FROM users WHERE id = ? AND status = 'pending'", (user_id,))
         message = 'User rejected and removed'
     
-    conn.commit()
-    conn.close()
+    record_change(conn, 'users', {'approve': 'approved', 'reject': 'rejected'}[action], {'id': user_id})
+    commit_changes(conn, 'users')
+    forget_user(user_id)
+    if action == 'reject' and rejected:
+        user_directory.remove(rejected['username'], current_tenant().key)
     
     return jsonify({'success': True, 'message': message})
 
+@app.cli.command('revoke-sessions')
+@team_option()
+@click.argument('username')
+def revoke_sessions_command(username):
+    """Sign a user out of every session at once."""
+    user = get_db().execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone()
+    if user is None:
+        print(f'No user {username!r}.')
+        raise SystemExit(1)
+    revoked = app.session_interface.revoke_user(current_tenant().key, user['id'])
+    print(f'Revoked {revoked} session(s) for {username}.')
+
 # Update student grades
+# Grades are percentages, whether entered one at a time or imported
+GRADE_MIN = 0
+GRADE_MAX = 100
+
+def grade_in_range(grade):
+    return GRADE_MIN <= grade <= GRADE_MAX
+
 @app.route('/api/students/<int:student_id>/grades', methods=['POST'])
 def update_student_grade(student_id):
     if 'user_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
     
-    if session['role'] not in ['coach', 'assistant_coach', 'athletic_director']:
+    if g.user['role'] not in ['coach', 'assistant_coach', 'athletic_director']:
         return jsonify({'error': 'Unauthorized'}), 403
     
     data = request.get_json()
@@ -605,6 +2961,13 @@ def update_student_grade(student_id):
     if not data.get('requirement_id') or data.get('grade') is None:
         return jsonify({'error': 'requirement_id and grade are required'}), 400
     
+    try:
+        grade = float(data['grade'])
+    except (TypeError, ValueError):
+        return jsonify({'error': 'grade must be a number'}), 400
+    if not grade_in_range(grade):
+        return jsonify({'error': f'grade must be between {GRADE_MIN} and {GRADE_MAX}'}), 400
+    
     conn = get_db()
     
     try:
@@ -618,35 +2981,203 @@ def update_student_grade(student_id):
                 UPDATE student_grades 
                 SET current_grade = ?, last_updated = ?
                 WHERE student_id = ? AND requirement_id = ?
-            ''', (data['grade'], datetime.now(), student_id, data['requirement_id']))
+            ''', (grade, datetime.now(), student_id, data['requirement_id']))
         else:
             conn.execute('''
                 INSERT INTO student_grades (student_id, requirement_id, current_grade, last_updated)
                 VALUES (?, ?, ?, ?)
-            ''', (student_id, data['requirement_id'], data['grade'], datetime.now()))
+            ''', (student_id, data['requirement_id'], grade, datetime.now()))
         
-        conn.commit()
-        conn.close()
+        record_change(conn, 'grades', 'updated', {
+            'student_id': student_id,
+            'requirement_id': data['requirement_id'],
+            'grade': grade
+        })
+        commit_changes(conn, 'student_grades')
         
         return jsonify({'message': 'Grade updated successfully'})
         
     except Exception as e:
-        conn.close()
         return jsonify({'error': str(e)}), 400
 
-# Serve React app
+# Bulk grade import (CSV or JSON) for progress-report periods
+GRADE_IMPORT_BATCH_SIZE = 1000
+GRADE_IMPORT_MAX_REPORTED = 100
+
+def read_grade_rows(stream, fmt):
+    """Yield (line, row dict) from a CSV, JSON array or JSON Lines byte stream.
+
+    Every format is parsed as it is read, so memory stays bounded however
+    many rows there are. A JSON array is read item by item; its line numbers
+    are item positions.
+    """
+    # A StreamReader only needs read(), which every WSGI server's input offers
+    text = codecs.getreader('utf-8-sig')(stream)
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    
+    first = text.read(1)
+    while first.isspace():
+        first = text.read(1)
+    if first == '[':
+        yield from enumerate(decode_array(text), start=1)
+        return
+    
+    # JSON Lines: one object per line, parsed as it streams in
+    pending = first
+    for number, line in enumerate(text, start=1):
+        line = pending + line
+        pending = ''
+        if line.strip():
+            yield number, json.loads(line)
+
+def import_grades(conn, rows):
+    """Upsert (student_id, requirement_id, grade) rows in batched executemany calls.
+
+    Runs in a single transaction that the caller commits. Returns the number
+    of imported rows and the list of rejected ones.
+    """
+    students = {row['id'] for row in conn.execute("SELECT id FROM users WHERE role = 'student'")}
+    requirements = {row['id'] for row in conn.execute('SELECT id FROM academic_requirements')}
+    
+    imported = 0
+    rejected = []
+    batch = []
+    now = datetime.now()
+    
+    def flush():
+        conn.executemany('''
+            INSERT INTO student_grades (student_id, requirement_id, current_grade, last_updated)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (student_id, requirement_id) DO UPDATE
+            SET current_grade = excluded.current_grade, last_updated = excluded.last_updated
+        ''', batch)
+        batch.clear()
+    
+    for line, row in rows:
+        try:
+            student_id = int(row['student_id'])
+            requirement_id = int(row['requirement_id'])
+            grade = float(row['grade'])
+        except (KeyError, TypeError, ValueError):
+            rejected.append({'line': line, 'error': 'student_id, requirement_id and numeric grade are required'})
+            continue
+        
+        if student_id not in students:
+            rejected.append({'line': line, 'error': f'Unknown student {student_id}'})
+        elif requirement_id not in requirements:
+            rejected.append({'line': line, 'error': f'Unknown requirement {requirement_id}'})
+        elif not grade_in_range(grade):
+            rejected.append({'line': line, 'error': f'grade must be between {GRADE_MIN} and {GRADE_MAX}'})
+        else:
+            batch.append((student_id, requirement_id, grade, now))
+            imported += 1
+            if len(batch) >= GRADE_IMPORT_BATCH_SIZE:
+                flush()
+    
+    if batch:
+        flush()
+    if imported:
+        record_change(conn, 'grades', 'imported', {'count': imported})
+    return imported, rejected
+
+def grade_import_format(filename, content_type):
+    if request.args.get('format') in ('csv', 'json'):
+        return request.args['format']
+    if (filename or '').lower().endswith('.csv') or 'csv' in (content_type or ''):
+        return 'csv'
+    return 'json'
+
+@app.route('/api/academics/grades/import', methods=['POST'])
+def import_student_grades():
+    """Import grades from an uploaded file field or the raw request body."""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    if g.user['role'] not in ['coach', 'assistant_coach', 'athletic_director']:
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    upload = request.files.get('file')
+    if upload:
+        stream = upload.stream
+        fmt = grade_import_format(upload.filename, upload.content_type)
+    else:
+        stream = request.stream
+        fmt = grade_import_format(None, request.content_type)
+    
+    conn = get_db()
+    
+    try:
+        imported, rejected = import_grades(conn, read_grade_rows(stream, fmt))
+        commit_changes(conn, 'student_grades')
+    except (ValueError, csv.Error) as e:
+        return jsonify({'error': f'Could not parse {fmt.upper()} file: {e}'}), 400
+    
+    return jsonify({
+        'imported': imported,
+        'rejected_count': len(rejected),
+        'rejected': rejected[:GRADE_IMPORT_MAX_REPORTED]
+    })
+
+@app.cli.command('import-grades')
+@team_option()
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'json']), help='Defaults to the file extension.')
+def import_grades_command(path, fmt):
+    """Import student grades from a CSV or JSON file."""
+    fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'json')
+    conn = get_db()
+    with open(path, 'rb') as stream:
+        imported, rejected = import_grades(conn, read_grade_rows(stream, fmt))
+    commit_changes(conn, 'student_grades')
+    
+    print(f'Imported {imported} grades, rejected {len(rejected)}.')
+    for row in rejected:
+        print(f"  line {row['line']}: {row['error']}")
+
+# Serve React app - the page's inline styles and scripts are split out into
+# fingerprinted files and precompressed once per worker; see assets.py
+STATIC_DIR = os.path.join(app.root_path, 'static')
+static_assets = AssetBundle(STATIC_DIR)
+
+def asset_response(asset):
+    encoding, body = asset.negotiate(request.accept_encodings)
+    response = app.response_class(body, content_type=asset.content_type)
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    # Each encoding is a different representation, so it gets its own ETag
+    response.set_etag(f'{asset.etag}-{encoding}')
+    response.headers['Cache-Control'] = asset.cache_control
+    return response.make_conditional(request)
+
+@app.cli.command('build-assets')
+@click.argument('out_dir')
+def build_assets_command(out_dir):
+    """Write the fingerprinted, precompressed app files for a proxy or CDN."""
+    for path, size in static_assets.build(out_dir):
+        print(f'{size:>10}  {path}')
+
 @app.route('/')
 def serve_react_app():
-    return send_from_directory(app.static_folder, 'index.html')
+    return asset_response(static_assets.get(''))
 
 @app.route('/<path:path>')
 def serve_static_files(path):
-    try:
-        return send_from_directory(app.static_folder, path)
-    except:
-        return send_from_directory(app.static_folder, 'index.html')
+    asset = static_assets.get(path)
+    if asset is not None:
+        return asset_response(asset)
+    if static_assets.has_file(path):
+        return send_from_directory(STATIC_DIR, path, max_age=3600)
+    # Missing files and API routes get a plain 404 rather than the page
+    if path.startswith(('api/', static_assets.prefix)) or '.' in path.rsplit('/', 1)[-1]:
+        return jsonify({'error': 'Not found'}), 404
+    return asset_response(static_assets.get(''))
 
 # THIS MUST BE THE VERY LAST SECTION - NOTHING AFTER THIS!
 if __name__ == '__main__':
-    init_db()
+    init_tenants()
     app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5000)), debug=False)
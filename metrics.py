@@ -0,0 +1,277 @@
+"""Request and SQL instrumentation behind the /metrics endpoint.
+
+Connections made by connection_factory() time every execute and fetch and
+count the rows they return. Queries run while a request is in flight are
+charged to that request's RequestStats, and end_request() folds those into
+per-route totals next to the latency histogram. Queries slower than the
+threshold are counted, and those run by a request are logged with their
+EXPLAIN QUERY PLAN.
+
+render() emits the Prometheus text exposition format. Counters are per
+worker process, so Prometheus should scrape every worker or sum them.
+"""
+import logging
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+
+slow_query_log = logging.getLogger('slow_query')
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current = threading.local()
+
+
+class Histogram:
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """Yield (upper bound, cumulative count) pairs, ending with +Inf."""
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            yield bound, total
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db_seconds', 'rows', 'route')
+
+    def __init__(self, route=None):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+        self.route = route
+
+
+def current_request():
+    """RequestStats for the request running on this thread, if any."""
+    return getattr(_current, 'stats', None)
+
+
+def _labels(**labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{key}="{escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    def __init__(self, slow_query_seconds=0.1):
+        self.slow_query_seconds = slow_query_seconds
+        self._lock = threading.Lock()
+        self._requests = {}          # (method, route, status) -> count
+        self._durations = {}         # (method, route) -> Histogram
+        self._response_bytes = {}    # (method, route) -> bytes
+        self._route_db = {}          # route -> [queries, seconds, rows]
+        self._query_durations = Histogram()
+        self._slow_queries = 0
+        self._collectors = []
+
+    # Requests ---------------------------------------------------------------
+
+    def begin_request(self, route):
+        _current.stats = RequestStats(route)
+        return _current.stats
+
+    def end_request(self, method, route, status, seconds, response_bytes):
+        stats = getattr(_current, 'stats', None)
+        _current.stats = None
+        with self._lock:
+            key = (method, route)
+            self._requests[(method, route, status)] = self._requests.get((method, route, status), 0) + 1
+            histogram = self._durations.get(key)
+            if histogram is None:
+                histogram = self._durations[key] = Histogram()
+            histogram.observe(seconds)
+            self._response_bytes[key] = self._response_bytes.get(key, 0) + (response_bytes or 0)
+            if stats is not None:
+                totals = self._route_db.setdefault(route, [0, 0.0, 0])
+                totals[0] += stats.queries
+                totals[1] += stats.db_seconds
+                totals[2] += stats.rows
+        return stats
+
+    # Queries ----------------------------------------------------------------
+
+    def record_query(self, conn, sql, parameters, seconds):
+        stats = getattr(_current, 'stats', None)
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += seconds
+        with self._lock:
+            self._query_durations.observe(seconds)
+            if seconds >= self.slow_query_seconds:
+                self._slow_queries += 1
+        if seconds >= self.slow_query_seconds and stats is not None:
+            self.log_slow_query(conn, sql, parameters, seconds, stats)
+
+    def record_fetch(self, rows, seconds):
+        stats = getattr(_current, 'stats', None)
+        if stats is not None:
+            stats.rows += rows
+            stats.db_seconds += seconds
+
+    def log_slow_query(self, conn, sql, parameters, seconds, stats):
+        statement = ' '.join(sql.split())
+        try:
+            # Bypass the instrumented execute so the EXPLAIN is not itself recorded
+            plan = sqlite3.Connection.execute(conn, f'EXPLAIN QUERY PLAN {sql}', parameters or ()).fetchall()
+            plan = '\n'.join(f'    {row[3]}' for row in plan) or '    (no plan)'
+        except (sqlite3.Error, ValueError):
+            plan = '    (plan unavailable)'
+        slow_query_log.warning('Slow query (%.1f ms) in %s: %s\n%s', seconds * 1000,
+                               stats.route, statement, plan)
+
+    def connection_factory(self):
+        """Return a sqlite3.Connection subclass that reports to this registry."""
+        return type('InstrumentedConnection', (InstrumentedConnection,), {'metrics': self})
+
+    # Exposition -------------------------------------------------------------
+
+    def add_collector(self, collect):
+        """Register collect() -> iterable of (name, type, help, value) samples.
+
+        value may also be a list of (labels dict, value) pairs, one per series.
+        """
+        self._collectors.append(collect)
+
+    def render(self):
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        with self._lock:
+            requests = dict(self._requests)
+            durations = {key: (list(h.cumulative()), h.sum, h.count) for key, h in self._durations.items()}
+            response_bytes = dict(self._response_bytes)
+            route_db = {route: list(totals) for route, totals in self._route_db.items()}
+            query_buckets = list(self._query_durations.cumulative())
+            query_sum, query_count = self._query_durations.sum, self._query_durations.count
+            slow_queries = self._slow_queries
+
+        family('http_requests_total', 'counter', 'Requests handled, by route and status.')
+        for (method, route, status), count in sorted(requests.items()):
+            lines.append(f'http_requests_total{_labels(method=method, route=route, status=status)} {count}')
+
+        family('http_request_duration_seconds', 'histogram', 'Time to build the response, by route.')
+        for (method, route), (buckets, total, count) in sorted(durations.items()):
+            for bound, cumulative in buckets:
+                labels = _labels(method=method, route=route, le=_number(bound))
+                lines.append(f'http_request_duration_seconds_bucket{labels} {cumulative}')
+            labels = _labels(method=method, route=route)
+            lines.append(f'http_request_duration_seconds_sum{labels} {_number(total)}')
+            lines.append(f'http_request_duration_seconds_count{labels} {count}')
+
+        family('http_response_bytes_total', 'counter', 'Response body bytes sent, by route.')
+        for (method, route), total in sorted(response_bytes.items()):
+            lines.append(f'http_response_bytes_total{_labels(method=method, route=route)} {total}')
+
+        family('db_queries_total', 'counter', 'SQL statements executed while serving each route.')
+        for route, (queries, _, _) in sorted(route_db.items()):
+            lines.append(f'db_queries_total{_labels(route=route)} {queries}')
+        family('db_query_seconds_total', 'counter', 'Time spent in SQLite while serving each route.')
+        for route, (_, seconds, _) in sorted(route_db.items()):
+            lines.append(f'db_query_seconds_total{_labels(route=route)} {_number(seconds)}')
+        family('db_rows_total', 'counter', 'Rows fetched while serving each route.')
+        for route, (_, _, rows) in sorted(route_db.items()):
+            lines.append(f'db_rows_total{_labels(route=route)} {rows}')
+
+        family('db_query_duration_seconds', 'histogram', 'Duration of individual SQL statements.')
+        for bound, cumulative in query_buckets:
+            lines.append(f'db_query_duration_seconds_bucket{_labels(le=_number(bound))} {cumulative}')
+        lines.append(f'db_query_duration_seconds_sum {_number(query_sum)}')
+        lines.append(f'db_query_duration_seconds_count {query_count}')
+
+        family('db_slow_queries_total', 'counter', 'Statements slower than the slow-query threshold.')
+        lines.append(f'db_slow_queries_total {slow_queries}')
+
+        for collect in self._collectors:
+            for name, kind, help_text, value in collect():
+                family(name, kind, help_text)
+                if isinstance(value, list):
+                    for labels, sample in value:
+                        lines.append(f'{name}{_labels(**labels)} {_number(sample)}')
+                else:
+                    lines.append(f'{name} {_number(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def _timed_fetch(method, count):
+    def wrapper(self, *args):
+        start = time.perf_counter()
+        result = method(self, *args)
+        self.connection.metrics.record_fetch(count(result), time.perf_counter() - start)
+        return result
+    return wrapper
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self.connection.metrics.record_query(self.connection, sql, parameters,
+                                                 time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self.connection.metrics.record_query(self.connection, sql, None,
+                                                 time.perf_counter() - start)
+
+    fetchone = _timed_fetch(sqlite3.Cursor.fetchone, lambda row: row is not None)
+    fetchmany = _timed_fetch(sqlite3.Cursor.fetchmany, len)
+    fetchall = _timed_fetch(sqlite3.Cursor.fetchall, len)
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self.connection.metrics.record_fetch(0, time.perf_counter() - start)
+            raise
+        self.connection.metrics.record_fetch(1, time.perf_counter() - start)
+        return row
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    metrics = None
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    # Connection.execute/executemany build their cursor in C and would skip
+    # the cursor overrides above, so route them through cursor() explicitly
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        start = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            self.metrics.record_query(self, 'COMMIT', None, time.perf_counter() - start)
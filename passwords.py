@@ -0,0 +1,127 @@
+"""Password hashing with a tunable work factor.
+
+Stored hashes carry their own scheme and parameters:
+
+    scrypt$n=16384,r=8,p=1$<salt>$<hash>
+    pbkdf2_sha256$600000$<salt>$<hash>
+
+Bare 64-character hex digests are the legacy unsalted SHA-256 hashes. They
+still verify, and needs_upgrade() flags them (and hashes made with weaker
+parameters than the current ones) so login can rehash them.
+
+Hashing runs on a small thread pool sized to the CPU count. A login burst
+therefore queues for CPU instead of starving every other request, and once
+the queue is full, PasswordHasher raises HasherBusy so callers can shed load.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+SCRYPT_N = int(os.environ.get('SCRYPT_N', 16384))
+SCRYPT_R = 8
+SCRYPT_P = 1
+PBKDF2_ITERATIONS = int(os.environ.get('PBKDF2_ITERATIONS', 600000))
+DEFAULT_SCHEME = os.environ.get('PASSWORD_SCHEME', 'scrypt')
+
+
+def _b64(data):
+    return base64.b64encode(data).decode().rstrip('=')
+
+
+def _unb64(text):
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r, dklen=32)
+
+
+def hash_password(password, scheme=None):
+    scheme = scheme or DEFAULT_SCHEME
+    salt = os.urandom(16)
+    if scheme == 'scrypt':
+        digest = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+        return f'scrypt$n={SCRYPT_N},r={SCRYPT_R},p={SCRYPT_P}${_b64(salt)}${_b64(digest)}'
+    if scheme == 'pbkdf2_sha256':
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, PBKDF2_ITERATIONS)
+        return f'pbkdf2_sha256${PBKDF2_ITERATIONS}${_b64(salt)}${_b64(digest)}'
+    raise ValueError(f'Unknown password scheme: {scheme}')
+
+
+def verify_password(password, stored):
+    if not stored:
+        return False
+    if '$' not in stored:
+        legacy = hashlib.sha256(password.encode()).hexdigest()
+        return hmac.compare_digest(legacy, stored)
+
+    try:
+        scheme, params, salt, expected = stored.split('$')
+        if scheme == 'scrypt':
+            values = dict(item.split('=') for item in params.split(','))
+            digest = _scrypt(password, _unb64(salt), int(values['n']), int(values['r']), int(values['p']))
+        elif scheme == 'pbkdf2_sha256':
+            digest = hashlib.pbkdf2_hmac('sha256', password.encode(), _unb64(salt), int(params))
+        else:
+            return False
+    except (ValueError, KeyError):
+        return False
+    return hmac.compare_digest(digest, _unb64(expected))
+
+
+def needs_upgrade(stored):
+    """True if stored was made by another scheme or with weaker parameters.
+
+    Stronger parameters are left alone, so lowering SCRYPT_N or
+    PBKDF2_ITERATIONS never downgrades existing hashes. A hash whose
+    parameters cannot be read is left alone too; it cannot verify anyway.
+    """
+    if not stored or '$' not in stored:
+        return True
+    scheme, params = stored.split('$')[:2]
+    if scheme != DEFAULT_SCHEME:
+        return True
+    try:
+        if scheme == 'scrypt':
+            values = dict(item.split('=') for item in params.split(','))
+            return (int(values['n']) < SCRYPT_N or int(values['r']) < SCRYPT_R
+                    or int(values['p']) < SCRYPT_P)
+        return int(params) < PBKDF2_ITERATIONS
+    except (ValueError, KeyError):
+        return False
+
+
+class HasherBusy(Exception):
+    """Raised when more hashes are queued than the pool is allowed to hold."""
+
+
+class PasswordHasher:
+    def __init__(self, workers=None, max_pending=64):
+        self.workers = workers or os.cpu_count() or 1
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        # Verified against for unknown usernames so they take as long as real ones
+        self._dummy_hash = None
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            return self._pool.submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(hash_password, password)
+
+    def verify(self, password, stored):
+        if stored is None:
+            if self._dummy_hash is None:
+                self._dummy_hash = hash_password('')
+            self._run(verify_password, password, self._dummy_hash)
+            return False
+        return self._run(verify_password, password, stored)
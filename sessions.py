@@ -0,0 +1,314 @@
+"""Server-side sessions.
+
+The session cookie holds only a random id. What it stands for (user id, role
+and team) is kept in a SessionStore, by default a table in its own SQLite file
+that every worker shares. Signing out deletes the row, and so does revoking
+one or all of a user's sessions from anywhere, which a signed cookie could
+never undo.
+
+Each worker keeps the sessions it has seen in memory and answers repeat
+requests without reading the store. Sign-outs, revocations and changes to a
+user's role or password move the store's version, a counter bumped by
+touch() and delete(). A worker that sees the version move drops what it has
+cached, along with any dependent caches such as the user records in main.py,
+so the change applies to the next request everywhere. Sign-ins and session
+saves leave the version alone and flush nothing. The SQLite store only
+re-reads the counter after PRAGMA data_version (read from shared memory, not
+from any table) says something committed, so a quiet store costs no reads.
+
+A session gets a new id whenever the user it belongs to changes, so an id
+handed out before signing in is worthless afterwards.
+"""
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from flask.sessions import SessionInterface, SessionMixin, session_json_serializer
+from werkzeug.datastructures import CallbackDict
+
+
+class TTLCache:
+    """In-process LRU whose entries expire ttl seconds after they were stored."""
+
+    def __init__(self, ttl, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SessionStore(ABC):
+    """Interface for where session data lives.
+
+    data is the session dict; team and user_id are copied out of it so that
+    every session of a user can be found and revoked.
+    """
+
+    @abstractmethod
+    def load(self, sid):
+        """Return (data, expires_at) for a live session, or None."""
+
+    @abstractmethod
+    def save(self, sid, data, expires_at):
+        """Store data for sid until expires_at (seconds since the epoch)."""
+
+    @abstractmethod
+    def delete(self, sid):
+        """Forget one session, moving the version if it existed."""
+
+    @abstractmethod
+    def delete_user(self, team, user_id):
+        """Revoke every session of one user; returns how many there were."""
+
+    @abstractmethod
+    def touch(self):
+        """Move the version, so every worker drops its cached sessions and users."""
+
+    @abstractmethod
+    def version(self):
+        """A value that changes whenever any worker calls touch() or deletes a session."""
+
+
+class SQLiteSessionStore(SessionStore):
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            team TEXT,
+            user_id INTEGER,
+            data TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions (user_id, team);
+        CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at);
+        CREATE TABLE IF NOT EXISTS session_changes (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            count INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO session_changes VALUES (1, 0);
+    '''
+
+    def __init__(self, path, timeout=5.0):
+        self.path = path
+        self.timeout = timeout
+        self.reads = 0
+        self._local = threading.local()
+        self._version_conn = None
+        self._version_pid = None
+        self._data_version = None
+        self._changes = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+            conn.executescript(self.SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def load(self, sid):
+        self.reads += 1
+        row = self._connect().execute(
+            'SELECT data, expires_at FROM sessions WHERE id = ? AND expires_at > ?', (sid, time.time())
+        ).fetchone()
+        return (session_json_serializer.loads(row[0]), row[1]) if row else None
+
+    def save(self, sid, data, expires_at):
+        conn = self._connect()
+        with conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO sessions (id, team, user_id, data, expires_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (sid, data.get('team'), data.get('user_id'), session_json_serializer.dumps(data), expires_at))
+            # Sweep expired sessions while the write lock is held anyway
+            conn.execute('DELETE FROM sessions WHERE expires_at <= ?', (time.time(),))
+
+    def delete(self, sid):
+        conn = self._connect()
+        with conn:
+            # Other workers may still have the session cached
+            if conn.execute('DELETE FROM sessions WHERE id = ?', (sid,)).rowcount:
+                conn.execute('UPDATE session_changes SET count = count + 1')
+
+    def delete_user(self, team, user_id):
+        conn = self._connect()
+        with conn:
+            return conn.execute('DELETE FROM sessions WHERE user_id = ? AND team IS ?', (user_id, team)).rowcount
+
+    def touch(self):
+        conn = self._connect()
+        with conn:
+            conn.execute('UPDATE session_changes SET count = count + 1')
+
+    def version(self):
+        # data_version only moves for commits made by other connections, so
+        # it is read from a connection that never writes. It moves for every
+        # sign-in too; only touch() moves the count that is returned.
+        with self._lock:
+            if self._version_conn is None or self._version_pid != os.getpid():
+                self._connect()
+                self._version_conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False)
+                self._version_pid = os.getpid()
+                self._data_version = None
+            data_version = self._version_conn.execute('PRAGMA data_version').fetchone()[0]
+            if data_version != self._data_version:
+                self._data_version = data_version
+                self._changes = self._version_conn.execute('SELECT count FROM session_changes').fetchone()[0]
+            return self._changes
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session data as loaded from the store, tracking reads and writes like Flask's own."""
+
+    modified = False
+    accessed = False
+
+    def __init__(self, initial=None, sid=None, expires_at=None):
+        def on_update(self):
+            self.modified = True
+            self.accessed = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.expires_at = expires_at
+        self.owner = self.get('user_id')
+        self.accessed = False
+
+    def __getitem__(self, key):
+        self.accessed = True
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.accessed = True
+        return super().get(key, default)
+
+    def setdefault(self, key, default=None):
+        self.accessed = True
+        return super().setdefault(key, default)
+
+
+class ServerSessionInterface(SessionInterface):
+    def __init__(self, store, cache_seconds=300, max_cached=10000, dependents=()):
+        self.store = store
+        self.cache = TTLCache(cache_seconds, max_cached)
+        self.dependents = list(dependents)
+        self.flushes = 0
+        self._version = None
+
+    def open_session(self, app, request):
+        self._sync()
+        sid = request.cookies.get(self.get_cookie_name(app))
+        record = None
+        if sid:
+            record = self.cache.get(sid)
+            if record is None:
+                version = self._version
+                record = self.store.load(sid)
+                # Skip caching a read that a concurrent flush may have overtaken
+                if record is not None and self._version == version:
+                    self.cache.set(sid, record)
+        now = time.time()
+        if record is None or record[1] <= now:
+            return ServerSession()
+        data, expires_at = record
+        session = ServerSession(dict(data), sid, expires_at)
+        # Keep active sessions alive, writing at most once per half lifetime
+        if expires_at - now < app.permanent_session_lifetime.total_seconds() / 2:
+            session.modified = True
+        return session
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if not session:
+            if session.modified:
+                if session.sid is not None:
+                    self.store.delete(session.sid)
+                    self.cache.pop(session.sid)
+                response.delete_cookie(name, domain=domain, path=path, secure=secure, samesite=samesite,
+                                       httponly=httponly)
+                response.vary.add('Cookie')
+            return
+
+        if not session.modified:
+            return
+
+        if session.sid is None or session.get('user_id') != session.owner:
+            if session.sid is not None:
+                self.store.delete(session.sid)
+                self.cache.pop(session.sid)
+            session.sid = secrets.token_urlsafe(32)
+            session.owner = session.get('user_id')
+        data = dict(session)
+        expires_at = time.time() + app.permanent_session_lifetime.total_seconds()
+        self.store.save(session.sid, data, expires_at)
+        self.cache.set(session.sid, (data, expires_at))
+        response.set_cookie(name, session.sid, expires=self.get_expiration_time(app, session),
+                            httponly=httponly, domain=domain, path=path, secure=secure, samesite=samesite)
+        response.vary.add('Cookie')
+
+    def revoke_user(self, team, user_id):
+        """Sign one user out everywhere; returns the number of sessions revoked."""
+        revoked = self.store.delete_user(team, user_id)
+        self.invalidate()
+        return revoked
+
+    def invalidate(self):
+        """Make every worker reload sessions and dependent caches on its next request."""
+        self.store.touch()
+        self._flush()
+
+    def _sync(self):
+        version = self.store.version()
+        if version != self._version:
+            self._version = version
+            self._flush()
+
+    def _flush(self):
+        self.flushes += 1
+        self.cache.clear()
+        for cache in self.dependents:
+            cache.clear()
@@ -0,0 +1,191 @@
+"""Team tenancy: each team's data lives in its own SQLite database file.
+
+A district can run its varsity, JV and middle school squads from one
+deployment. Every team has a key (kept in the session), a display name, the
+code athletes register with and a database file. A request only opens its own
+team's file, so one busy team's writes hold that file's writer lock and never
+block another team, and adding a team adds a writer instead of sharing one.
+
+Connections are still one per worker thread, but a thread may serve any team,
+so each thread keeps its most recently used tenant connections open in a
+ConnectionCache and closes the least recently used one beyond max_open.
+
+attached() opens several teams' files read-only on one connection with SQLite
+ATTACH, for reports that span the district. SQLite allows only MAX_ATTACHED
+attached databases at a time, so callers take the teams in groups.
+
+The teams come from a JSON file named by TEAMS_CONFIG:
+
+    {"varsity": {"name": "Varsity", "code": "AVIATORS2025", "database": "database/app.db"},
+     "jv": {"name": "JV", "code": "AVIATORSJV2025", "database": "database/jv.db"}}
+
+The first team is the default, used for sessions from before a team was
+recorded. Without the file the deployment is a single team.
+
+Login only has a username to go on, so a UserDirectory in one SQLite file
+shared by every team maps each username to the teams that have it. Login
+looks the team up there and opens that one team's database, instead of trying
+every team's in turn. Registration and rejection keep it current, and
+init-db rebuilds it from each team's users.
+"""
+import json
+import os
+import pathlib
+import re
+import sqlite3
+import threading
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+
+Tenant = namedtuple('Tenant', 'key name code database')
+
+# SQLite's default SQLITE_MAX_ATTACHED
+MAX_ATTACHED = 10
+
+# Keys end up in cache keys, ETags and calendar tokens, so keep them plain
+TENANT_KEY = re.compile(r'^[a-z0-9-]+$')
+
+
+class TenantRegistry:
+    def __init__(self, tenants):
+        tenants = list(tenants)
+        if not tenants:
+            raise ValueError('at least one team is required')
+        self._tenants = OrderedDict()
+        self._codes = {}
+        for tenant in tenants:
+            if not TENANT_KEY.match(tenant.key):
+                raise ValueError(f'team key {tenant.key!r} may only use a-z, 0-9 and -')
+            if tenant.key in self._tenants or tenant.code in self._codes:
+                raise ValueError(f'team {tenant.key!r} repeats a key or registration code')
+            self._tenants[tenant.key] = tenant
+            self._codes[tenant.code] = tenant
+        databases = [tenant.database for tenant in tenants]
+        if len(set(databases)) != len(databases):
+            raise ValueError('every team needs its own database file')
+        self.default = tenants[0]
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as source:
+            config = json.load(source)
+        return cls(Tenant(key, team.get('name', key), team['code'], team['database'])
+                   for key, team in config.items())
+
+    def get(self, key):
+        return self._tenants.get(key)
+
+    def by_code(self, code):
+        """The team a registration code belongs to, or None."""
+        return self._codes.get(code)
+
+    def __iter__(self):
+        return iter(self._tenants.values())
+
+    def __len__(self):
+        return len(self._tenants)
+
+
+class UserDirectory:
+    """Which teams each username is registered on."""
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS usernames (
+            username TEXT NOT NULL,
+            team TEXT NOT NULL,
+            PRIMARY KEY (username, team)
+        ) WITHOUT ROWID;
+    '''
+
+    def __init__(self, path, timeout=5.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+            conn.executescript(self.SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def teams(self, username):
+        """Keys of the teams that have this username, in key order."""
+        rows = self._connect().execute(
+            'SELECT team FROM usernames WHERE username = ? ORDER BY team', (username,)
+        )
+        return [team for team, in rows]
+
+    def add(self, username, team):
+        conn = self._connect()
+        with conn:
+            conn.execute('INSERT OR IGNORE INTO usernames (username, team) VALUES (?, ?)', (username, team))
+
+    def remove(self, username, team):
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM usernames WHERE username = ? AND team = ?', (username, team))
+
+    def replace(self, team, usernames):
+        """Make the team's entries exactly usernames."""
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM usernames WHERE team = ?', (team,))
+            conn.executemany('INSERT OR IGNORE INTO usernames (username, team) VALUES (?, ?)',
+                             ((username, team) for username in usernames))
+
+
+class ConnectionCache:
+    """One thread's open connections, keyed by database path, least recently used first."""
+
+    def __init__(self, connect, max_open=4):
+        self.connect = connect
+        self.max_open = max_open
+        self._connections = OrderedDict()
+
+    def get(self, path):
+        conn = self._connections.get(path)
+        if conn is not None:
+            self._connections.move_to_end(path)
+            return conn
+        conn = self._connections[path] = self.connect(path)
+        while len(self._connections) > self.max_open:
+            _, oldest = self._connections.popitem(last=False)
+            if oldest.in_transaction:
+                oldest.rollback()
+            oldest.close()
+        return conn
+
+    def __iter__(self):
+        return iter(list(self._connections.values()))
+
+    def close(self):
+        """Close every connection, rolling back anything left uncommitted."""
+        while self._connections:
+            _, conn = self._connections.popitem(last=False)
+            if conn.in_transaction:
+                conn.rollback()
+            conn.close()
+
+
+@contextmanager
+def attached(conn, databases):
+    """ATTACH each database read-only as db0, db1, ...; yields the schema names."""
+    if len(databases) > MAX_ATTACHED:
+        raise ValueError(f'at most {MAX_ATTACHED} databases can be attached at once')
+    schemas = []
+    try:
+        for database in databases:
+            schema = f'db{len(schemas)}'
+            uri = pathlib.Path(database).resolve().as_uri() + '?mode=ro'
+            conn.execute('ATTACH DATABASE ? AS ?', (uri, schema))
+            schemas.append(schema)
+        yield schemas
+    finally:
+        for schema in schemas:
+            conn.execute(f'DETACH DATABASE {schema}')
@@ -0,0 +1,52 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+# main reads its configuration from the environment when imported, so point
+# every database at a scratch directory before any test imports it
+_workdir = tempfile.mkdtemp(prefix='aviators-tests-')
+atexit.register(shutil.rmtree, _workdir, ignore_errors=True)
+os.environ.setdefault('DATABASE', os.path.join(_workdir, 'app.db'))
+os.environ.setdefault('SESSION_DATABASE', os.path.join(_workdir, 'sessions.db'))
+os.environ.setdefault('USER_DIRECTORY_DATABASE', os.path.join(_workdir, 'directory.db'))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+import main  # noqa: E402
+from tenancy import Tenant  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    """A freshly initialised team database that every request in the test uses."""
+    main.read_cache.clear()
+    main.user_cache.clear()
+    with main.use_tenant(Tenant('test', 'Test', None, str(tmp_path / 'team.db'))):
+        main.init_db()
+        yield main.get_db()
+        main.close_db()
+
+
+def add_user(db, username, role='athlete', status='active'):
+    cursor = db.execute('''
+        INSERT INTO users (username, password, role, first_name, last_name, status)
+        VALUES (?, '', ?, ?, 'Test', ?)
+    ''', (username, role, username.title(), status))
+    db.commit()
+    return cursor.lastrowid
+
+
+def signed_in(user_id):
+    client = main.app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+    return client
+
+
+@pytest.fixture
+def coach(db):
+    return signed_in(add_user(db, 'coach', role='coach'))
@@ -0,0 +1,73 @@
+import random
+
+import pytest
+
+from conftest import add_user
+
+# The join /api/academics/alerts ran on every request before academic_alerts
+# was kept by triggers
+COMPUTED_ALERTS = '''
+    SELECT u.first_name, u.last_name, ar.subject, ar.grade_required, sg.current_grade
+    FROM student_grades sg
+    JOIN users u ON sg.student_id = u.id
+    JOIN academic_requirements ar ON sg.requirement_id = ar.id
+    WHERE sg.current_grade < ar.grade_required
+    AND u.role = 'student'
+'''
+
+
+def alerts(db):
+    stored = db.execute('''
+        SELECT first_name, last_name, subject, grade_required, current_grade FROM academic_alerts
+    ''').fetchall()
+    return sorted(map(tuple, stored)), sorted(map(tuple, db.execute(COMPUTED_ALERTS)))
+
+
+@pytest.fixture
+def school(db):
+    students = [add_user(db, f'student{n}', role='student') for n in range(4)]
+    requirements = [db.execute('INSERT INTO academic_requirements (subject, grade_required) VALUES (?, 70)',
+                               (subject,)).lastrowid for subject in ('Math', 'Science', 'English')]
+    db.commit()
+    return students, requirements
+
+
+def test_grade_writes_keep_alerts_in_line_with_the_join(db, school):
+    students, requirements = school
+    rng = random.Random(8)
+    for _ in range(300):
+        student, requirement = rng.choice(students), rng.choice(requirements)
+        operation = rng.choice(['upsert', 'upsert', 'delete', 'requirement', 'rename'])
+        if operation == 'upsert':
+            db.execute('''
+                INSERT INTO student_grades (student_id, requirement_id, current_grade) VALUES (?, ?, ?)
+                ON CONFLICT (student_id, requirement_id) DO UPDATE SET current_grade = excluded.current_grade
+            ''', (student, requirement, rng.choice([None, 55, 69.9, 70, 85])))
+        elif operation == 'delete':
+            db.execute('DELETE FROM student_grades WHERE student_id = ? AND requirement_id = ?',
+                       (student, requirement))
+        elif operation == 'requirement':
+            db.execute('UPDATE academic_requirements SET grade_required = ? WHERE id = ?',
+                       (rng.choice([60, 70, 80]), requirement))
+        else:
+            db.execute('UPDATE users SET last_name = ? WHERE id = ?', (rng.choice(['A', 'B']), student))
+        db.commit()
+        stored, computed = alerts(db)
+        assert stored == computed, operation
+
+
+def test_role_change_and_deletions_drop_alerts(db, school, coach):
+    students, requirements = school
+    db.executemany('INSERT INTO student_grades (student_id, requirement_id, current_grade) VALUES (?, ?, 50)',
+                   [(student, requirement) for student in students for requirement in requirements])
+    db.commit()
+    assert len(alerts(db)[0]) == 12
+
+    db.execute("UPDATE users SET role = 'parent' WHERE id = ?", (students[0],))
+    db.execute('DELETE FROM users WHERE id = ?', (students[1],))
+    db.execute('DELETE FROM academic_requirements WHERE id = ?', (requirements[0],))
+    db.commit()
+    stored, computed = alerts(db)
+    assert len(stored) == 4
+    assert stored == computed
+    assert len(coach.get('/api/academics/alerts').get_json()) == 4
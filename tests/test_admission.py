@@ -0,0 +1,95 @@
+import threading
+import time
+
+import pytest
+
+import main
+from admission import AdmissionController
+
+
+@pytest.fixture
+def admission(monkeypatch):
+    """Admission control on, with one slot per pool and a short wait."""
+    controller = AdmissionController(
+        read=(1, 0), write=(1, 1), routes={'POST /api/auth/register': (1, 0)}, max_wait=0.05,
+        exempt={'/api/stream'}
+    )
+    monkeypatch.setattr(main, 'ADMISSION_CONTROL', True)
+    monkeypatch.setattr(main, 'admission', controller)
+    return controller
+
+
+def test_saturated_pool_sheds_with_retry_after(db, coach, admission):
+    assert admission.write.acquire()
+    try:
+        response = coach.post('/api/events', json={})
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == main.ADMISSION_RETRY_AFTER
+        # It queued for the one waiting place, gave up after max_wait and left it free
+        assert admission.write.shed == 1
+        assert admission.write.waiting == 0
+
+        # Reads and routes with a pool of their own still get in
+        with coach.get('/api/events') as response:
+            assert response.status_code == 200
+        with main.app.test_client().post('/api/auth/register', json={'team_code': 'wrong'}) as register:
+            assert register.status_code == 400
+    finally:
+        admission.write.release()
+
+    with coach.post('/api/events', json={}) as response:
+        assert response.status_code != 503
+    assert [pool.active for pool in admission.pools()] == [0, 0, 0]
+
+
+def test_exempt_routes_skip_admission(admission):
+    assert admission.pool_for('GET', '/api/stream') is None
+    assert admission.pool_for('GET', '/') is None
+    assert admission.pool_for('POST', '/api/auth/register') is admission.routes['POST /api/auth/register']
+
+
+def test_streamed_response_holds_its_slot_until_closed(db, coach, admission):
+    response = coach.get('/api/users/students')
+    # The view has returned and the request is torn down, but the body is still to be sent
+    assert admission.read.active == 1
+    response.get_data()
+    response.close()
+    assert admission.read.active == 0
+
+
+def test_releaser_releases_once(admission):
+    assert admission.read.acquire()
+    release = admission.read.releaser()
+    release()
+    release()
+    assert admission.read.active == 0
+
+
+def test_reads_stay_fast_while_writes_are_saturated(db, coach, monkeypatch):
+    controller = AdmissionController(read=(1, 0), write=(1, 1), max_wait=2.0)
+    monkeypatch.setattr(main, 'ADMISSION_CONTROL', True)
+    monkeypatch.setattr(main, 'admission', controller)
+    # One write runs and another waits for its slot, as under a burst of check-ins
+    assert controller.write.acquire()
+    waiter = threading.Thread(target=lambda: controller.write.acquire() and controller.write.release())
+    waiter.start()
+    try:
+        while controller.write.waiting == 0:
+            time.sleep(0.001)
+
+        started = time.perf_counter()
+        with coach.post('/api/events', json={}) as response:
+            assert response.status_code == 503
+        # The queue is full, so the write is refused at once instead of waiting
+        assert time.perf_counter() - started < 0.5
+
+        for _ in range(20):
+            started = time.perf_counter()
+            with coach.get('/api/events') as response:
+                assert response.status_code == 200
+            assert time.perf_counter() - started < 0.5
+        assert controller.read.shed == 0
+    finally:
+        controller.write.release()
+        waiter.join()
+    assert [pool.active for pool in controller.pools()] == [0, 0]
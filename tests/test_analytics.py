@@ -0,0 +1,88 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+import main
+from conftest import add_user, signed_in
+
+# Straight from the raw rows: one attendance per athlete and event, late when
+# the first sign-in is past the grace period
+RAW_TOTALS = '''
+    SELECT user_id, COUNT(*) AS attended,
+           SUM(is_mandatory) AS mandatory_attended,
+           SUM((julianday(first_in) - julianday(date || ' ' || start_time)) * 1440 > :grace) AS late
+    FROM (
+        SELECT a.user_id, e.id, e.date, e.start_time, e.is_mandatory, MIN(a.sign_in_time) AS first_in
+        FROM attendance a JOIN events e ON e.id = a.event_id
+        WHERE e.date BETWEEN :date_from AND :date_to
+        GROUP BY a.user_id, e.id
+    )
+    GROUP BY user_id
+'''
+
+
+@pytest.fixture
+def season(db):
+    """A practice a day for 150 days, attended at random by five athletes."""
+    rng = random.Random(14)
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    athletes = [add_user(db, f'athlete{n}', role='student') for n in range(5)]
+    for offset in range(150, 0, -1):
+        day = today - timedelta(days=offset)
+        event_id = db.execute('''
+            INSERT INTO events (title, event_type, date, start_time, end_time, is_mandatory)
+            VALUES ('Practice', ?, ?, '15:30', '17:30', ?)
+        ''', (rng.choice(['practice', 'game']), day.strftime('%Y-%m-%d'), offset % 4 == 0)).lastrowid
+        for athlete in athletes:
+            if rng.random() < 0.7:
+                arrived = day + timedelta(hours=15, minutes=rng.choice([20, 30, 34, 40, 55]))
+                db.execute('''
+                    INSERT INTO attendance (user_id, event_id, sign_in_time, sign_out_time, status)
+                    VALUES (?, ?, ?, ?, 'completed')
+                ''', (athlete, event_id, arrived.strftime('%Y-%m-%d %H:%M:%S'),
+                      (arrived + timedelta(hours=2)).strftime('%Y-%m-%d %H:%M:%S')))
+    db.commit()
+    return {
+        'date_from': (today - timedelta(days=150)).strftime('%Y-%m-%d'),
+        'date_to': (today - timedelta(days=1)).strftime('%Y-%m-%d'),
+        'athletes': athletes
+    }
+
+
+def analytics(client, season):
+    response = client.get(f"/api/analytics/attendance?from={season['date_from']}&to={season['date_to']}")
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_totals_match_the_raw_rows(db, coach, season):
+    report = analytics(coach, season)
+    raw = {row['user_id']: row for row in db.execute(RAW_TOTALS, {
+        'grace': main.LATE_GRACE_MINUTES, 'date_from': season['date_from'], 'date_to': season['date_to']
+    })}
+
+    assert report['team']['events'] == 150
+    assert report['team']['attended'] == sum(row['attended'] for row in raw.values())
+    for athlete in report['athletes']:
+        row = raw[athlete['student_id']]
+        assert athlete['attended'] == row['attended']
+        assert athlete['late'] == row['late']
+        assert athlete['mandatory_missed'] == 150 // 4 - row['mandatory_attended']
+
+
+def test_compaction_does_not_change_the_numbers(db, coach, season):
+    before = analytics(coach, season)
+    result = main.compact_attendance(db)
+    assert result['compacted'] > 0
+    assert db.execute('SELECT COUNT(*) FROM attendance_daily').fetchone()[0] > 0
+
+    # Computed afresh, not served from before compaction
+    main.read_cache.clear()
+    assert analytics(coach, season) == before
+
+
+def test_students_only_see_themselves(db, season):
+    athlete = season['athletes'][2]
+    report = analytics(signed_in(athlete), season)
+    assert [row['student_id'] for row in report['athletes']] == [athlete]
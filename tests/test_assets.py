@@ -0,0 +1,74 @@
+import gzip
+import re
+
+import pytest
+
+import main
+from assets import IMMUTABLE, REVALIDATE, AssetBundle
+
+PAGE = '<html><head><style>body { color: red; }</style></head><body>{}<script>start();</script></body></html>'
+
+
+@pytest.fixture
+def bundle(tmp_path):
+    (tmp_path / 'index.html').write_text(PAGE.replace('{}', '<p>Go Aviators!</p>' * 200))
+    (tmp_path / 'logo.png').write_bytes(b'\x89PNG not really')
+    return AssetBundle(str(tmp_path))
+
+
+def test_inline_blocks_become_fingerprinted_files(bundle):
+    page = bundle.get('index.html')
+    html = page.encodings['identity'].decode()
+    [css] = re.findall(r'href="/(assets/app\.[0-9a-f]{12}\.css)"', html)
+    [js] = re.findall(r'src="/(assets/app\.[0-9a-f]{12}\.js)"', html)
+    assert '<style>' not in html and 'start();' not in html
+
+    assert bundle.get(css).encodings['identity'] == b'body { color: red; }\n'
+    assert bundle.get(js).encodings['identity'] == b'start();\n'
+    assert bundle.get(js).cache_control == IMMUTABLE
+    assert page.cache_control == REVALIDATE
+    assert bundle.get('') is page
+    assert bundle.has_file('logo.png') and bundle.get('logo.png') is None
+
+
+def test_only_encodings_that_save_bytes_are_kept(bundle):
+    page = bundle.get('index.html')
+    assert gzip.decompress(page.encodings['gzip']) == page.encodings['identity']
+    js = next(asset for path, asset in bundle._assets.items() if path.endswith('.js'))
+    assert set(js.encodings) == {'identity'}
+
+
+def test_build_writes_precompressed_siblings(bundle, tmp_path):
+    out = tmp_path / 'out'
+    written = dict(bundle.build(str(out)))
+    assert str(out / 'index.html.gz') in written
+    assert gzip.decompress((out / 'index.html.gz').read_bytes()) == (out / 'index.html').read_bytes()
+    assert (out / 'logo.png').read_bytes() == b'\x89PNG not really'
+
+
+def test_app_page_is_served_precompressed_and_revalidated():
+    client = main.app.test_client()
+    page = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    assert page.headers['Content-Encoding'] == 'gzip'
+    assert page.headers['Cache-Control'] == REVALIDATE
+    assert 'Accept-Encoding' in page.headers['Vary']
+    html = gzip.decompress(page.data).decode()
+
+    plain = client.get('/')
+    assert 'Content-Encoding' not in plain.headers
+    assert plain.data.decode() == html
+    assert plain.headers['ETag'] != page.headers['ETag']
+    assert client.get('/', headers={'If-None-Match': plain.headers['ETag']}).status_code == 304
+
+    [script] = re.findall(r'src="/(assets/app\.[0-9a-f]{12}\.js)"', html)
+    asset = client.get(f'/{script}')
+    assert asset.status_code == 200
+    assert asset.headers['Cache-Control'] == IMMUTABLE
+    assert asset.mimetype == 'text/javascript'
+
+
+def test_missing_assets_are_404_and_app_routes_get_the_page():
+    client = main.app.test_client()
+    assert client.get('/assets/app.000000000000.js').status_code == 404
+    assert client.get('/api/nope').status_code == 404
+    assert client.get('/dashboard').mimetype == 'text/html'
@@ -0,0 +1,47 @@
+import pytest
+
+from conftest import add_user, signed_in
+
+
+@pytest.fixture
+def event(db):
+    event_id = db.execute('''
+        INSERT INTO events (title, event_type, date, start_time, end_time)
+        VALUES ('Practice', 'practice', date('now'), '15:30', '17:30')
+    ''').lastrowid
+    db.commit()
+    return event_id
+
+
+def idempotency_keys(db):
+    return db.execute('SELECT COUNT(*) FROM attendance_requests').fetchone()[0]
+
+
+@pytest.mark.parametrize('route', ['sign-in', 'sign-out'])
+@pytest.mark.parametrize('body, status', [
+    ({}, 400),
+    ({'event_id': 999}, 404),
+    ({'event_id': 'series:999:2025-01-01'}, 404),
+    ({'event_id': 'nonsense'}, 404),
+])
+def test_unknown_event_is_refused_without_claiming_the_key(db, event, route, body, status):
+    client = signed_in(add_user(db, 'athlete', role='student'))
+
+    response = client.post(f'/api/attendance/{route}', json=body, headers={'Idempotency-Key': 'k1'})
+    assert response.status_code == status
+    assert idempotency_keys(db) == 0
+
+    # The key is still free for the request the client meant to send
+    response = client.post(f'/api/attendance/{route}', json={'event_id': event},
+                           headers={'Idempotency-Key': 'k1'})
+    assert response.status_code == 200
+    assert idempotency_keys(db) == 1
+
+
+def test_sign_out_closes_the_open_row(db, event):
+    client = signed_in(add_user(db, 'athlete', role='student'))
+    assert client.post('/api/attendance/sign-in', json={'event_id': event}).status_code == 200
+
+    assert client.post('/api/attendance/sign-out', json={'event_id': event}).status_code == 200
+    row = db.execute('SELECT status, sign_out_time FROM attendance').fetchone()
+    assert row['status'] == 'completed' and row['sign_out_time'] is not None
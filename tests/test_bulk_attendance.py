@@ -0,0 +1,45 @@
+import pytest
+
+import main
+from conftest import add_user
+
+
+@pytest.fixture
+def series(db):
+    # Every day of 2025
+    db.execute('''
+        INSERT INTO event_series (title, event_type, start_time, weekdays, start_date, until)
+        VALUES ('Practice', 'practice', '15:30', 127, '2025-01-01', '2025-12-31')
+    ''')
+    db.commit()
+    return 'series:1:2025-03-03'
+
+
+def event_rows(db):
+    return db.execute('SELECT COUNT(*) FROM events').fetchone()[0]
+
+
+def test_bulk_sign_in_signs_in_a_series_occurrence(db, coach, series):
+    athlete = add_user(db, 'athlete', role='student')
+    response = coach.post('/api/attendance/bulk-sign-in',
+                          json={'entries': [{'user_id': athlete, 'event_id': series}]})
+    assert response.get_json()['signed_in'] == 1
+    assert event_rows(db) == 1
+
+
+@pytest.mark.parametrize('entries', [
+    5,
+    [{'user_id': 'x', 'event_id': 'series:1:2025-03-03'}],
+    [{'event_id': 'series:1:2025-03-03'}],
+    [{'user_id': 1, 'event_id': 'series:1:2025-03-03'}] * (main.BULK_ATTENDANCE_MAX_ROWS + 1),
+])
+def test_rejected_bulk_sign_in_has_no_side_effects(db, coach, series, entries):
+    response = coach.post('/api/attendance/bulk-sign-in', json={'entries': entries})
+    assert response.status_code == 400
+    assert event_rows(db) == 0
+
+
+@pytest.mark.parametrize('user_ids', [5, 'all', [1, 'x'], [True], {'id': 1}])
+def test_bulk_sign_out_rejects_malformed_user_ids(db, coach, user_ids):
+    response = coach.post('/api/attendance/bulk-sign-out', json={'event_id': 1, 'user_ids': user_ids})
+    assert response.status_code == 400
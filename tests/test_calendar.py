@@ -0,0 +1,137 @@
+import re
+
+import pytest
+
+import main
+from tenancy import Tenant, TenantRegistry, UserDirectory
+from conftest import add_user, signed_in
+
+WINDOW = 'from=2025-01-01&to=2025-01-31'
+
+
+@pytest.fixture
+def feed_url(db, coach, monkeypatch):
+    # Feeds are fetched without a session; the token's prefix names the team
+    monkeypatch.setattr(main, 'tenants', TenantRegistry([main.current_tenant()]))
+    url = coach.get('/api/calendar/subscription').get_json()['url']
+    return '/' + url.split('/', 3)[3]
+
+
+def unfold(body):
+    return body.decode().replace('\r\n ', '')
+
+
+def vevents(body):
+    return [dict(line.split(':', 1) for line in block.strip().split('\r\n'))
+            for block in re.findall(r'BEGIN:VEVENT\r\n(.*?)END:VEVENT', unfold(body), re.S)]
+
+
+def add_event(db, title, day, **fields):
+    columns = {'title': title, 'event_type': 'practice', 'date': day, 'start_time': '15:30', **fields}
+    db.execute(f"INSERT INTO events ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+               list(columns.values()))
+    db.commit()
+
+
+def test_feed_needs_a_valid_token(db, feed_url):
+    client = main.app.test_client()
+    assert client.get(f'{feed_url}?{WINDOW}').status_code == 200
+    assert client.get(feed_url.replace('.ics', 'x.ics')).status_code == 404
+    assert client.get('/api/calendar/nope.ics').status_code == 404
+
+
+def test_revoked_token_stops_working(db, coach, feed_url):
+    coach.post('/api/calendar/subscription')
+    assert main.app.test_client().get(feed_url).status_code == 404
+
+
+def test_events_have_stable_uids_and_floating_times(db, feed_url):
+    add_event(db, 'Practice', '2025-01-10', end_time='17:00', is_mandatory=1, location='Gym, north')
+    response = main.app.test_client().get(f'{feed_url}?{WINDOW}')
+    assert response.mimetype == 'text/calendar'
+    assert response.data.startswith(b'BEGIN:VCALENDAR\r\nVERSION:2.0\r\n')
+    assert response.data.endswith(b'END:VCALENDAR\r\n')
+
+    [event] = vevents(response.data)
+    assert re.fullmatch(r'event-\d+\.test@aviators', event['UID'])
+    assert event['DTSTART'] == '20250110T153000'
+    assert event['DTEND'] == '20250110T170000'
+    assert re.fullmatch(r'\d{8}T\d{6}Z', event['DTSTAMP'])
+    assert event['LOCATION'] == 'Gym\\, north'
+    assert event['CATEGORIES'] == 'practice,MANDATORY'
+    assert event['X-AVIATORS-MANDATORY'] == 'TRUE'
+
+
+def test_long_lines_are_folded_at_75_octets(db, feed_url):
+    add_event(db, 'Pyramid práctica ' * 12, '2025-01-10')
+    body = main.app.test_client().get(f'{feed_url}?{WINDOW}').data
+    for line in body.split(b'\r\n'):
+        assert len(line) <= 75
+        line.decode()
+    assert vevents(body)[0]['SUMMARY'] == 'Pyramid práctica ' * 12
+
+
+def test_series_occurrences_are_expanded(db, coach, feed_url):
+    response = coach.post('/api/events/series', json={
+        'title': 'Conditioning', 'event_type': 'practice', 'start_time': '06:45',
+        'weekdays': ['MO', 'TH'], 'start_date': '2025-01-06', 'until': '2025-01-16'
+    })
+    series_id = response.get_json()['id']
+
+    events = vevents(main.app.test_client().get(f'{feed_url}?{WINDOW}').data)
+    assert [(event['UID'], event['DTSTART']) for event in events] == [
+        (f'series-{series_id}-20250106.test@aviators', '20250106T064500'),
+        (f'series-{series_id}-20250109.test@aviators', '20250109T064500'),
+        (f'series-{series_id}-20250113.test@aviators', '20250113T064500'),
+        (f'series-{series_id}-20250116.test@aviators', '20250116T064500'),
+    ]
+
+
+def test_mandatory_filter_and_304(db, feed_url):
+    add_event(db, 'Practice', '2025-01-10')
+    add_event(db, 'Competition', '2025-01-11', is_mandatory=1)
+    client = main.app.test_client()
+    events = vevents(client.get(f'{feed_url}?{WINDOW}&mandatory=1').data)
+    assert [event['SUMMARY'] for event in events] == ['Competition']
+
+    etag = client.get(f'{feed_url}?{WINDOW}').headers['ETag']
+    assert client.get(f'{feed_url}?{WINDOW}', headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_pending_users_get_no_feed(db, feed_url):
+    user = add_user(db, 'pending', role='student')
+    url = signed_in(user).get('/api/calendar/subscription').get_json()['url']
+    db.execute("UPDATE users SET status = 'pending' WHERE id = ?", (user,))
+    db.commit()
+    assert main.app.test_client().get('/' + url.split('/', 3)[3]).status_code == 404
+
+
+def test_each_team_has_its_own_calendar(tmp_path, monkeypatch):
+    registry = TenantRegistry([
+        Tenant('varsity', 'Varsity', 'V2025', str(tmp_path / 'varsity.db')),
+        Tenant('jv', 'JV', 'JV2025', str(tmp_path / 'jv.db')),
+    ])
+    monkeypatch.setattr(main, 'tenants', registry)
+    monkeypatch.setattr(main, 'user_directory', UserDirectory(str(tmp_path / 'directory.db')))
+    main.close_db()
+    main.init_tenants()
+    feeds = []
+    for tenant in registry:
+        conn = main.tenant_db(tenant)
+        coach = conn.execute('''
+            INSERT INTO users (username, password, role, first_name, last_name)
+            VALUES ('coach', '', 'coach', 'Coach', 'Test')
+        ''').lastrowid
+        add_event(conn, 'Practice', '2025-01-10')
+        client = main.app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = coach
+            sess['team'] = tenant.key
+        url = client.get('/api/calendar/subscription').get_json()['url']
+        feeds.append(main.app.test_client().get('/' + url.split('/', 3)[3] + f'?{WINDOW}').data)
+    main.close_db()
+
+    names = [re.search(r'X-WR-CALNAME:(.*)\r\n', unfold(body))[1] for body in feeds]
+    assert names == ['Varsity Cheer', 'JV Cheer']
+    # Both teams' first event has id 1, but calendars must tell them apart
+    assert [vevents(body)[0]['UID'] for body in feeds] == ['event-1.varsity@aviators', 'event-1.jv@aviators']
@@ -0,0 +1,39 @@
+import main
+from conftest import add_user
+
+
+def add_changes(db, count, created_at):
+    start = db.execute('SELECT COUNT(*) FROM change_log').fetchone()[0]
+    db.executemany('''
+        INSERT INTO change_log (topic, action, payload, created_at) VALUES ('events', 'created', ?, ?)
+    ''', [(f'{{"id": {start + number}}}', created_at) for number in range(count)])
+    db.commit()
+
+
+def test_rejection_is_recorded_as_rejected(db, coach):
+    pending = add_user(db, 'newcomer', status='pending')
+    coach.post(f'/api/users/{pending}/approve', json={'action': 'reject'})
+    assert db.execute('SELECT action FROM change_log').fetchone()['action'] == 'rejected'
+
+
+def test_compaction_trims_changes_past_retention(db):
+    add_changes(db, 3, '2020-01-01 00:00:00')
+    add_changes(db, 2, '2999-01-01 00:00:00')
+    result = main.compact_attendance(db)
+    assert result['trimmed'] == 3
+    assert [row['id'] for row in db.execute('SELECT id FROM change_log')] == [4, 5]
+
+
+def test_trim_keeps_the_newest_change(db):
+    add_changes(db, 3, '2020-01-01 00:00:00')
+    assert main.compact_attendance(db)['trimmed'] == 2
+    assert db.execute('SELECT MAX(id) FROM change_log').fetchone()[0] == 3
+
+
+def test_sync_from_before_trimmed_changes_resets(db, coach):
+    add_changes(db, 3, '2020-01-01 00:00:00')
+    add_changes(db, 2, '2999-01-01 00:00:00')
+    main.compact_attendance(db)
+    assert coach.get('/api/sync?since=1').get_json() == {'version': 5, 'reset': True, 'changes': []}
+    resumed = coach.get('/api/sync?since=3').get_json()
+    assert not resumed['reset'] and [change['id'] for change in resumed['changes']] == [4, 5]
@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def feeds(monkeypatch):
+    """A fresh change feed per test, whose poller stops with it."""
+    monkeypatch.setattr(main, 'change_feeds', {})
+    monkeypatch.setattr(main, 'STREAM_HEARTBEAT_SECONDS', 0.05)
+    yield main.change_feeds
+    for feed in main.change_feeds.values():
+        feed._pid = None
+        feed.notify()
+
+
+def create_event(client, title):
+    response = client.post('/api/events', json={
+        'title': title, 'event_type': 'practice', 'date': '2025-01-01', 'start_time': '15:30'
+    })
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+
+def read_events(chunks, count):
+    """The first count SSE events from a stream, skipping retry and keep-alive lines."""
+    events = []
+    for chunk in chunks:
+        if chunk.startswith(b'id: '):
+            fields = dict(line.split(': ', 1) for line in chunk.decode().strip().split('\n'))
+            events.append((int(fields['id']), fields['event'], json.loads(fields['data'])))
+            if len(events) == count:
+                return events
+    return events
+
+
+def test_write_is_logged_and_streamed_live(db, coach, feeds):
+    response = coach.get('/api/stream')
+    chunks = response.iter_encoded()
+    assert next(chunks) == b'retry: 3000\n\n'
+
+    event_id = create_event(coach, 'Practice')
+    logged = db.execute('SELECT id, topic, action, payload FROM change_log').fetchall()
+    assert [(row['topic'], row['action'], json.loads(row['payload'])['id']) for row in logged] == \
+        [('events', 'created', event_id)]
+
+    [(change_id, topic, change)] = read_events(chunks, 1)
+    assert (change_id, topic) == (logged[0]['id'], 'events')
+    assert change['action'] == 'created' and change['data']['title'] == 'Practice'
+    response.close()
+
+
+def test_last_event_id_resumes_after_the_last_change_seen(db, coach, feeds):
+    for title in ('One', 'Two', 'Three'):
+        create_event(coach, title)
+
+    response = coach.get('/api/stream', headers={'Last-Event-ID': '1'})
+    changes = read_events(response.iter_encoded(), 2)
+    assert [(change_id, change['data']['title']) for change_id, _, change in changes] == \
+        [(2, 'Two'), (3, 'Three')]
+    response.close()
+
+
+def test_resume_after_trimming_skips_the_trimmed_changes(db, coach, feeds):
+    for title in ('One', 'Two', 'Three'):
+        create_event(coach, title)
+    db.execute("UPDATE change_log SET created_at = '2020-01-01 00:00:00' WHERE id < 3")
+    db.commit()
+    assert main.compact_attendance(db)['trimmed'] == 2
+
+    response = coach.get('/api/stream?since=0')
+    assert [change_id for change_id, _, _ in read_events(response.iter_encoded(), 1)] == [3]
+    response.close()
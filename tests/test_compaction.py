@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import main
+from conftest import add_user, signed_in
+
+
+@pytest.fixture
+def old_event(db):
+    day = (datetime.now() - timedelta(days=main.ATTENDANCE_COMPACT_AFTER_DAYS + 10)).strftime('%Y-%m-%d')
+    return db.execute('''
+        INSERT INTO events (title, event_type, date, start_time, end_time)
+        VALUES ('Practice', 'practice', ?, '15:30', '17:30')
+    ''', (day,)).lastrowid
+
+
+def sign_in(db, user_id, event_id):
+    db.execute('''
+        INSERT INTO attendance (user_id, event_id, sign_in_time, sign_out_time, status)
+        SELECT ?, id, date || ' 15:30:00', date || ' 17:30:00', 'completed' FROM events WHERE id = ?
+    ''', (user_id, event_id))
+    db.commit()
+
+
+def attended(db):
+    return db.execute('SELECT COALESCE(SUM(attended), 0) FROM attendance_daily').fetchone()[0]
+
+
+def test_late_sign_in_to_a_compacted_day_is_refused(db, coach, old_event):
+    athlete = add_user(db, 'athlete', role='student')
+    latecomer = add_user(db, 'latecomer', role='student')
+    sign_in(db, athlete, old_event)
+    assert main.compact_attendance(db)['compacted'] == 1
+    
+    response = signed_in(latecomer).post('/api/attendance/sign-in', json={'event_id': old_event})
+    assert response.status_code == 409
+    bulk = coach.post('/api/attendance/bulk-sign-in',
+                      json={'entries': [{'user_id': athlete, 'event_id': old_event}]}).get_json()
+    assert bulk['signed_in'] == 0 and bulk['results'][0]['status'] == 'compacted'
+    
+    main.compact_attendance(db)
+    assert attended(db) == 1
+
+
+def test_queued_sign_in_is_dropped_once_its_day_is_compacted(db, old_event):
+    athlete = add_user(db, 'athlete', role='student')
+    sign_in(db, athlete, old_event)
+    main.compact_attendance(db)
+    main.apply_attendance_writes([('sign_in', athlete, old_event, datetime.now(), None)])
+    assert db.execute('SELECT COUNT(*) FROM attendance').fetchone()[0] == 0
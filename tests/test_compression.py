@@ -0,0 +1,81 @@
+import gzip
+import zlib
+
+import pytest
+from flask import Response
+from werkzeug.http import parse_accept_header
+
+import main
+from compression import ResponseCompressor
+from conftest import add_user
+
+GZIP = parse_accept_header('gzip, deflate')
+
+
+def test_small_bodies_are_sent_as_they_are():
+    compressor = ResponseCompressor(min_bytes=1024)
+    response = Response(b'[' + b'1,' * 100 + b'1]', mimetype='application/json')
+    compressor.compress(response, GZIP)
+    assert 'Content-Encoding' not in response.headers
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert compressor.responses == 0
+
+
+@pytest.mark.parametrize('stream_bytes', [1024 * 1024, 4096])
+def test_large_bodies_are_gzipped_whole_or_in_chunks(stream_bytes):
+    compressor = ResponseCompressor(min_bytes=1024, stream_bytes=stream_bytes, chunk_bytes=1000)
+    body = b'[' + b','.join(b'{"id": %d}' % n for n in range(2000)) + b']'
+    response = Response(body, mimetype='application/json')
+    response.set_etag('abc')
+    compressor.compress(response, GZIP)
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.get_etag() == ('abc', True)
+    assert gzip.decompress(b''.join(response.iter_encoded())) == body
+    assert compressor.bytes_in == len(body) and compressor.bytes_out < len(body)
+
+
+def test_identical_bodies_reuse_the_compressed_copy():
+    compressor = ResponseCompressor(min_bytes=10)
+    body = b'{"students": []}' * 100
+    for _ in range(3):
+        response = Response(body, mimetype='application/json')
+        compressor.compress(response, GZIP)
+    assert compressor.memo_hits == 2
+    assert gzip.decompress(response.get_data()) == body
+
+
+def test_streamed_bodies_are_flushed_chunk_by_chunk():
+    compressor = ResponseCompressor(min_bytes=10)
+    response = Response(iter([b'{"a": 1}\n', b'{"a": 2}\n']), mimetype='application/x-ndjson')
+    compressor.compress(response, GZIP)
+    parts = list(response.iter_encoded())
+    decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    # Each chunk can be decoded as soon as it arrives
+    assert decoder.decompress(parts[0]) == b'{"a": 1}\n'
+    assert decoder.decompress(b''.join(parts[1:])) == b'{"a": 2}\n'
+
+
+@pytest.mark.parametrize('response', [
+    Response(b'x' * 5000, mimetype='image/png'),
+    Response(b'x' * 5000, mimetype='application/json', headers={'Cache-Control': 'no-transform'}),
+    Response(status=304),
+])
+def test_other_responses_are_left_alone(response):
+    ResponseCompressor(min_bytes=10).compress(response, GZIP)
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_api_compresses_only_for_clients_that_accept_it(db, coach):
+    for n in range(100):
+        add_user(db, f'student{n}', role='student')
+    plain = coach.get('/api/users/students')
+    assert 'Content-Encoding' not in plain.headers
+    assert len(plain.data) > main.COMPRESS_MIN_BYTES
+
+    compressed = coach.get('/api/users/students', headers={'Accept-Encoding': 'gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed.data) == plain.data
+
+    small = coach.get('/api/academics/requirements', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in small.headers
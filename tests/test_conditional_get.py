@@ -0,0 +1,43 @@
+from conftest import add_user, signed_in
+
+
+def test_unchanged_resource_is_answered_304_until_a_write(db, coach):
+    first = coach.get('/api/users/students')
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+
+    again = coach.get('/api/users/students', headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.data == b''
+    assert again.headers['ETag'] == etag
+
+    newcomer = add_user(db, 'newcomer', role='student', status='pending')
+    assert coach.post(f'/api/users/{newcomer}/approve', json={'action': 'approve'}).status_code == 200
+    changed = coach.get('/api/users/students', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert [student['username'] for student in changed.get_json()] == ['newcomer']
+
+
+def test_if_modified_since_is_honoured(db, coach):
+    first = coach.get('/api/users/students')
+    response = coach.get('/api/users/students', headers={'If-Modified-Since': first.headers['Last-Modified']})
+    assert response.status_code == 304
+
+
+def test_roles_the_view_refuses_get_403_not_304(db, coach):
+    etag = coach.get('/api/analytics/attendance').headers['ETag']
+    parent = signed_in(add_user(db, 'parent', role='parent'))
+
+    response = parent.get('/api/analytics/attendance', headers={'If-None-Match': etag})
+    assert response.status_code == 403
+    assert 'ETag' not in response.headers
+
+
+def test_per_user_views_do_not_share_etags(db, coach):
+    etag = coach.get('/api/analytics/attendance').headers['ETag']
+    student = signed_in(add_user(db, 'athlete', role='student'))
+
+    response = student.get('/api/analytics/attendance', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
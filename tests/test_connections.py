@@ -0,0 +1,18 @@
+import sqlite3
+
+import pytest
+
+import main
+
+
+def test_close_db_closes_every_cached_connection(db):
+    conn = main.get_db()
+    conn.execute('BEGIN IMMEDIATE')
+    main.close_db()
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.execute('SELECT 1')
+    # The writer lock went with it
+    assert main.get_db() is not conn
+    main.get_db().execute('BEGIN IMMEDIATE')
+    main.get_db().rollback()
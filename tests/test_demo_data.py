@@ -0,0 +1,45 @@
+import pytest
+
+import main
+from create_demo_data import DEFAULT_PASSWORD, generate_teams
+from tenancy import Tenant, TenantRegistry, UserDirectory
+
+
+@pytest.fixture
+def teams(tmp_path, monkeypatch):
+    registry = TenantRegistry([
+        Tenant('varsity', 'Varsity', 'V2025', str(tmp_path / 'varsity.db')),
+        Tenant('jv', 'JV', 'JV2025', str(tmp_path / 'jv.db')),
+    ])
+    monkeypatch.setattr(main, 'tenants', registry)
+    monkeypatch.setattr(main, 'user_directory', UserDirectory(str(tmp_path / 'directory.db')))
+    main.user_cache.clear()
+    main.close_db()
+    yield registry
+    main.close_db()
+
+
+def usernames(tenant):
+    return {row['username'] for row in main.tenant_db(tenant).execute('SELECT username FROM users')}
+
+
+def test_each_team_gets_its_own_database_and_directory_entries(teams):
+    counts = generate_teams(teams, students=3, parent_rate=0, events_per_season=4)
+
+    assert set(counts) == {'varsity', 'jv'}
+    assert usernames(teams.get('varsity')) == {'director', 'coach', 'assistant', 'parent1',
+                                              'student1', 'student2', 'student3'}
+    assert usernames(teams.get('jv')) == {'jv.coach', 'jv.assistant', 'jv.parent1',
+                                         'jv.student1', 'jv.student2', 'jv.student3'}
+    assert main.user_directory.teams('coach') == ['varsity']
+    assert main.user_directory.teams('jv.coach') == ['jv']
+
+    # Events belong to the team's own coach
+    jv = main.tenant_db(teams.get('jv'))
+    assert jv.execute("SELECT DISTINCT u.username FROM events e JOIN users u ON u.id = e.created_by"
+                      ).fetchall()[0]['username'] == 'jv.coach'
+
+    response = main.app.test_client().post('/api/auth/login',
+                                           json={'username': 'jv.student2', 'password': DEFAULT_PASSWORD})
+    assert response.status_code == 200
+    assert response.get_json()['user']['team'] == 'jv'
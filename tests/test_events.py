@@ -0,0 +1,102 @@
+import base64
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+import main
+
+
+def cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def add_events(db, count):
+    db.executemany('''
+        INSERT INTO events (title, event_type, date, start_time) VALUES (?, 'practice', ?, '15:30')
+    ''', [(f'Practice {day}', f'2025-01-{day:02d}') for day in range(1, count + 1)])
+    db.commit()
+
+
+def test_pages_follow_next_cursor(db, coach):
+    add_events(db, 5)
+    first = coach.get('/api/events?limit=3').get_json()
+    assert [event['date'] for event in first['events']] == ['2025-01-05', '2025-01-04', '2025-01-03']
+    second = coach.get(f"/api/events?limit=3&cursor={first['next_cursor']}").get_json()
+    assert [event['date'] for event in second['events']] == ['2025-01-02', '2025-01-01']
+    assert second['next_cursor'] is None
+
+
+@pytest.mark.parametrize('value', [
+    'not base64!',
+    cursor({'date': '2025-01-01'}),
+    cursor([{}, {}, {}]),
+    cursor(['2025-01-01', '15:30']),
+    cursor(['January', '15:30', 1]),
+    cursor(['2025-01-01', 1530, 1]),
+    cursor(['2025-01-01', '15:30', 'x']),
+    cursor(['2025-01-01', '15:30', True]),
+])
+def test_malformed_cursor_is_rejected(db, coach, value):
+    response = coach.get(f'/api/events?cursor={value}')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid cursor'}
+
+
+def test_occurrence_cursor_is_accepted(db, coach):
+    response = coach.get(f"/api/events?cursor={cursor(['2025-01-01', '15:30', 'series:1:2025-01-01'])}")
+    assert response.status_code == 200
+
+
+def test_default_page_starts_near_today(db, coach):
+    today = datetime.now().date()
+    # Three practices a week for a year
+    db.execute('''
+        INSERT INTO event_series (title, event_type, start_time, weekdays, start_date)
+        VALUES ('Practice', 'practice', '15:30', 21, ?)
+    ''', (str(today - timedelta(days=7)),))
+    db.commit()
+    events = coach.get('/api/events').get_json()['events']
+    assert events[0]['date'] <= str(today + timedelta(days=main.SERIES_DEFAULT_DAYS))
+    later = coach.get(f'/api/events?to={today + timedelta(days=200)}').get_json()['events']
+    assert later[0]['date'] > str(today + timedelta(days=main.SERIES_DEFAULT_DAYS))
+
+
+def test_default_window_follows_the_clock(db, coach, monkeypatch):
+    today = datetime.now()
+    # A practice every day
+    db.execute('''
+        INSERT INTO event_series (title, event_type, start_time, weekdays, start_date)
+        VALUES ('Practice', 'practice', '15:30', 127, ?)
+    ''', (today.strftime('%Y-%m-%d'),))
+    db.commit()
+    first = coach.get('/api/events')
+    last_day = first.get_json()['events'][0]['date']
+
+    class Later(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime.now(tz) + timedelta(days=3)
+
+    monkeypatch.setattr(main, 'datetime', Later)
+    later = coach.get('/api/events', headers={'If-None-Match': first.headers['ETag']})
+    assert later.status_code == 200
+    assert later.headers['ETag'] != first.headers['ETag']
+    assert later.get_json()['events'][0]['date'] == str((today + timedelta(days=3)).date()
+                                                       + timedelta(days=main.SERIES_DEFAULT_DAYS))
+    assert later.get_json()['events'][0]['date'] > last_day
+
+
+def test_unknown_event_cannot_be_edited_or_deleted(db, coach):
+    assert coach.put('/api/events/999', json={'title': 'Renamed'}).status_code == 404
+    assert coach.delete('/api/events/999').status_code == 404
+    assert db.execute('SELECT COUNT(*) FROM change_log').fetchone()[0] == 0
+
+
+def test_edit_and_delete_are_logged(db, coach):
+    add_events(db, 1)
+    response = coach.put('/api/events/1', json={'title': 'Renamed'})
+    assert response.status_code == 200 and response.get_json()['title'] == 'Renamed'
+    assert coach.delete('/api/events/1').status_code == 200
+    assert [row['action'] for row in db.execute('SELECT action FROM change_log ORDER BY id')] == \
+        ['updated', 'deleted']
@@ -0,0 +1,62 @@
+import io
+import json
+
+import pytest
+
+from conftest import add_user
+from jsonstream import decode_array
+
+
+def decode(text, **kwargs):
+    stream = io.StringIO(text)
+    assert stream.read(1) == '['
+    return list(decode_array(stream, **kwargs))
+
+
+@pytest.mark.parametrize('read_chars', [1, 2, 7, 1024])
+def test_decode_array_across_read_boundaries(read_chars):
+    items = [{'student_id': 1, 'grade': 91.5}, 12345, 'text', [1, 2], None, {}]
+    assert decode(json.dumps(items, indent=2), read_chars=read_chars) == items
+    assert decode('[ ]', read_chars=read_chars) == []
+
+
+@pytest.mark.parametrize('text', ['[', '[1,', '[1,]', '[1 2]', '[{"a": 1}', '[{"a": }]'])
+def test_decode_array_rejects_malformed_json(text):
+    with pytest.raises(ValueError):
+        decode(text, read_chars=3)
+
+
+def test_decode_array_bounds_item_size():
+    with pytest.raises(ValueError):
+        decode(json.dumps([{'comment': 'x' * 100}]), read_chars=8, max_item_chars=50)
+
+
+@pytest.fixture
+def grades(db):
+    student = add_user(db, 'athlete', role='student')
+    db.execute("INSERT INTO academic_requirements (subject, grade_required) VALUES ('Math', 70)")
+    db.commit()
+    return student
+
+
+def test_import_json_array(db, coach, grades):
+    rows = [{'student_id': grades, 'requirement_id': 1, 'grade': 88},
+            {'student_id': grades, 'requirement_id': 1, 'grade': 120}]
+    response = coach.post('/api/academics/grades/import', data=json.dumps(rows),
+                          content_type='application/json')
+    body = response.get_json()
+    assert body['imported'] == 1
+    assert body['rejected'] == [{'line': 2, 'error': 'grade must be between 0 and 100'}]
+
+
+@pytest.mark.parametrize('grade', [-1, 100.5, 'A', None])
+def test_single_grade_is_validated_like_imports(db, coach, grades, grade):
+    response = coach.post(f'/api/students/{grades}/grades', json={'requirement_id': 1, 'grade': grade})
+    assert response.status_code == 400
+    assert db.execute('SELECT COUNT(*) FROM student_grades').fetchone()[0] == 0
+
+
+def test_single_grade_is_stored(db, coach, grades):
+    response = coach.post(f'/api/students/{grades}/grades', json={'requirement_id': 1, 'grade': '93'})
+    assert response.status_code == 200
+    assert db.execute('SELECT current_grade FROM student_grades').fetchone()[0] == 93
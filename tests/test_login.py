@@ -0,0 +1,114 @@
+import pytest
+
+import main
+from passwords import hash_password
+from tenancy import Tenant, TenantRegistry, UserDirectory
+
+
+@pytest.fixture
+def teams(tmp_path, monkeypatch):
+    """Two teams, with 'sam' on both and 'alex' only on JV."""
+    registry = TenantRegistry([
+        Tenant('varsity', 'Varsity', 'V2025', str(tmp_path / 'varsity.db')),
+        Tenant('jv', 'JV', 'JV2025', str(tmp_path / 'jv.db')),
+    ])
+    monkeypatch.setattr(main, 'tenants', registry)
+    monkeypatch.setattr(main, 'user_directory', UserDirectory(str(tmp_path / 'directory.db')))
+    main.read_cache.clear()
+    main.user_cache.clear()
+    main.close_db()
+    main.init_tenants()
+    stored = hash_password('go aviators')
+    for tenant, usernames in ((registry.get('varsity'), ['sam']), (registry.get('jv'), ['sam', 'alex'])):
+        conn = main.tenant_db(tenant)
+        conn.executemany('''
+            INSERT INTO users (username, password, role, first_name, last_name, status)
+            VALUES (?, ?, 'athlete', ?, 'Test', 'active')
+        ''', [(username, stored, username.title()) for username in usernames])
+        conn.commit()
+    main.init_tenants()
+    yield registry
+    main.close_db()
+
+
+@pytest.fixture
+def verifications(monkeypatch):
+    calls = []
+    verify = main.password_hasher.verify
+
+    def counting_verify(password, stored):
+        calls.append(stored)
+        return verify(password, stored)
+
+    monkeypatch.setattr(main.password_hasher, 'verify', counting_verify)
+    return calls
+
+
+def login(body):
+    return main.app.test_client().post('/api/auth/login', json=body)
+
+
+def test_login_opens_only_the_users_team(teams, verifications, monkeypatch):
+    main.close_db()
+    opened = []
+    connect = main.connect_db
+    monkeypatch.setattr(main, 'connect_db', lambda path=None: opened.append(path) or connect(path))
+
+    response = login({'username': 'alex', 'password': 'go aviators'})
+
+    assert response.status_code == 200
+    assert response.get_json()['user']['team'] == 'jv'
+    assert opened == [teams.get('jv').database]
+    assert len(verifications) == 1
+
+
+def test_unknown_username_hashes_once_and_opens_nothing(teams, verifications, monkeypatch):
+    main.close_db()
+    opened = []
+    monkeypatch.setattr(main, 'connect_db', lambda path=None: opened.append(path))
+
+    response = login({'username': 'nobody', 'password': 'go aviators'})
+
+    assert response.status_code == 401
+    assert opened == []
+    assert verifications == [None]
+
+
+def test_username_on_two_teams_asks_for_the_team(teams, verifications):
+    response = login({'username': 'sam', 'password': 'go aviators'})
+
+    assert response.status_code == 409
+    assert response.get_json()['teams'] == [{'key': 'jv', 'name': 'JV'}, {'key': 'varsity', 'name': 'Varsity'}]
+    assert verifications == []
+
+    response = login({'username': 'sam', 'password': 'go aviators', 'team': 'varsity'})
+    assert response.status_code == 200
+    assert response.get_json()['user']['team'] == 'varsity'
+
+    assert login({'username': 'sam', 'password': 'go aviators', 'team': 'nope'}).status_code == 400
+
+
+def test_registration_and_rejection_update_the_directory(teams):
+    client = main.app.test_client()
+    response = client.post('/api/auth/register', json={
+        'team_code': 'V2025', 'username': 'alex', 'password': 'go aviators', 'role': 'student',
+        'first_name': 'Alex', 'last_name': 'Test', 'email': 'alex@example.com',
+    })
+    assert response.status_code == 201
+    assert main.user_directory.teams('alex') == ['jv', 'varsity']
+
+    conn = main.tenant_db(teams.get('varsity'))
+    pending = conn.execute("SELECT id FROM users WHERE username = 'alex'").fetchone()['id']
+    coach = conn.execute('''
+        INSERT INTO users (username, password, role, first_name, last_name, status)
+        VALUES ('coach', '', 'coach', 'Coach', 'Test', 'active')
+    ''').lastrowid
+    conn.commit()
+    client = main.app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = coach
+        sess['team'] = 'varsity'
+    response = client.post(f'/api/users/{pending}/approve', json={'action': 'reject'})
+
+    assert response.status_code == 200
+    assert main.user_directory.teams('alex') == ['jv']
@@ -0,0 +1,42 @@
+import pytest
+
+import passwords
+from passwords import hash_password, needs_upgrade, verify_password
+
+
+def test_current_hash_verifies_and_is_kept():
+    stored = hash_password('go aviators')
+    assert verify_password('go aviators', stored)
+    assert not verify_password('wrong', stored)
+    assert not needs_upgrade(stored)
+
+
+@pytest.mark.parametrize('stored', [
+    # A legacy unsalted SHA-256 hex digest
+    'b1ab8e4f3c08d3d9e4a3a0f1cdb2ff1d6f8c2e3a4b5c6d7e8f9a0b1c2d3e4f5a6',
+    'scrypt$n=1024,r=8,p=1$c2FsdA$ZGlnZXN0',
+    'scrypt$n=16384,r=4,p=1$c2FsdA$ZGlnZXN0',
+])
+def test_weaker_hashes_are_upgraded(stored):
+    assert needs_upgrade(stored)
+
+
+def test_stronger_hashes_are_not_downgraded(monkeypatch):
+    stored = hash_password('go aviators')
+    monkeypatch.setattr(passwords, 'SCRYPT_N', passwords.SCRYPT_N // 2)
+    assert not needs_upgrade(stored)
+    monkeypatch.setattr(passwords, 'PBKDF2_ITERATIONS', 1000)
+    monkeypatch.setattr(passwords, 'DEFAULT_SCHEME', 'pbkdf2_sha256')
+    assert not needs_upgrade('pbkdf2_sha256$600000$c2FsdA$ZGlnZXN0')
+    assert needs_upgrade('pbkdf2_sha256$999$c2FsdA$ZGlnZXN0')
+
+
+@pytest.mark.parametrize('scheme, stored', [
+    ('scrypt', 'scrypt$n=lots$c2FsdA$ZGlnZXN0'),
+    ('scrypt', 'scrypt$r=8,p=1$c2FsdA$ZGlnZXN0'),
+    ('pbkdf2_sha256', 'pbkdf2_sha256$many$c2FsdA$ZGlnZXN0'),
+])
+def test_malformed_hashes_do_not_raise(monkeypatch, scheme, stored):
+    monkeypatch.setattr(passwords, 'DEFAULT_SCHEME', scheme)
+    assert not verify_password('go aviators', stored)
+    assert not needs_upgrade(stored)
@@ -0,0 +1,7 @@
+import main
+
+
+def test_hot_routes_use_indexes():
+    problems = main.check_query_plans()
+    assert problems == [], '\n'.join(f'{route}: {detail}\n    {statement}'
+                                     for route, statement, detail in problems)
@@ -0,0 +1,57 @@
+import sqlite3
+
+import pytest
+
+import main
+from cache import InMemorySharedBackend, ReadCache, SharedBackend
+
+
+def add_requirement(conn, subject):
+    conn.execute('''
+        INSERT INTO academic_requirements (subject, grade_required) VALUES (?, 70)
+    ''', (subject,))
+    main.bump_version(conn, 'academic_requirements')
+    conn.commit()
+
+
+def test_write_from_another_worker_is_not_served_stale(db, coach):
+    add_requirement(db, 'Math')
+    first = coach.get('/api/academics/requirements')
+    assert [row['subject'] for row in first.get_json()] == ['Math']
+    
+    # Another worker commits through its own connection; only the database
+    # changes, not this worker's read cache
+    other = sqlite3.connect(db.execute('PRAGMA database_list').fetchone()['file'])
+    add_requirement(other, 'Science')
+    other.close()
+    
+    second = coach.get('/api/academics/requirements',
+                       headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 200
+    assert second.headers['ETag'] != first.headers['ETag']
+    assert sorted(row['subject'] for row in second.get_json()) == ['Math', 'Science']
+
+
+def test_cached_body_is_reused_until_a_write(db, coach):
+    add_requirement(db, 'Math')
+    coach.get('/api/academics/requirements')
+    hits = main.read_cache.hits
+    coach.get('/api/academics/requirements')
+    assert main.read_cache.hits == hits + 1
+
+
+def test_shared_backends_must_implement_the_interface():
+    class Incomplete(SharedBackend):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+    # Two workers' caches on one shared store see each other's entries and invalidations
+    backend = InMemorySharedBackend()
+    first, second = ReadCache(backend), ReadCache(backend)
+    assert first.get_or_compute('k', ('users',), lambda: b'[1]') == b'[1]'
+    assert second.get_or_compute('k', ('users',), lambda: b'[2]') == b'[1]'
+    second.invalidate('users')
+    assert first.get_or_compute('k', ('users',), lambda: b'[3]') == b'[3]'
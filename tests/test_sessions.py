@@ -0,0 +1,66 @@
+import pytest
+
+import main
+from conftest import add_user, signed_in
+from sessions import ServerSessionInterface, SessionStore, SQLiteSessionStore
+
+
+@pytest.fixture
+def sessions(tmp_path, monkeypatch):
+    """A session store of its own, so counts start from zero."""
+    interface = ServerSessionInterface(SQLiteSessionStore(str(tmp_path / 'sessions.db')),
+                                       dependents=[main.user_cache])
+    monkeypatch.setattr(main.app, 'session_interface', interface)
+    return interface
+
+
+def test_session_store_is_abstract():
+    with pytest.raises(TypeError):
+        SessionStore()
+
+
+def test_sign_ins_do_not_flush_cached_sessions(db, sessions):
+    coach = signed_in(add_user(db, 'coach', role='coach'))
+    assert coach.get('/api/events').status_code == 200
+    flushes, reads = sessions.flushes, sessions.store.reads
+
+    # Other users signing in commit to the store, which is no reason to reload anyone
+    for n in range(3):
+        signed_in(add_user(db, f'athlete{n}'))
+    assert coach.get('/api/events').status_code == 200
+
+    assert sessions.flushes == flushes
+    assert sessions.store.reads == reads
+
+
+def test_touch_from_another_worker_flushes(db, sessions):
+    coach = signed_in(add_user(db, 'coach', role='coach'))
+    assert coach.get('/api/events').status_code == 200
+    flushes, reads = sessions.flushes, sessions.store.reads
+
+    SQLiteSessionStore(sessions.store.path).touch()
+    assert coach.get('/api/events').status_code == 200
+
+    assert sessions.flushes == flushes + 1
+    assert sessions.store.reads == reads + 1
+
+
+def test_revoked_user_is_signed_out(db, sessions):
+    user_id = add_user(db, 'coach', role='coach')
+    coach = signed_in(user_id)
+    assert coach.get('/api/events').status_code == 200
+
+    assert sessions.revoke_user(None, user_id) == 1
+    assert coach.get('/api/events').status_code == 401
+
+
+def test_sign_out_reaches_other_workers(db, sessions):
+    coach = signed_in(add_user(db, 'coach', role='coach'))
+    assert coach.get('/api/events').status_code == 200
+    sid = coach.get_cookie(main.app.config['SESSION_COOKIE_NAME']).value
+    flushes = sessions.flushes
+
+    # Another worker sees the sign-out; this one still holds the cookie
+    SQLiteSessionStore(sessions.store.path).delete(sid)
+    assert coach.get('/api/events').status_code == 401
+    assert sessions.flushes == flushes + 1
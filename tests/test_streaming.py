@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+import main
+from conftest import add_user
+from jsonstream import encode_array, encode_ndjson
+
+COLUMNS = ['id', 'name', 'grade', 'note']
+
+
+def rows(count):
+    return [(n, f'Émilie "{n}" </script>', n / 3 if n % 2 else None, '  line\nbreak') for n in range(count)]
+
+
+def dumps(value):
+    with main.app.app_context():
+        return main.app.json.dumps(value)
+
+
+@pytest.mark.parametrize('count', [0, 1, 2, 3, 7])
+def test_array_is_byte_identical_to_dumps(count):
+    expected = (dumps([dict(zip(COLUMNS, row)) for row in rows(count)]) + '\n').encode()
+    assert b''.join(encode_array(COLUMNS, iter(rows(count)), dumps, chunk_rows=3)) == expected
+
+
+@pytest.mark.parametrize('count', [0, 1, 7])
+def test_ndjson_is_one_dumps_per_line(count):
+    body = b''.join(encode_ndjson(COLUMNS, iter(rows(count)), dumps, chunk_rows=3))
+    assert body == ''.join(dumps(dict(zip(COLUMNS, row))) + '\n' for row in rows(count)).encode()
+
+
+def test_chunks_are_sent_as_rows_are_read():
+    source = iter(rows(7))
+    chunks = encode_array(COLUMNS, source, dumps, chunk_rows=3)
+    next(chunks)
+    # Only the first chunk's rows have been taken from the cursor
+    assert next(source)[0] == 3
+
+
+@pytest.fixture
+def students(db):
+    for n in range(30):
+        add_user(db, f'student{n:02d}', role='student')
+    return [dict(row) for row in db.execute('''
+        SELECT id, username, first_name, last_name, email, phone, grade
+        FROM users WHERE role = 'student' ORDER BY last_name, first_name
+    ''')]
+
+
+def test_endpoint_body_matches_dumps_streamed_and_cached(coach, students):
+    expected = (dumps(students) + '\n').encode()
+
+    hits = main.read_cache.hits
+    assert coach.get('/api/users/students').data == expected
+    # The second copy comes from the entry stored as the first was sent
+    assert coach.get('/api/users/students').data == expected
+    assert main.read_cache.hits == hits + 1
+
+
+def test_endpoint_ndjson(coach, students):
+    response = coach.get('/api/users/students?format=ndjson')
+    assert response.mimetype == 'application/x-ndjson'
+    assert [json.loads(line) for line in response.data.decode().splitlines()] == students
@@ -0,0 +1,52 @@
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+import main
+from conftest import add_user
+from writequeue import AttendanceWriteQueue
+
+
+def test_failing_write_is_dropped_and_the_rest_commit():
+    applied = []
+    
+    def apply_batch(batch):
+        if any(user_id == 2 for _, user_id, _, _, _ in batch):
+            raise ValueError('bad write')
+        applied.extend(batch)
+    
+    queue = AttendanceWriteQueue(apply_batch, max_delay=0.001)
+    for user_id in (1, 2, 3):
+        queue.sign_in(user_id, 10, datetime.now(), lambda: False)
+    assert queue.flush(timeout=5)
+    assert [user_id for _, user_id, _, _, _ in applied] == [1, 3]
+    assert (queue.writes, queue.failed) == (2, 1)
+
+
+def test_transient_errors_are_retried():
+    attempts = []
+    
+    def apply_batch(batch):
+        attempts.append(batch)
+        if len(attempts) < 3:
+            raise sqlite3.OperationalError('database is locked')
+    
+    queue = AttendanceWriteQueue(apply_batch, max_delay=0.001, is_transient=main.database_busy)
+    queue.sign_in(1, 10, datetime.now(), lambda: False)
+    assert queue.flush(timeout=5)
+    assert len(attempts) == 3 and (queue.writes, queue.failed) == (1, 0)
+
+
+def test_failed_batch_leaves_no_open_transaction(db):
+    athlete = add_user(db, 'athlete', role='student')
+    event_id = db.execute('''
+        INSERT INTO events (title, event_type, date, start_time) VALUES ('Practice', 'practice', '2025-01-01', '15:30')
+    ''').lastrowid
+    db.commit()
+    # A time SQLite cannot bind fails after BEGIN IMMEDIATE
+    with pytest.raises(sqlite3.Error):
+        main.apply_attendance_writes([('sign_in', athlete, event_id, object(), None)])
+    assert not db.in_transaction
+    main.apply_attendance_writes([('sign_in', athlete, event_id, datetime.now(), None)])
+    assert db.execute('SELECT COUNT(*) FROM attendance').fetchone()[0] == 1
@@ -0,0 +1,158 @@
+"""Group commit for attendance sign-ins and sign-outs.
+
+With ATTENDANCE_WRITE_QUEUE=1, the sign-in and sign-out routes validate a
+write, queue it and answer straight away. One writer thread per worker
+process drains the queue every few milliseconds and applies everything
+queued so far in a single transaction. A squad checking in together then
+costs a handful of commits instead of one writer-lock round trip each, and
+requests stop queueing on the lock (or failing with "database is locked").
+
+Writes still pending are tracked per (user, event). Duplicate checks read
+that state before the database, so an athlete who signs in and then signs in
+or out again sees their own earlier write. The writer re-checks each write
+inside its transaction, so a duplicate that slips past the check in another
+worker process is dropped rather than stored. Writes replayed by an offline
+client carry its idempotency key; a replay of a write that is still pending
+is acknowledged without being queued again.
+
+Acknowledged writes live only in memory until their batch commits, normally
+within ATTENDANCE_WRITE_BATCH_MS. The queue is drained at interpreter exit,
+but a hard kill loses whatever is still pending.
+
+A batch that fails with a transient error (is_transient(), e.g. the
+database is locked) is retried as a whole. Any other error is not going to
+go away, so the batch is split up and each write applied on its own: the
+good ones commit and the ones that still fail are logged, counted in
+failed and dropped, rather than retried forever behind the rest of the queue.
+"""
+import atexit
+import os
+import threading
+import time
+from collections import deque
+
+
+class QueueFull(Exception):
+    """Raised when too many writes are waiting; callers should shed load."""
+
+
+class AttendanceWriteQueue:
+    def __init__(self, apply_batch, max_delay=0.005, max_batch=500, max_pending=10000, log=None,
+                 is_transient=lambda error: False):
+        self.apply_batch = apply_batch
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.log = log
+        self.is_transient = is_transient
+        self.batches = 0
+        self.writes = 0
+        self.failed = 0
+        self._queue = deque()
+        self._pending = {}           # (user_id, event_id) -> [signed in?, queued writes]
+        self._keys = set()           # (user_id, idempotency key) of queued writes
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._pid = None
+
+    def start(self):
+        """Start the writer thread, once per process (and again after a fork)."""
+        with self._cond:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._queue.clear()
+            self._pending.clear()
+            self._keys.clear()
+            self._in_flight = 0
+        threading.Thread(target=self._run, name='attendance-writer', daemon=True).start()
+        atexit.register(self.flush)
+
+    def depth(self):
+        return len(self._queue) + self._in_flight
+
+    def sign_in(self, user_id, event_id, at, has_open_row, idempotency_key=None):
+        """Queue a sign-in unless the athlete is already signed in to the event.
+
+        has_open_row() checks the database and is only called when no write
+        for this athlete and event is pending. Returns False for a duplicate.
+        """
+        self.start()
+        key = (user_id, event_id)
+        with self._cond:
+            if (user_id, idempotency_key) in self._keys:
+                return True
+            state = self._pending.get(key)
+            if state[0] if state else has_open_row():
+                return False
+            self._enqueue('sign_in', key, at, True, idempotency_key)
+        return True
+
+    def sign_out(self, user_id, event_id, at, idempotency_key=None):
+        self.start()
+        with self._cond:
+            if (user_id, idempotency_key) not in self._keys:
+                self._enqueue('sign_out', (user_id, event_id), at, False, idempotency_key)
+
+    def flush(self, timeout=10):
+        """Block until every write queued so far has been committed."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._queue and not self._in_flight, timeout)
+
+    def _enqueue(self, kind, key, at, signed_in, idempotency_key):
+        if len(self._queue) + self._in_flight >= self.max_pending:
+            raise QueueFull()
+        state = self._pending.setdefault(key, [signed_in, 0])
+        state[0] = signed_in
+        state[1] += 1
+        if idempotency_key is not None:
+            self._keys.add((key[0], idempotency_key))
+        self._queue.append((kind, key[0], key[1], at, idempotency_key))
+        self._cond.notify_all()
+
+    def _run(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue)
+            # Let the rest of the burst arrive before taking the writer lock
+            time.sleep(self.max_delay)
+            with self._cond:
+                batch = [self._queue.popleft() for _ in range(min(len(self._queue), self.max_batch))]
+                self._in_flight = len(batch)
+            dropped = 0
+            try:
+                self._apply(batch)
+            except Exception:
+                # Find the writes at fault and drop only those
+                for write in batch:
+                    try:
+                        self._apply([write])
+                    except Exception:
+                        dropped += 1
+                        if self.log is not None:
+                            self.log.exception('Dropped attendance write %r', write)
+            with self._cond:
+                for _, user_id, event_id, _, idempotency_key in batch:
+                    state = self._pending[(user_id, event_id)]
+                    state[1] -= 1
+                    if not state[1]:
+                        del self._pending[(user_id, event_id)]
+                    self._keys.discard((user_id, idempotency_key))
+                self._in_flight = 0
+                self.batches += 1
+                self.writes += len(batch) - dropped
+                self.failed += dropped
+                self._cond.notify_all()
+
+    def _apply(self, batch):
+        """apply_batch(batch), retried for as long as it fails with a transient error."""
+        while True:
+            try:
+                return self.apply_batch(batch)
+            except Exception as error:
+                if not self.is_transient(error):
+                    raise
+                if self.log is not None:
+                    self.log.warning('Attendance write batch failed (%s); retrying', error)
+                time.sleep(self.max_delay * 10)